@@ -0,0 +1,94 @@
+"""
+Fill the parsed weight columns of order and pawn lines written before they existed.
+
+    python -m backfill_weights [--batch-size 5000] [--pause 0.1]
+
+Walks each table in primary key order, one short transaction per batch, so it
+can run against the live shop and be stopped at any point. Rows already
+parsed are skipped, which makes reruns cheap. Texts that are not weights, or
+have no unit, stay NULL and are listed at the end, for staff to correct or the
+parser to learn.
+"""
+import argparse
+import time
+from collections import Counter
+
+from sqlalchemy import text
+
+from database import engine
+from weights import parse_weight
+
+# (table, order or pawn id column, weight column prefix)
+TABLES = [
+    ("order_details", "order_id", "order_weight"),
+    ("pawn_details", "pawn_id", "pawn_weight"),
+]
+
+
+def backfill(table: str, id_column: str, prefix: str, batch_size: int, pause: float) -> Counter:
+    """Parse one table's weights; returns how often each unparseable text was seen."""
+    select_batch = text(f"""
+        SELECT {id_column}, prod_id, {prefix} FROM {table}
+        WHERE ({id_column}, prod_id) > (:last_id, :last_prod_id) AND {prefix}_unit IS NULL
+        ORDER BY {id_column}, prod_id
+        LIMIT :limit
+    """)
+    update_batch = text(f"""
+        UPDATE {table} d
+        SET {prefix}_value = v.value, {prefix}_unit = v.unit, {prefix}_grams = v.grams
+        FROM unnest(
+            CAST(:ids AS integer[]), CAST(:prod_ids AS integer[]),
+            CAST(:values AS float8[]), CAST(:units AS text[]), CAST(:grams AS float8[])
+        ) AS v(id, prod_id, value, unit, grams)
+        WHERE d.{id_column} = v.id AND d.prod_id = v.prod_id
+    """)
+    unparsed = Counter()
+    updated = 0
+    last = (0, 0)
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(select_batch, {"last_id": last[0], "last_prod_id": last[1], "limit": batch_size}).all()
+            if not rows:
+                break
+            batch = {"ids": [], "prod_ids": [], "values": [], "units": [], "grams": []}
+            for row_id, prod_id, weight_text in rows:
+                try:
+                    weight = parse_weight(weight_text)
+                except ValueError:
+                    weight = None
+                if weight is None:
+                    unparsed[weight_text] += 1
+                    continue
+                batch["ids"].append(row_id)
+                batch["prod_ids"].append(prod_id)
+                batch["values"].append(weight.value)
+                batch["units"].append(weight.unit)
+                batch["grams"].append(weight.grams)
+            if batch["ids"]:
+                conn.execute(update_batch, batch)
+        updated += len(batch["ids"])
+        last = tuple(rows[-1][:2])
+        print(f"{table}: {updated} parsed, {sum(unparsed.values())} not weights", end="\r", flush=True)
+        time.sleep(pause)
+    print(f"{table}: {updated} parsed, {sum(unparsed.values())} not weights")
+    return unparsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--pause", type=float, default=0.1, help="seconds between batches, to leave the database room")
+    args = parser.parse_args()
+
+    for table, id_column, prefix in TABLES:
+        unparsed = backfill(table, id_column, prefix, args.batch_size, args.pause)
+        for weight_text, count in unparsed.most_common(20):
+            print(f"  {count:>6} x {weight_text!r}")
+    # Every row was rewritten: VACUUM so the gram sums can be index-only scans again
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table, _, _ in TABLES:
+            conn.execute(text(f"VACUUM ANALYZE {table}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Load test of the running API.
+
+Scenarios run one after another, each with --concurrency virtual users looping
+for --duration seconds against --base-url (e.g. `docker compose up`):
+
+    sign_in       sign-in storm across --staff accounts (bcrypt in the password pool)
+    order_entry   POST /staff/order with 2-6 lines, mostly known products, some new
+    pawn_entry    POST /staff/pawn with 1-3 lines
+    search        search-as-you-type: one request per keystroke of a product name
+    print_reads   print pages followed by cursor, client order/pawn lookups
+
+Payloads come from --seed, so two runs send the same mix. Latency p50/p95/p99
+and throughput are reported per scenario and endpoint:
+
+    python -m benchmarks.load_test --save-baseline baseline.json
+    python -m benchmarks.load_test --baseline baseline.json
+
+With --baseline the run exits 1 when an endpoint's p95 or error rate grows, or
+its throughput drops, by more than --tolerance. Compare runs made with the same
+options on the same machine.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+PASSWORD = "load-test"
+WEIGHT_UNITS = ["chi", "hun", "g", "li"]
+
+
+@dataclass
+class EndpointStats:
+    latencies: List[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    errors: int = 0
+
+    def summary(self, seconds: float) -> Dict:
+        count = len(self.latencies)
+        cuts = statistics.quantiles(self.latencies, n=100, method="inclusive") if count > 1 else self.latencies * 99
+        return {
+            "count": count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "rps": round(count / seconds, 2),
+            "p50": round(cuts[49], 2) if cuts else None,
+            "p95": round(cuts[94], 2) if cuts else None,
+            "p99": round(cuts[98], 2) if cuts else None,
+            "statuses": {str(status): n for status, n in sorted(self.statuses.items(), key=str)},
+        }
+
+
+class Recorder:
+    """Times requests and files them under "METHOD /route/template"."""
+
+    def __init__(self):
+        self.endpoints: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, ok=(200,), **kwargs) -> Optional[httpx.Response]:
+        stats = self.endpoints[f"{method} {route}"]
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            stats.latencies.append((time.perf_counter() - start) * 1000)
+            stats.statuses[type(e).__name__] += 1
+            stats.errors += 1
+            return None
+        stats.latencies.append((time.perf_counter() - start) * 1000)
+        stats.statuses[response.status_code] += 1
+        if response.status_code not in ok:
+            stats.errors += 1
+        return response
+
+
+@dataclass
+class Shop:
+    """What the scenarios share: staff logins, the product catalog and a pool of customers."""
+    staff_phones: List[str]
+    headers: Dict[str, str]
+    products: List[str]
+    customers: List[Dict]
+
+
+async def sign_in(client: httpx.AsyncClient, phone_number: str) -> str:
+    response = await client.post("/sign_in", json={"phone_number": phone_number, "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()["result"]["access_token"]
+
+
+async def setup(client: httpx.AsyncClient, args) -> Shop:
+    """Idempotent: staff accounts and products that already exist are reused."""
+    rng = random.Random(args.seed)
+    staff_phones = [f"08{rng.randrange(10**7, 10**8)}" for _ in range(args.staff)]
+    for index, phone_number in enumerate(staff_phones):
+        await client.post("/create_user", params={"cus_name": f"load staff {index}", "phone_number": phone_number, "password": PASSWORD})
+    headers = {"Authorization": f"Bearer {await sign_in(client, staff_phones[0])}"}
+
+    response = await client.get("/staff/product", params={"limit": 500}, headers=headers)
+    response.raise_for_status()
+    products = [product["name"] for product in response.json()["result"] or []]
+    for index in range(max(0, args.products - len(products))):
+        name = f"load {rng.choice(['gold ring', 'necklace', 'bracelet', 'earring'])} {index}"
+        await client.post("/staff/product", json={"prod_name": name, "unit_price": round(rng.uniform(50, 900), 2), "amount": 10}, headers=headers)
+        products.append(name)
+
+    customers = [
+        {"phone_number": f"07{rng.randrange(10**7, 10**8)}", "cus_name": f"load customer {index}", "address": "Phnom Penh"}
+        for index in range(args.customers)
+    ]
+    return Shop(staff_phones, headers, products, customers)
+
+
+def weight(rng: random.Random) -> str:
+    return f"{rng.randint(1, 9)} {rng.choice(WEIGHT_UNITS)}"
+
+
+def product_name(shop: Shop, rng: random.Random) -> str:
+    # One line in ten names a product the shop has not stocked yet
+    return f"load new {rng.randrange(10**6)}" if rng.random() < 0.1 else rng.choice(shop.products)
+
+
+async def scenario_sign_in(client, shop: Shop, rng: random.Random, recorder: Recorder):
+    body = {"phone_number": rng.choice(shop.staff_phones), "password": PASSWORD}
+    await recorder.request(client, "/sign_in", "POST", "/sign_in", json=body)
+
+
+async def scenario_order_entry(client, shop: Shop, rng: random.Random, recorder: Recorder):
+    lines = {}
+    for _ in range(rng.randint(2, 6)):
+        price = round(rng.uniform(50, 900), 2)
+        lines[product_name(shop, rng)] = {
+            "order_weight": weight(rng), "order_amount": rng.randint(1, 3), "product_sell_price": price,
+            "product_labor_cost": round(price * 0.05, 2), "product_buy_price": round(price * 0.9, 2),
+        }
+    body = {
+        **rng.choice(shop.customers),
+        "order_deposit": round(rng.uniform(0, 200), 2),
+        "order_product_detail": [{"prod_name": name, **line} for name, line in lines.items()],
+    }
+    await recorder.request(client, "/staff/order", "POST", "/staff/order", json=body, headers=shop.headers)
+
+
+async def scenario_pawn_entry(client, shop: Shop, rng: random.Random, recorder: Recorder):
+    names = {product_name(shop, rng) for _ in range(rng.randint(1, 3))}
+    body = {
+        **rng.choice(shop.customers),
+        "pawn_date": "2026-01-15",
+        "pawn_expire_date": "2026-04-15",
+        "pawn_deposit": round(rng.uniform(0, 200), 2),
+        "pawn_product_detail": [
+            {"prod_name": name, "pawn_weight": weight(rng), "pawn_amount": 1, "pawn_unit_price": round(rng.uniform(50, 900), 2)}
+            for name in names
+        ],
+    }
+    await recorder.request(client, "/staff/pawn", "POST", "/staff/pawn", json=body, headers=shop.headers)
+
+
+async def scenario_search(client, shop: Shop, rng: random.Random, recorder: Recorder):
+    name = rng.choice(shop.products)
+    for length in range(2, min(len(name), 12) + 1):
+        await recorder.request(
+            client, "/staff/products/search/{search_input}", "GET", f"/staff/products/search/{name[:length]}",
+            ok=(200, 404), headers=shop.headers,
+        )
+
+
+async def scenario_print_reads(client, shop: Shop, rng: random.Random, recorder: Recorder):
+    for route in ("/staff/orders/print", "/staff/pawn/print"):
+        params = {"limit": 50}
+        for _ in range(rng.randint(1, 3)):
+            response = await recorder.request(client, route, "GET", route, params=params)
+            cursor = response.json().get("next_cursor") if response is not None and response.status_code == 200 else None
+            if not cursor:
+                break
+            params["after"] = cursor
+    phone_number = rng.choice(shop.customers)["phone_number"]
+    for route in ("/staff/order", "/staff/pawn", "/staff/order/client_phone"):
+        await recorder.request(client, route, "GET", route, ok=(200, 404), params={"phone_number": phone_number}, headers=shop.headers)
+
+
+SCENARIOS = {
+    "sign_in": scenario_sign_in,
+    "order_entry": scenario_order_entry,
+    "pawn_entry": scenario_pawn_entry,
+    "search": scenario_search,
+    "print_reads": scenario_print_reads,
+}
+
+
+async def run_scenario(client, shop: Shop, name: str, args) -> Dict:
+    recorder = Recorder()
+    deadline = time.perf_counter() + args.duration
+
+    async def user(index: int):
+        rng = random.Random(f"{args.seed}:{name}:{index}")
+        while time.perf_counter() < deadline:
+            await SCENARIOS[name](client, shop, rng, recorder)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(index) for index in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    return {route: stats.summary(elapsed) for route, stats in sorted(recorder.endpoints.items())}
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressions against a baseline from an earlier run, one line each."""
+    problems = []
+    for scenario, endpoints in baseline.items():
+        for route, before in endpoints.items():
+            after = results.get(scenario, {}).get(route)
+            if after is None:
+                continue
+            label = f"{scenario} {route}"
+            if before["p95"] and after["p95"] > before["p95"] * (1 + tolerance):
+                problems.append(f"{label}: p95 {after['p95']}ms > {before['p95']}ms")
+            if after["rps"] < before["rps"] * (1 - tolerance):
+                problems.append(f"{label}: {after['rps']} req/s < {before['rps']} req/s")
+            if after["error_rate"] > before["error_rate"] + 0.01:
+                problems.append(f"{label}: error rate {after['error_rate']:.2%} > {before['error_rate']:.2%}")
+    return problems
+
+
+async def run(args) -> Dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        shop = await setup(client, args)
+        results = {}
+        for name in args.scenario or SCENARIOS:
+            results[name] = await run_scenario(client, shop, name, args)
+            for route, summary in results[name].items():
+                print(
+                    f"{name:<12} {route:<46} n={summary['count']:<6} {summary['rps']:>8.1f} req/s "
+                    f"p50={summary['p50']:>8.1f}ms p95={summary['p95']:>8.1f}ms p99={summary['p99']:>8.1f}ms "
+                    f"errors={summary['errors']} {summary['statuses']}"
+                )
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="repeatable; default all")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users per scenario")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--staff", type=int, default=10, help="staff accounts for the sign-in storm")
+    parser.add_argument("--products", type=int, default=200, help="catalog size to make sure of before the run")
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--save-baseline", help="write the results here for later --baseline runs")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    for path in filter(None, (args.json, args.save_baseline)):
+        with open(path, "w") as file:
+            json.dump(results, file, indent=1)
+    if args.baseline:
+        with open(args.baseline) as file:
+            problems = compare(results, json.load(file), args.tolerance)
+        for problem in problems:
+            print(f"FAIL {problem}")
+        if problems:
+            sys.exit(1)
+        print("no regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Product search: Postgres `ILIKE '%term%'` versus the in-memory n-gram index.
+
+Loads N synthetic product names into a temporary table (same column type as
+`products.prod_name`) and into an `NgramIndex`, then replays search-as-you-type
+terms against both and reports per-query latency.
+
+    python -m benchmarks.product_search --sizes 10000 100000 1000000
+
+Uses DATABASEURL (or --db-url); nothing is written to the real tables.
+"""
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.user.search_index import NgramIndex
+
+load_dotenv()
+
+ITEMS = ["ring", "necklace", "bracelet", "earring", "pendant", "chain", "anklet", "bangle", "ចិញ្ចៀន", "ខ្សែក", "ខ្សែដៃ"]
+METALS = ["gold", "white gold", "rose gold", "silver", "platinum", "មាស", "ប្រាក់"]
+STYLES = ["classic", "twisted", "hollow", "dragon", "lotus", "heart", "plain", "diamond", "baby", "wedding"]
+PURITIES = ["24k", "22k", "18k", "14k", "9999", "990", ""]
+
+
+def product_names(size: int, seed: int):
+    rng = random.Random(seed)
+    for prod_id in range(1, size + 1):
+        parts = [rng.choice(METALS), rng.choice(STYLES), rng.choice(ITEMS), rng.choice(PURITIES), str(prod_id)]
+        yield prod_id, " ".join(part for part in parts if part)
+
+
+def typing_terms(seed: int, count: int):
+    """Prefixes of real words, as the POS sends them keystroke by keystroke."""
+    rng = random.Random(seed + 1)
+    words = ITEMS + STYLES + ["gold", "silver", "18k"]
+    terms = []
+    while len(terms) < count:
+        word = rng.choice(words)
+        terms.extend(word[:length] for length in range(3, len(word) + 1))
+    return terms[:count]
+
+
+def selective_terms(seed: int, count: int, size: int):
+    """Terms that match few products: catalog-number fragments and typos."""
+    rng = random.Random(seed + 2)
+    typos = ["neklace", "braclet", "pendnt", "earing", "dragn lotus"]
+    terms = []
+    while len(terms) < count:
+        if rng.random() < 0.8:
+            terms.append(str(rng.randint(1, size)).zfill(4)[-5:])
+        else:
+            terms.append(rng.choice(typos))
+    return terms
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def timed(fn, terms):
+    samples = []
+    for term in terms:
+        start = time.perf_counter()
+        fn(term)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def run(db_url: str, size: int, queries: int, limit: int, seed: int):
+    names = list(product_names(size, seed))
+    workloads = {
+        "typing": typing_terms(seed, queries),
+        "selective": selective_terms(seed, queries, size),
+    }
+
+    engine = create_engine(db_url)
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TEMP TABLE bench_products (prod_id integer PRIMARY KEY, prod_name varchar NOT NULL)"))
+        buffer = io.StringIO("".join(f"{prod_id}\t{name}\n" for prod_id, name in names))
+        cursor = conn.connection.cursor()
+        cursor.copy_expert("COPY bench_products (prod_id, prod_name) FROM STDIN", buffer)
+        conn.execute(text("ANALYZE bench_products"))
+
+        query = text("SELECT prod_id, prod_name FROM bench_products WHERE prod_name ILIKE :pattern LIMIT :limit")
+        ilike = {
+            workload: timed(lambda term: conn.execute(query, {"pattern": f"%{term}%", "limit": limit}).all(), terms)
+            for workload, terms in workloads.items()
+        }
+        conn.rollback()
+
+    start = time.perf_counter()
+    index = NgramIndex(ttl=float("inf"))
+    index.load({"id": prod_id, "name": name, "price": None, "amount": None} for prod_id, name in names)
+    build_seconds = time.perf_counter() - start
+    ngram = {workload: timed(lambda term: index.search(term, limit), terms) for workload, terms in workloads.items()}
+
+    for workload in workloads:
+        for label, samples in (("ilike", ilike[workload]), ("ngram", ngram[workload])):
+            print(
+                f"{size:>9} {workload:<9} {label:<6} p50={statistics.median(samples):8.3f}ms "
+                f"p95={percentile(samples, 0.95):8.3f}ms p99={percentile(samples, 0.99):8.3f}ms"
+            )
+    print(f"{size:>9} index build {build_seconds:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default=os.getenv("DATABASEURL"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(args.db_url, size, args.queries, args.limit, args.seed)
+
+
+if __name__ == "__main__":
+    main()
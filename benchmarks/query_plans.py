@@ -0,0 +1,411 @@
+"""
+Query plans of every Staff repository method.
+
+Seeds a scratch Postgres database with shop-sized volumes (in-database
+generate_series, deterministic from --seed), calls each Staff method the way the
+routes do, and captures every statement it sends. SELECTs are explained with
+EXPLAIN (ANALYZE, BUFFERS) as they run, rolled back before the statement itself
+runs; plain writes get a plain EXPLAIN. Everything a case writes is rolled back.
+
+    alembic upgrade head
+    python -m benchmarks.query_plans --seed-data --json plans.json --report plans.md
+    python -m benchmarks.query_plans --json after.json --compare before.json --report plans.md
+    python -m benchmarks.query_plans --check
+
+--check is the plan regression gate: it exits 1 when a statement seq-scans a
+large table its case is not budgeted to scan, or touches more shared buffers
+than its case's budget (BUDGETS). Offline, against a throwaway dockerized
+Postgres:
+
+    docker compose --profile plans run --rm plan-check
+
+Point DATABASEURL (or --db-url) at a scratch database: --seed-data refuses to
+run on one that already has accounts.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+
+from entities import Order
+from profiler import fingerprint
+from routes.user.model import BuyProducts, CreateClient, CreateOrder, CreatePawn, CreateProduct, PawnProductDetail
+from routes.user import expiry, summaries
+from routes.user.product_cache import product_cache
+from routes.user.repository import Staff
+from routes.user.search_index import search_index
+
+FIRST_NAMES = ["Dara", "Sokha", "Vanna", "Sophea", "Rithy", "Chenda", "Bopha", "Kosal", "សុខា", "ដារ៉ា", "វណ្ណា", "សុភា", "ចន្ទា"]
+PRODUCT_WORDS = ["gold ring", "gold necklace", "bracelet", "earring", "pendant", "chain", "ចិញ្ចៀនមាស", "ខ្សែកមាស"]
+
+
+def seed(engine, customers: int, products: int, orders: int, pawns: int, seed_value: float):
+    """Fill an empty, migrated database. Repeat customers and popular products are skewed with random()^k."""
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT count(*) FROM accounts")).scalar():
+            raise SystemExit("Refusing to seed: accounts is not empty. Use a scratch database.")
+        conn.execute(text("SELECT setseed(:seed)"), {"seed": seed_value})
+        conn.execute(text("""
+            INSERT INTO accounts (cus_name, address, phone_number, role, created_at, updated_at)
+            SELECT (:names)[1 + floor(random() * cardinality(:names))::int] || ' ' || g,
+                   'Phnom Penh', '0' || (10000000 + g)::text, 'user',
+                   now() - random() * interval '1095 days', now() - random() * interval '30 days'
+            FROM generate_series(1, :customers) g
+        """), {"names": FIRST_NAMES, "customers": customers})
+        admin_id = conn.execute(text("""
+            INSERT INTO accounts (cus_name, phone_number, role, created_at, updated_at)
+            VALUES ('admin', '0999999999', 'admin', now(), now()) RETURNING cus_id
+        """)).scalar()
+        conn.execute(text("""
+            INSERT INTO products (prod_name, normalized_name, unit_price, amount, user_id, created_at, updated_at)
+            SELECT name, name, round((random() * 2000)::numeric, 2), floor(random() * 20)::int, :admin,
+                   now() - random() * interval '1095 days', now() - random() * interval '30 days'
+            FROM (
+                -- The words are already in normalized form
+                SELECT (:words)[1 + floor(random() * cardinality(:words))::int] || ' ' || g AS name
+                FROM generate_series(1, :products) g
+            ) named
+        """), {"words": PRODUCT_WORDS, "products": products, "admin": admin_id})
+        conn.execute(text("""
+            INSERT INTO orders (cus_id, order_deposit, order_date)
+            SELECT 1 + floor(power(random(), 1.25) * :customers)::int, round((random() * 500)::numeric, 2),
+                   now() - random() * interval '1095 days'
+            FROM generate_series(1, :orders) g
+        """), {"customers": customers, "orders": orders})
+        conn.execute(text("""
+            INSERT INTO order_details (order_id, prod_id, order_weight, order_weight_value, order_weight_unit, order_weight_grams,
+                                       order_amount, product_sell_price, product_labor_cost, product_buy_price, order_date, created_at)
+            SELECT o.order_id, line.prod_id, '1 chi', 1, 'chi', 3.75, 1, 500, 20, 450, o.order_date, o.order_date
+            FROM orders o
+            CROSS JOIN LATERAL (
+                SELECT DISTINCT 1 + floor(power(random(), 3) * :products)::int AS prod_id
+                FROM generate_series(1, 1 + floor(random() * 3)::int + 0 * o.order_id)
+            ) line
+        """), {"products": products})
+        conn.execute(text("""
+            INSERT INTO pawns (cus_id, pawn_deposit, pawn_date, pawn_expire_date, status)
+            SELECT 1 + floor(power(random(), 1.25) * :customers)::int, round((random() * 500)::numeric, 2), d, d + interval '90 days',
+                   -- closed pawns, except the last week of expiries, which are left for expire_batch
+                   CASE WHEN d + interval '90 days' >= now() - interval '7 days' THEN 'active'
+                        WHEN random() < 0.8 THEN 'redeemed'
+                        ELSE 'expired' END::pawn_status
+            FROM (SELECT now() - random() * interval '1095 days' AS d FROM generate_series(1, :pawns)) dates
+        """), {"customers": customers, "pawns": pawns})
+        conn.execute(text("""
+            INSERT INTO pawn_details (pawn_id, prod_id, pawn_weight, pawn_weight_value, pawn_weight_unit, pawn_weight_grams,
+                                      pawn_amount, pawn_unit_price, created_at)
+            SELECT p.pawn_id, line.prod_id, '2 hun', 2, 'hun', 0.75, 1, 300, p.pawn_date
+            FROM pawns p
+            CROSS JOIN LATERAL (
+                SELECT DISTINCT 1 + floor(power(random(), 3) * :products)::int AS prod_id
+                FROM generate_series(1, 1 + floor(random() * 2)::int + 0 * p.pawn_id)
+            ) line
+        """), {"products": products})
+    with engine.begin() as conn:
+        summaries.rebuild(conn)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE"))
+
+
+@dataclass
+class Statement:
+    sql: str
+    analyzed: bool
+    ms: Optional[float]
+    buffers: Optional[int]
+    seq_scans: List[str]
+    nodes: List[str]
+    plan_rows: Optional[int] = None
+
+
+@dataclass
+class CaseResult:
+    name: str
+    statements: List[Statement] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Budget:
+    """What each statement of a case may cost: shared buffers touched, and the large tables it may seq-scan."""
+    buffers: int = 500
+    seq_scans: Tuple[str, ...] = ()
+
+
+# Cases not listed get Budget(). Seq scans listed here are deliberate: full
+# counts, substring LIKE and the search index load.
+BUDGETS: Dict[str, Budget] = {
+    "get_product (with_total)": Budget(buffers=1_000, seq_scans=("products",)),
+    "get_order_by_id (page)": Budget(buffers=8_000),
+    "get_order_by_id (pgjson page)": Budget(buffers=8_000),
+    "get_pawn_by_id (page)": Budget(buffers=8_000),
+    "get_product_by_name": Budget(buffers=1_000, seq_scans=("products",)),
+    "search_product": Budget(buffers=1_000, seq_scans=("products",)),
+    "get_all_pawns (phone)": Budget(buffers=3_000, seq_scans=("accounts",)),
+    # A page of 100 pawns, each with its customer and its lines' principal
+    "get_expiring_pawns": Budget(buffers=1_500),
+    # A batch of 500 pawns leaving active: one index-only lookup of each pawn's line grams
+    "expire_batch": Budget(buffers=2_000),
+}
+
+LARGE_TABLE_ROWS = 10_000
+
+
+def plan_nodes(node: Dict, nodes: List[str], seq_scans: List[str]):
+    label = node["Node Type"]
+    if "Index Name" in node:
+        label += f" using {node['Index Name']}"
+    if "Relation Name" in node:
+        label += f" on {node['Relation Name']}"
+        if node["Node Type"] == "Seq Scan":
+            seq_scans.append(node["Relation Name"])
+    nodes.append(label)
+    for child in node.get("Plans", ()):
+        plan_nodes(child, nodes, seq_scans)
+
+
+def explain(cursor, statement: str, parameters) -> Statement:
+    analyzed = statement.lstrip().upper().startswith(("SELECT", "WITH"))
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyzed else "FORMAT JSON"
+    cursor.execute(f"EXPLAIN ({options}) {statement}", parameters)
+    result = cursor.fetchone()[0]
+    document = (json.loads(result) if isinstance(result, str) else result)[0]
+    plan = document["Plan"]
+    nodes, seq_scans = [], []
+    plan_nodes(plan, nodes, seq_scans)
+    buffers = plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0) if analyzed else None
+    return Statement(
+        sql=fingerprint(statement),
+        analyzed=analyzed,
+        ms=round(document["Execution Time"], 3) if analyzed else None,
+        buffers=buffers,
+        seq_scans=seq_scans,
+        nodes=nodes,
+        plan_rows=plan.get("Plan Rows"),
+    )
+
+
+def sample(engine) -> Dict:
+    """Real keys from the seeded data for the cases to look up."""
+    with engine.connect() as conn:
+        row = conn.execute(text("""
+            SELECT a.cus_id, a.cus_name, a.phone_number, o.order_id
+            FROM orders o JOIN accounts a ON a.cus_id = o.cus_id
+            WHERE a.role = 'user' ORDER BY o.order_id DESC LIMIT 1
+        """)).one()
+        pawn_id = conn.execute(text("SELECT max(pawn_id) FROM pawns")).scalar()
+        active_pawn_id = conn.execute(text("SELECT max(pawn_id) FROM pawns WHERE status = 'active'")).scalar()
+        product = conn.execute(text("SELECT prod_id, prod_name FROM products ORDER BY prod_id DESC LIMIT 1")).one()
+        admin_id = conn.execute(text("SELECT cus_id FROM accounts WHERE role = 'admin' LIMIT 1")).scalar()
+        # A number no account has, so create_client takes its INSERT path
+        new_phone = conn.execute(text("SELECT 'plan-check-' || (coalesce(max(cus_id), 0) + 1) FROM accounts")).scalar()
+    return {
+        "cus_id": row.cus_id, "cus_name": row.cus_name, "phone_number": row.phone_number,
+        "order_id": row.order_id, "pawn_id": pawn_id, "active_pawn_id": active_pawn_id, "prod_id": product.prod_id,
+        "prod_name": product.prod_name, "user": {"id": admin_id, "role": "admin"}, "new_phone": new_phone,
+    }
+
+
+def cases(s: Dict) -> Dict[str, Callable[[Staff, Session], object]]:
+    """Every Staff method that touches the database, called the way its route calls it."""
+    order_lines = [
+        BuyProducts(prod_name=s["prod_name"], order_weight="1 chi", order_amount=1, product_sell_price=10, product_labor_cost=1, product_buy_price=8),
+        BuyProducts(prod_name="new product a", order_weight="1 chi", order_amount=1, product_sell_price=10, product_labor_cost=1, product_buy_price=8),
+    ]
+    pawn_lines = [PawnProductDetail(prod_name=s["prod_name"], pawn_weight="2 hun", pawn_amount=1, pawn_unit_price=100)]
+    return {
+        "create_client": lambda staff, db: staff.create_client(CreateClient(cus_name="x", address="x", phone_number=s["new_phone"]), db),
+        "create_product": lambda staff, db: staff.create_product(CreateProduct(prod_name="brand new product", unit_price=1.0, amount=1), db, s["user"]),
+        "save_customer": lambda staff, db: staff.save_customer(db, s["phone_number"], s["cus_name"], "Phnom Penh"),
+        "create_order": lambda staff, db: staff.create_order(CreateOrder(phone_number=s["phone_number"], cus_name=s["cus_name"], order_deposit=5, order_product_detail=order_lines), db, s["user"]),
+        "create_pawn": lambda staff, db: staff.create_pawn(CreatePawn(phone_number=s["phone_number"], cus_name=s["cus_name"], pawn_date="2026-01-01", pawn_expire_date="2026-04-01", pawn_deposit=5, pawn_product_detail=pawn_lines), db, s["user"]),
+        "get_product (page)": lambda staff, db: staff.get_product(db, limit=50),
+        "get_product (with_total)": lambda staff, db: staff.get_product(db, limit=50, with_total=True),
+        "get_client (page)": lambda staff, db: staff.get_client(db, limit=50),
+        "get_order_by_id (page)": lambda staff, db: staff.get_order_by_id(db, limit=20),
+        "get_order_by_id (order_id)": lambda staff, db: staff.get_order_by_id(db, order_id=s["order_id"]),
+        "get_order_by_id (pgjson page)": lambda staff, db: staff.get_order_by_id(db, limit=20, pgjson=True),
+        "get_pawn_by_id (page)": lambda staff, db: staff.get_pawn_by_id(db, limit=20),
+        "get_pawn_by_id (pawn_id)": lambda staff, db: staff.get_pawn_by_id(db, pawn_id=s["pawn_id"]),
+        "get_client_order (phone)": lambda staff, db: staff.get_client_order(db, phone_number=s["phone_number"]),
+        "get_client_order (name)": lambda staff, db: staff.get_client_order(db, cus_name=s["cus_name"]),
+        "get_client_order (pgjson)": lambda staff, db: staff.get_client_order(db, phone_number=s["phone_number"], pgjson=True),
+        "get_client_pawn (phone)": lambda staff, db: staff.get_client_pawn(db, phone_number=s["phone_number"]),
+        "get_client_pawn (pgjson)": lambda staff, db: staff.get_client_pawn(db, phone_number=s["phone_number"], pgjson=True),
+        "get_order_account": lambda staff, db: staff.get_order_account(db, phone_number=s["phone_number"]),
+        "get_client_by_phone": lambda staff, db: staff.get_client_by_phone(db, s["phone_number"]),
+        "get_product_by_id": lambda staff, db: staff.get_product_by_id(s["prod_id"], db),
+        "get_product_by_name": lambda staff, db: staff.get_product_by_name(s["prod_name"], db),
+        "search_product": lambda staff, db: staff.search_product(s["prod_name"][:6], db),
+        "get_all_pawns (phone)": lambda staff, db: staff.get_all_pawns(db, phone_number=s["phone_number"]),
+        "update_product (name)": lambda staff, db: staff.update_product(db, prod_name=s["prod_name"], unit_price=9.0),
+        "reserve_ids": lambda staff, db: staff.reserve_ids(db, "order", 10),
+        "reserved_id_problem": lambda staff, db: staff.reserved_id_problem(db, Order.order_id, s["order_id"]),
+        "product_version": lambda staff, db: staff.product_version(db),
+        "client_version": lambda staff, db: staff.client_version(db),
+        "get_weight_totals": lambda staff, db: staff.get_weight_totals(db, date.today() - timedelta(days=29), date.today()),
+        "get_daily_report": lambda staff, db: staff.get_daily_report(db, date.today() - timedelta(days=29), date.today()),
+        "get_product_report": lambda staff, db: staff.get_product_report(db, date.today() - timedelta(days=29), date.today()),
+        "get_expiring_pawns": lambda staff, db: staff.get_expiring_pawns(db, days=30, limit=100),
+        "update_pawn_status": lambda staff, db: staff.update_pawn_status(db, s["active_pawn_id"], "redeemed"),
+        "expire_batch": lambda staff, db: expiry.expire_batch(db.connection(), date.today()),
+    }
+
+
+def run_case(engine, name: str, call) -> CaseResult:
+    result = CaseResult(name)
+    product_cache.invalidate()
+    search_index.invalidate()
+    with engine.connect() as conn:
+        outer = conn.begin()
+        explain_cursor = conn.connection.dbapi_connection.cursor()
+
+        def capture(connection, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith(("SAVEPOINT", "RELEASE", "ROLLBACK")):
+                return
+            if executemany and isinstance(parameters, (list, tuple)):
+                parameters = parameters[0]
+            # EXPLAIN ANALYZE runs the statement, and a WITH can write: undo it before the real run
+            explain_cursor.execute("SAVEPOINT explain_plan")
+            try:
+                result.statements.append(explain(explain_cursor, statement, parameters))
+            except Exception as e:
+                result.error = f"EXPLAIN failed: {e}"
+            finally:
+                explain_cursor.execute("ROLLBACK TO SAVEPOINT explain_plan")
+                explain_cursor.execute("RELEASE SAVEPOINT explain_plan")
+
+        event.listen(conn, "before_cursor_execute", capture)
+        # Commits inside the method only release a savepoint; the outer transaction is rolled back
+        db = Session(bind=conn, join_transaction_mode="create_savepoint")
+        try:
+            call(Staff(), db)
+        except Exception as e:
+            result.error = result.error or f"{type(e).__name__}: {getattr(e, 'detail', e)}"
+        finally:
+            event.remove(conn, "before_cursor_execute", capture)
+            db.close()
+            outer.rollback()
+    return result
+
+
+def render_statement(statement: Statement) -> str:
+    cost = f"{statement.ms} ms, {statement.buffers} buffers" if statement.analyzed else "plan only"
+    seq = f" **seq scan: {', '.join(statement.seq_scans)}**" if statement.seq_scans else ""
+    return f"{' → '.join(statement.nodes)} ({cost}){seq}"
+
+
+def report(results: List[CaseResult], before: Optional[List[CaseResult]], title: str) -> str:
+    lines = [f"# {title}", ""]
+    before_by_name = {case.name: case for case in before or []}
+    for case in results:
+        lines += [f"## {case.name}", ""]
+        if case.error:
+            lines += [f"_{case.error}_", ""]
+        previous = before_by_name.get(case.name)
+        for index, statement in enumerate(case.statements, 1):
+            lines.append(f"{index}. `{statement.sql[:160]}{'…' if len(statement.sql) > 160 else ''}`")
+            if previous is not None and index <= len(previous.statements):
+                lines.append(f"   - before: {render_statement(previous.statements[index - 1])}")
+                lines.append(f"   - after: {render_statement(statement)}")
+            else:
+                lines.append(f"   - {render_statement(statement)}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def load_results(path: str) -> List[CaseResult]:
+    with open(path) as file:
+        return [
+            CaseResult(case["name"], [Statement(**statement) for statement in case["statements"]], case["error"])
+            for case in json.load(file)
+        ]
+
+
+def large_tables(engine, min_rows: int) -> set:
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace AND reltuples >= :rows"
+        ), {"rows": min_rows})
+        return {row.relname for row in rows}
+
+
+def check(results: List[CaseResult], large: set) -> List[str]:
+    """Budget violations and failed cases, one line each."""
+    problems = []
+    for case in results:
+        budget = BUDGETS.get(case.name, Budget())
+        # A case that raises never reached the statements it is meant to check
+        if case.error:
+            problems.append(f"{case.name}: {case.error}")
+        for statement in case.statements:
+            for table in sorted(set(statement.seq_scans) & large - set(budget.seq_scans)):
+                problems.append(f"{case.name}: seq scan on {table} in `{statement.sql[:120]}`")
+            if statement.buffers is not None and statement.buffers > budget.buffers:
+                problems.append(f"{case.name}: {statement.buffers} buffers > {budget.buffers} in `{statement.sql[:120]}`")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default=os.getenv("DATABASEURL"))
+    parser.add_argument("--seed-data", action="store_true", help="seed an empty database first")
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--orders", type=int, default=300_000)
+    parser.add_argument("--pawns", type=int, default=200_000)
+    parser.add_argument("--seed", type=float, default=0.42)
+    parser.add_argument("--json", help="write the captured plans here")
+    parser.add_argument("--compare", help="plans JSON from an earlier run, shown as 'before'")
+    parser.add_argument("--report", help="write a Markdown report here")
+    parser.add_argument("--title", default="Staff query plans")
+    parser.add_argument("--check", action="store_true", help="exit 1 when a case goes over its budget")
+    parser.add_argument("--large-table-rows", type=int, default=LARGE_TABLE_ROWS,
+                        help="seq scans of tables with fewer estimated rows are not flagged")
+    args = parser.parse_args()
+
+    engine = create_engine(args.db_url)
+    if args.seed_data:
+        start = time.perf_counter()
+        seed(engine, args.customers, args.products, args.orders, args.pawns, args.seed)
+        print(f"seeded in {time.perf_counter() - start:.1f}s")
+
+    samples = sample(engine)
+    results = [run_case(engine, name, call) for name, call in cases(samples).items()]
+    for case in results:
+        worst = max((statement.ms or 0 for statement in case.statements), default=0)
+        buffers = max((statement.buffers or 0 for statement in case.statements), default=0)
+        scans = sorted({table for statement in case.statements for table in statement.seq_scans})
+        print(f"{case.name:<32} statements={len(case.statements):<3} slowest={worst:9.3f}ms buffers={buffers:<6} seq_scans={','.join(scans) or '-'}"
+              + (f"  [{case.error}]" if case.error else ""))
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump([asdict(case) for case in results], file, indent=1, ensure_ascii=False)
+    if args.report:
+        before = load_results(args.compare) if args.compare else None
+        with open(args.report, "w") as file:
+            file.write(report(results, before, args.title) + "\n")
+    if args.check:
+        problems = check(results, large_tables(engine, args.large_table_rows))
+        for problem in problems:
+            print(f"FAIL {problem}")
+        if problems:
+            sys.exit(1)
+        print(f"all {len(results)} cases within budget")
+
+
+if __name__ == "__main__":
+    main()
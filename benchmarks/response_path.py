@@ -0,0 +1,133 @@
+"""
+Response path: `PageModel` through `response_model` versus `trusted_response`.
+
+Builds payloads shaped exactly like `GET /staff/product` and `GET /staff/pawn/print`
+(using the same Staff row serializers) and serves each from two routes declared
+with the same `response_model=PageModel`: one returns a PageModel, which FastAPI
+validates and re-serializes, the other returns `trusted_response`. Only the
+response path differs, so the database is not needed.
+
+    python -m benchmarks.response_path --rows 50000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_model import PageModel, trusted_response
+from routes.user.repository import Staff
+
+
+def product_rows(rows: int, rng: random.Random):
+    return [
+        {"id": prod_id, "name": f"gold ring {prod_id}", "price": round(rng.uniform(10, 900), 2), "amount": rng.randint(0, 20)}
+        for prod_id in range(1, rows + 1)
+    ]
+
+
+def pawn_documents(rows: int, rng: random.Random):
+    """`rows` pawn lines, about three per customer, grouped as get_pawn_by_id does."""
+    staff = Staff()
+    documents = {}
+    start = datetime(2025, 1, 1)
+    for line in range(rows):
+        cus_id = line // 3 + 1
+        pawn_date = start + timedelta(days=rng.randint(0, 365))
+        row = (
+            cus_id, f"customer {cus_id}", f"0{rng.randint(10**7, 10**8)}", "Phnom Penh",
+            line + 1, round(rng.uniform(10, 500), 2), pawn_date, pawn_date + timedelta(days=90),
+            rng.randint(1, 5000), "gold necklace", "2 chi", 1, round(rng.uniform(100, 2000), 2),
+        )
+        if cus_id not in documents:
+            documents[cus_id] = staff.pawn_print_customer(row)
+        documents[cus_id]["pawns"].append(staff.pawn_print_line(row))
+    return list(documents.values())
+
+
+def add_routes(app: FastAPI, name: str, result):
+    # Endpoints take no parameters, so FastAPI does no request parsing here
+    @app.get(f"/{name}/before", response_model=PageModel)
+    async def before():
+        return PageModel(code=200, status="Success", result=result)
+
+    @app.get(f"/{name}/after", response_model=PageModel)
+    async def after():
+        return trusted_response(code=200, status="Success", result=result, next_cursor=None, total=None)
+
+
+def build_app(payloads):
+    app = FastAPI()
+    for name, result in payloads.items():
+        add_routes(app, name, result)
+    return app
+
+
+async def call(app: FastAPI, path: str) -> bytes:
+    """One GET straight through the ASGI app, so client-side decoding is not timed."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [], "client": ("bench", 0), "server": ("bench", 80),
+    }
+    chunks = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(chunks)
+
+
+async def measure(app: FastAPI, path: str, repeat: int):
+    await call(app, path)  # warm up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = await call(app, path)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, body
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    payloads = {
+        "product": product_rows(args.rows, rng),
+        "pawn-print": pawn_documents(args.rows, rng),
+    }
+    app = build_app(payloads)
+
+    for name in payloads:
+        results = {variant: await measure(app, f"/{name}/{variant}", args.repeat) for variant in ("before", "after")}
+        before, after = results["before"], results["after"]
+        assert json.loads(before[1]) == json.loads(after[1]), f"{name}: bodies differ"
+        for variant, (samples, body) in results.items():
+            print(
+                f"{name:<11} {variant:<6} rows={args.rows} p50={statistics.median(samples):8.1f}ms "
+                f"min={min(samples):8.1f}ms bytes={len(body)}"
+            )
+        print(f"{name:<11} speedup x{statistics.median(before[0]) / statistics.median(after[0]):.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Synthetic pawn-shop history for scale testing.
+
+Generates accounts, products, orders with their lines and pawns with their
+lines, and streams them into Postgres with COPY FROM STDIN. The same --seed
+always produces the same rows:
+- Customers are picked Zipf-style, so a few regulars have many orders and most
+  customers have one or two.
+- Products are picked the same way, so a few items dominate.
+- Dates are spread over --years ending at --until, with peaks around Khmer New
+  Year, Pchum Ben and the wedding season.
+- Names mix Khmer and Latin script.
+
+    alembic upgrade head
+    python -m benchmarks.seed_data --truncate
+
+About 10M rows in total: --customers 300000 --orders 2500000 --pawns 700000.
+The target tables must be empty unless --truncate is given. Sequences are moved
+past the loaded IDs, so the API keeps working on top of the data.
+"""
+import argparse
+import bisect
+import csv
+import io
+import itertools
+import math
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterator, List, Sequence, Tuple
+
+import psycopg2
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+
+from product_names import normalize_product_name
+from routes.user import summaries
+from weights import parse_weight
+
+load_dotenv()
+
+COPY_BATCH_ROWS = 50_000
+
+KHMER_FAMILY = ["សុខ", "ចាន់", "ហេង", "លី", "គឹម", "ស៊ុន", "ម៉ៅ", "ឈឹម", "ពៅ", "នួន"]
+KHMER_GIVEN = ["ដារ៉ា", "សុខា", "វណ្ណា", "សុភា", "ចន្ទា", "បុប្ផា", "រតនា", "សម្បត្តិ", "ស្រីនិច", "វិចិត្រ"]
+LATIN_FAMILY = ["Sok", "Chan", "Heng", "Ly", "Kim", "Sun", "Mao", "Chhim", "Pov", "Nuon", "Tan", "Lim"]
+LATIN_GIVEN = ["Dara", "Sokha", "Vanna", "Sophea", "Chenda", "Bopha", "Rathana", "Sambath", "Srey Nich", "Vichet", "Kosal", "Rithy"]
+PROVINCES = ["Phnom Penh", "Kandal", "Takeo", "Kampong Cham", "Siem Reap", "Battambang", "Prey Veng", "Kampot"]
+PHONE_PREFIXES = ["010", "011", "012", "015", "016", "017", "069", "070", "077", "078", "085", "086", "087", "089", "092", "093", "096", "097", "098", "099"]
+
+# (kind, Khmer kind, typical price in USD)
+PRODUCT_KINDS = [
+    ("ring", "ចិញ្ចៀន", 180), ("necklace", "ខ្សែក", 650), ("bracelet", "ខ្សែដៃ", 420),
+    ("earring", "ក្រវិល", 150), ("pendant", "ប៉ោល", 120), ("chain", "ខ្សែ", 380), ("anklet", "កងជើង", 260),
+]
+MATERIALS = [("gold 24k", "មាស ២៤", 1.0), ("gold 18k", "មាស ១៨", 0.75), ("white gold", "មាសស", 0.8), ("silver", "ប្រាក់", 0.08)]
+WEIGHT_UNITS = [("chi", 0.4), ("hun", 0.3), ("g", 0.25), ("li", 0.05)]
+ORDER_LINES = [(1, 45), (2, 30), (3, 17), (4, 8)]
+ORDER_AMOUNTS = [(1, 80), (2, 15), (3, 5)]
+PAWN_LINES = [(1, 60), (2, 30), (3, 10)]
+
+# (month, day, spread in days, extra weight): the days around these sell and pawn more
+SEASONS = [(4, 14, 10, 1.5), (9, 24, 12, 0.8), (12, 20, 45, 0.6)]
+PAWN_TERMS_DAYS = [(30, 0.35), (60, 0.25), (90, 0.3), (180, 0.1)]
+# Status of the pawns that expired before --until; the others are still active
+PAWN_OUTCOMES = [("redeemed", 75), ("forfeited", 10), ("expired", 15)]
+
+
+def zipf_cum_weights(n: int, exponent: float) -> List[float]:
+    return list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(n)))
+
+
+class Picker:
+    """Draws items by precomputed cumulative weights, O(log n) per draw."""
+
+    def __init__(self, rng: random.Random, items: Sequence, cum_weights: List[float]):
+        self.rng, self.items, self.cum_weights = rng, items, cum_weights
+        self.total = cum_weights[-1]
+
+    def __call__(self):
+        return self.items[bisect.bisect(self.cum_weights, self.rng.random() * self.total)]
+
+
+def season_weight(day: date) -> float:
+    weight = 1.0
+    for month, month_day, spread, extra in SEASONS:
+        peak = date(day.year, month, month_day)
+        distance = min(abs((day - peak.replace(year=year)).days) for year in (day.year - 1, day.year, day.year + 1))
+        weight += extra * math.exp(-((distance / spread) ** 2))
+    return weight * (1.2 if day.weekday() >= 5 else 1.0)
+
+
+def date_picker(rng: random.Random, until: date, years: int) -> Callable[[], datetime]:
+    days = [until - timedelta(days=offset) for offset in range(int(years * 365.25), 0, -1)]
+    pick_day = Picker(rng, days, list(itertools.accumulate(season_weight(day) for day in days)))
+
+    def pick() -> datetime:
+        # Shop hours, 8:00 to 18:00
+        return datetime.combine(pick_day(), datetime.min.time()) + timedelta(seconds=rng.randrange(8 * 3600, 18 * 3600))
+    return pick
+
+
+def weighted(rng: random.Random, choices: Sequence[Tuple[object, float]]) -> Picker:
+    values, weights = zip(*choices)
+    return Picker(rng, values, list(itertools.accumulate(weights)))
+
+
+def weight_texts() -> List[Tuple[str, float]]:
+    """Weights as staff type them: small counts of the Khmer units, grams to one decimal."""
+    texts = []
+    for unit, share in WEIGHT_UNITS:
+        if unit == "g":
+            grams = [tenths / 10 for tenths in range(5, 301)]
+            texts += [(f"{value:g} g", share / len(grams)) for value in grams]
+        else:
+            texts += [(f"{value} {unit}", share * part) for value, part in ((1, 0.4), (2, 0.2), (3, 0.2), (5, 0.2))]
+    return texts
+
+
+def parsed_weights(rng: random.Random) -> Picker:
+    """Picks (text, value, unit, grams) for the weight columns of a line."""
+    return weighted(rng, [((weight_text, *parse_weight(weight_text)), share) for weight_text, share in weight_texts()])
+
+
+def customer_name(rng: random.Random) -> str:
+    if rng.random() < 0.45:
+        return f"{rng.choice(KHMER_FAMILY)} {rng.choice(KHMER_GIVEN)}"
+    return f"{rng.choice(LATIN_FAMILY)} {rng.choice(LATIN_GIVEN)}"
+
+
+def account_rows(rng: random.Random, customers: int, staff: int, pick_date) -> Iterator[Tuple]:
+    phone_numbers = rng.sample(range(len(PHONE_PREFIXES) * 10**6), customers + staff)
+    for cus_id, number in enumerate(phone_numbers, 1):
+        phone_number = f"{PHONE_PREFIXES[number // 10**6]}{number % 10**6:06d}"
+        created_at = pick_date()
+        if cus_id <= staff:
+            yield cus_id, f"Staff {cus_id}", "Phnom Penh", phone_number, "admin", created_at, created_at
+        else:
+            yield cus_id, customer_name(rng), rng.choice(PROVINCES), phone_number, "user", created_at, created_at
+
+
+def product_rows(rng: random.Random, products: int, staff: int, pick_date) -> Iterator[Tuple]:
+    for prod_id in range(1, products + 1):
+        kind, khmer_kind, price = rng.choice(PRODUCT_KINDS)
+        material, khmer_material, factor = rng.choice(MATERIALS)
+        name = f"{khmer_kind}{khmer_material} {prod_id}" if rng.random() < 0.3 else f"{material} {kind} {prod_id}"
+        created_at = pick_date()
+        yield (
+            prod_id, name, round(price * factor * rng.uniform(0.6, 1.6), 2), rng.randint(0, 25), rng.randint(1, staff),
+            created_at, created_at, normalize_product_name(name),
+        )
+
+
+def line_products(rng: random.Random, pick_product, count: int) -> List[int]:
+    # Line keys are (id, prod_id), so a product appears at most once per order or pawn
+    chosen = []
+    while len(chosen) < count:
+        prod_id = pick_product()
+        if prod_id not in chosen:
+            chosen.append(prod_id)
+    return chosen
+
+
+def order_rows(rng: random.Random, orders: int, pick_customer, pick_product, pick_date, prices: List[float]):
+    """Yields ("orders", row) and ("order_details", row) pairs, an order before its lines."""
+    line_count, amount, weight = weighted(rng, ORDER_LINES), weighted(rng, ORDER_AMOUNTS), parsed_weights(rng)
+    for order_id in range(1, orders + 1):
+        order_date = pick_date()
+        yield "orders", (order_id, pick_customer(), round(rng.uniform(0, 300), 2), order_date)
+        for prod_id in line_products(rng, pick_product, line_count()):
+            sell = round(prices[prod_id] * rng.uniform(0.9, 1.2), 2)
+            yield "order_details", (
+                order_id, prod_id, *weight(), amount(), sell,
+                round(sell * rng.uniform(0.03, 0.1), 2), round(sell * rng.uniform(0.8, 0.95), 2), order_date, order_date,
+            )
+
+
+def pawn_rows(rng: random.Random, pawns: int, pick_customer, pick_product, pick_date, prices: List[float], until: date):
+    """Yields ("pawns", row) and ("pawn_details", row) pairs, a pawn before its lines."""
+    line_count, term, weight = weighted(rng, PAWN_LINES), weighted(rng, PAWN_TERMS_DAYS), parsed_weights(rng)
+    outcome = weighted(rng, PAWN_OUTCOMES)
+    for pawn_id in range(1, pawns + 1):
+        pawn_date = pick_date()
+        expire_date = pawn_date + timedelta(days=term())
+        status = outcome() if expire_date.date() < until else "active"
+        yield "pawns", (pawn_id, pick_customer(), round(rng.uniform(0, 200), 2), pawn_date, expire_date, status)
+        for prod_id in line_products(rng, pick_product, line_count()):
+            yield "pawn_details", (pawn_id, prod_id, *weight(), 1, round(prices[prod_id] * rng.uniform(0.5, 0.8), 2), pawn_date)
+
+
+COLUMNS = {
+    "accounts": ("cus_id", "cus_name", "address", "phone_number", "role", "created_at", "updated_at"),
+    "products": ("prod_id", "prod_name", "unit_price", "amount", "user_id", "created_at", "updated_at", "normalized_name"),
+    "orders": ("order_id", "cus_id", "order_deposit", "order_date"),
+    "order_details": ("order_id", "prod_id", "order_weight", "order_weight_value", "order_weight_unit", "order_weight_grams",
+                      "order_amount", "product_sell_price",
+                      "product_labor_cost", "product_buy_price", "order_date", "created_at"),
+    "pawns": ("pawn_id", "cus_id", "pawn_deposit", "pawn_date", "pawn_expire_date", "status"),
+    "pawn_details": ("pawn_id", "prod_id", "pawn_weight", "pawn_weight_value", "pawn_weight_unit", "pawn_weight_grams",
+                     "pawn_amount", "pawn_unit_price", "created_at"),
+}
+SEQUENCES = [("accounts", "cus_id"), ("products", "prod_id"), ("orders", "order_id"), ("pawns", "pawn_id")]
+
+
+class CopyWriter:
+    """
+    Buffers CSV rows per table. Every COPY_BATCH_ROWS rows all buffers are
+    sent, one COPY per table, parents before children for the foreign keys.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.buffers = {table: io.StringIO() for table in COLUMNS}
+        self.writers = {table: csv.writer(buffer) for table, buffer in self.buffers.items()}
+        self.counts = dict.fromkeys(COLUMNS, 0)
+        self.pending = 0
+
+    def write(self, table: str, row: Tuple):
+        self.writers[table].writerow(row)
+        self.counts[table] += 1
+        self.pending += 1
+        if self.pending >= COPY_BATCH_ROWS:
+            self.flush()
+
+    def flush(self):
+        for table, buffer in self.buffers.items():
+            if buffer.tell():
+                buffer.seek(0)
+                self.cursor.copy_expert(f"COPY {table} ({', '.join(COLUMNS[table])}) FROM STDIN WITH (FORMAT csv)", buffer)
+                buffer.seek(0)
+                buffer.truncate()
+        self.pending = 0
+
+
+def load(engine, args):
+    rng = random.Random(args.seed)
+    pick_date = date_picker(rng, args.until, args.years)
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT count(*) FROM accounts")
+        if cursor.fetchone()[0] and not args.truncate:
+            raise SystemExit("Refusing to seed: accounts is not empty. Pass --truncate to replace everything.")
+        cursor.execute(f"TRUNCATE {', '.join(COLUMNS)} RESTART IDENTITY CASCADE")
+        cursor.execute("SET LOCAL synchronous_commit = off")
+        # The rows are consistent by construction, so skip the per-row foreign key
+        # triggers when allowed to (superuser, as in docker-compose.yaml)
+        cursor.execute("SAVEPOINT seed")
+        try:
+            cursor.execute("SET LOCAL session_replication_role = replica")
+        except psycopg2.errors.InsufficientPrivilege:
+            cursor.execute("ROLLBACK TO SAVEPOINT seed")
+            print("not a superuser: foreign keys are checked row by row")
+        copy = CopyWriter(cursor)
+
+        for row in account_rows(rng, args.customers, args.staff, pick_date):
+            copy.write("accounts", row)
+        prices = [0.0]
+        for row in product_rows(rng, args.products, args.staff, pick_date):
+            prices.append(row[2])
+            copy.write("products", row)
+
+        # Regulars and best sellers are spread over the ID range, not bunched at the start
+        customer_ids = list(range(args.staff + 1, args.staff + args.customers + 1))
+        rng.shuffle(customer_ids)
+        pick_customer = Picker(rng, customer_ids, zipf_cum_weights(len(customer_ids), args.customer_skew))
+        product_ids = list(range(1, args.products + 1))
+        rng.shuffle(product_ids)
+        pick_product = Picker(rng, product_ids, zipf_cum_weights(len(product_ids), args.product_skew))
+
+        for table, row in order_rows(rng, args.orders, pick_customer, pick_product, pick_date, prices):
+            copy.write(table, row)
+        for table, row in pawn_rows(rng, args.pawns, pick_customer, pick_product, pick_date, prices, args.until):
+            copy.write(table, row)
+        copy.flush()
+
+        for table, column in SEQUENCES:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), coalesce(max({column}), 0) + 1, false) FROM {table}"
+            )
+        connection.commit()
+        with engine.begin() as conn:
+            summaries.rebuild(conn)
+        cursor.execute("ANALYZE")
+        connection.commit()
+        return copy.counts
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default=os.getenv("DATABASEURL"))
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--staff", type=int, default=5)
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--orders", type=int, default=500_000)
+    parser.add_argument("--pawns", type=int, default=200_000)
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--until", type=date.fromisoformat, default=date(2026, 1, 1), help="last day of the history")
+    parser.add_argument("--customer-skew", type=float, default=0.6, help="Zipf exponent of repeat customers")
+    parser.add_argument("--product-skew", type=float, default=1.1, help="Zipf exponent of product popularity")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--truncate", action="store_true", help="empty the tables first")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = load(create_engine(args.db_url), args)
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(", ".join(f"{table}={count}" for table, count in counts.items()))
+    print(f"{total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,127 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 import os
 from dotenv import load_dotenv
+from metrics import TimedAsyncQueuePool, TimedQueuePool, instrument_engine
+from profiler import profile_engine
 
 load_dotenv()
 
 DATABASE_URL =  os.getenv("DATABASEURL")
-engine = create_engine( DATABASE_URL, 
-                        pool_size=10,  
-                        max_overflow=20, 
-                        pool_timeout=30,  
-                        pool_recycle=1800,
-                        pool_pre_ping=True
-                    )
+POOL_OPTIONS = dict(
+    pool_size=10,
+    max_overflow=20,
+    pool_timeout=30,
+    pool_recycle=1800,
+    pool_pre_ping=True,
+)
+engine = create_engine(DATABASE_URL, poolclass=TimedQueuePool, pool_logging_name="primary", **POOL_OPTIONS)
+instrument_engine(engine, "primary")
+profile_engine(engine)
+
+# Read-only endpoints (catalog, print/report reads) go to the replica when one is
+# configured, keeping them off the primary that create_order/create_pawn write to.
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASEURL")
+replica_engine = engine
+if REPLICA_DATABASE_URL:
+    replica_engine = create_engine(REPLICA_DATABASE_URL, poolclass=TimedQueuePool, pool_logging_name="replica", **POOL_OPTIONS)
+    instrument_engine(replica_engine, "replica")
+    profile_engine(replica_engine)
 Base = declarative_base()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+# Async mode: requests await Postgres on the event loop (asyncpg) instead of
+# holding an AnyIO threadpool worker for the whole round trip.
+USE_ASYNC_DB = os.getenv("USE_ASYNC_DB", "false").lower() in ("1", "true", "yes")
+
+def _async_url(url: str) -> str:
+    async_url = make_url(url)
+    if async_url.get_backend_name() == "postgresql":
+        async_url = async_url.set(drivername="postgresql+asyncpg")
+    return async_url.render_as_string(hide_password=False)
+
+async_engine = None
+async_replica_engine = None
+AsyncSessionLocal = None
+AsyncReadSessionLocal = None
+
+if USE_ASYNC_DB:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASEURL") or _async_url(DATABASE_URL)
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL, poolclass=TimedAsyncQueuePool, pool_logging_name="async_primary", **POOL_OPTIONS
+    )
+    instrument_engine(async_engine.sync_engine, "async_primary")
+    profile_engine(async_engine.sync_engine)
+    async_replica_engine = async_engine
+    if REPLICA_DATABASE_URL:
+        async_replica_engine = create_async_engine(
+            _async_url(REPLICA_DATABASE_URL), poolclass=TimedAsyncQueuePool, pool_logging_name="async_replica", **POOL_OPTIONS
+        )
+        instrument_engine(async_replica_engine.sync_engine, "async_replica")
+        profile_engine(async_replica_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    AsyncReadSessionLocal = async_sessionmaker(bind=async_replica_engine, autoflush=False, expire_on_commit=False)
+
+# The sync session factory on the same database as each async engine, for cpu_bound calls
+SYNC_SESSIONS = {}
+if USE_ASYNC_DB:
+    SYNC_SESSIONS = {async_engine: SessionLocal, async_replica_engine: ReadSessionLocal}
 
 def get_db():
     db = SessionLocal()
     try:
-        return db
+        yield db
     finally:
         db.close()
-        
\ No newline at end of file
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+get_session = get_async_db if USE_ASYNC_DB else get_db
+get_read_session = get_async_read_db if USE_ASYNC_DB else get_read_db
+
+def cpu_bound(fn):
+    """
+    Mark a repository method whose Python work (row hydration, grouping, NumPy,
+    index builds) is heavy enough to stall the event loop under run_sync.
+    """
+    fn.cpu_bound = True
+    return fn
+
+def _run_in_session(session_factory, fn, *args, **kwargs):
+    with session_factory() as session:
+        return fn(*args, db=session, **kwargs)
+
+async def run_db(fn, *args, db, **kwargs):
+    """
+    Await a sync repository call that takes a `db` session.
+    On an AsyncSession it runs through `run_sync`, so every query is awaited on the
+    event loop; on a plain Session it falls back to the threadpool as before.
+    `run_sync` also runs the call's Python work on the event loop thread, so
+    @cpu_bound methods go to the threadpool instead, on a sync session to the same
+    database: they hold a thread while they wait on Postgres, but never block the
+    other requests.
+    """
+    if AsyncSessionLocal is not None and isinstance(db, AsyncSession):
+        if getattr(fn, "cpu_bound", False):
+            return await run_in_threadpool(_run_in_session, SYNC_SESSIONS[db.bind], fn, *args, **kwargs)
+        return await db.run_sync(lambda session: fn(*args, db=session, **kwargs))
+    return await run_in_threadpool(fn, *args, db=db, **kwargs)
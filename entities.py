@@ -1,15 +1,20 @@
-from sqlalchemy import Column, DateTime, Enum, ForeignKey, Integer, String, Float
+from sqlalchemy import BigInteger, Column, Date, DateTime, Enum, ForeignKey, Index, Integer, String, Float, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
 from database import Base
+from product_names import normalize_product_name
 
 class OrderDetail(Base):
     __tablename__ = "order_details"
 
     order_id = Column(Integer, ForeignKey("orders.order_id"), primary_key = True)
-    prod_id = Column(Integer, ForeignKey("products.prod_id"), primary_key = True)
+    prod_id = Column(Integer, ForeignKey("products.prod_id"), primary_key = True, index = True)
     order_weight = Column(String, nullable=False)
+    # order_weight parsed by weights.parse_weight; NULL where it has no unit or is not a weight
+    order_weight_value = Column(Float, nullable=True)
+    order_weight_unit = Column(String, nullable=True)
+    order_weight_grams = Column(Float, nullable=True)
     order_amount = Column(Integer, nullable=True)
     product_sell_price = Column(Float, nullable=False)
     product_labor_cost = Column(Float, nullable=False)
@@ -19,13 +24,22 @@ class OrderDetail(Base):
 
     order_detail_order = relationship("Order")
     order_detail_product = relationship("Product")
+
+    __table_args__ = (
+        # Grams sold over a date range are summed from the index alone
+        Index("ix_order_details_order_date_grams", order_date, order_weight_grams),
+    )
     
 class PawnDetail(Base):
     __tablename__ = "pawn_details"
 
     pawn_id = Column(Integer, ForeignKey("pawns.pawn_id"), primary_key = True)
-    prod_id = Column(Integer, ForeignKey("products.prod_id"), primary_key = True)
+    prod_id = Column(Integer, ForeignKey("products.prod_id"), primary_key = True, index = True)
     pawn_weight = Column(String, nullable=False)
+    # pawn_weight parsed by weights.parse_weight; NULL where it has no unit or is not a weight
+    pawn_weight_value = Column(Float, nullable=True)
+    pawn_weight_unit = Column(String, nullable=True)
+    pawn_weight_grams = Column(Float, nullable=True)
     pawn_amount = Column(Integer, nullable=False)
     pawn_unit_price = Column(Float, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -33,6 +47,11 @@ class PawnDetail(Base):
     pawn_detail_pawn = relationship("Pawn")
     pawn_detail_product = relationship("Product")
 
+    __table_args__ = (
+        # Grams held by a set of pawns are summed from the index alone
+        Index("ix_pawn_details_pawn_id_grams", pawn_id, pawn_weight_grams),
+    )
+
 class Account(Base):
     __tablename__ = "accounts"
 
@@ -49,42 +68,124 @@ class Account(Base):
     account_order = relationship("Order", primaryjoin="Account.cus_id == Order.cus_id", back_populates="order_account")
     account_pawn = relationship("Pawn", primaryjoin="Account.cus_id == Pawn.cus_id", back_populates="pawn_account")
 
+    __table_args__ = (
+        # Customer lookups filter on role together with phone or name
+        Index("ix_accounts_role_phone_number", "role", "phone_number"),
+        Index("ix_accounts_lower_cus_name", func.lower(cus_name)),
+    )
+
 class Product(Base):
     __tablename__ = "products"
 
     prod_id = Column(Integer, primary_key=True, index=True)
     prod_name = Column(String, nullable=False)
+    # Matching key for prod_name: see product_names.normalize_product_name
+    normalized_name = Column(
+        String,
+        nullable=False,
+        default=lambda context: normalize_product_name(context.get_current_parameters()["prod_name"]),
+    )
     unit_price = Column(Float, nullable=True, default=None)
     amount = Column(Integer, nullable=True, default=None)
-    user_id = Column(Integer, ForeignKey("accounts.cus_id"))
+    user_id = Column(Integer, ForeignKey("accounts.cus_id"), index=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
 
     product_account = relationship("Account", foreign_keys=[user_id], back_populates="account_product")
     product_order_detail = relationship("Order", secondary=OrderDetail.__table__, back_populates="order_product_detail")
     product_pawn_detail = relationship("Pawn", secondary=PawnDetail.__table__, back_populates="pawn_product_detail")
+
+    __table_args__ = (
+        # Products are looked up and upserted by normalized name
+        Index("ix_products_normalized_name", normalized_name, unique=True),
+    )
     
 class Order(Base):
     __tablename__ = "orders"
 
     order_id = Column(Integer, primary_key=True, index=True)
-    cus_id = Column(Integer, ForeignKey("accounts.cus_id"))
+    cus_id = Column(Integer, ForeignKey("accounts.cus_id"), index=True)
     order_deposit = Column(Float, default=0, nullable=False)
     order_date = Column(DateTime, default = datetime.utcnow, nullable = False)
     
     order_account = relationship("Account", foreign_keys=[cus_id], back_populates="account_order")
     order_product_detail = relationship("Product", secondary=OrderDetail.__table__, back_populates="product_order_detail")
     
+# active -> expired by the expiry scheduler (routes/user/expiry.py); redeemed and forfeited are set by staff
+PAWN_STATUSES = ("active", "expired", "redeemed", "forfeited")
+
 class Pawn(Base):
     __tablename__ = "pawns"
 
     pawn_id = Column(Integer, primary_key=True, index=True)
-    cus_id = Column(Integer, ForeignKey("accounts.cus_id"))
+    cus_id = Column(Integer, ForeignKey("accounts.cus_id"), index=True)
     pawn_deposit = Column(Float, default=0, nullable=False)
     pawn_date = Column(DateTime, default=datetime.utcnow, nullable=False)
-    pawn_expire_date = Column(DateTime, nullable=False)
+    pawn_expire_date = Column(DateTime, nullable=False, index=True)
+    status = Column(Enum(*PAWN_STATUSES, name="pawn_status"), nullable=False, default="active", server_default="active")
 
     pawn_account = relationship("Account", foreign_keys=[cus_id], back_populates="account_pawn")
     pawn_product_detail = relationship("Product", secondary=PawnDetail.__table__, back_populates="product_pawn_detail")
-    
-    
\ No newline at end of file
+
+    # Only active pawns are indexed, so the expiry queue and the expiring list stay
+    # as small as the open book however many pawns have been closed
+    __table_args__ = (
+        Index("ix_pawns_active_expire_date", pawn_expire_date, pawn_id, postgresql_where=status == "active"),
+    )
+
+
+# Daily summaries, kept up to date by create_order / create_pawn and by pawns
+# being redeemed or forfeited, in their own transaction (routes/user/summaries.py)
+# and rebuilt by `python -m rebuild_summaries`.
+# Days are the UTC dates of the stored timestamps.
+
+class DailyTotal(Base):
+    __tablename__ = "daily_totals"
+
+    day = Column(Date, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    order_deposit = Column(Float, nullable=False, default=0)
+    order_lines = Column(Integer, nullable=False, default=0)
+    sell_total = Column(Float, nullable=False, default=0)
+    labor_total = Column(Float, nullable=False, default=0)
+    buy_total = Column(Float, nullable=False, default=0)
+    pawns = Column(Integer, nullable=False, default=0)
+    pawn_deposit = Column(Float, nullable=False, default=0)
+    principal_issued = Column(Float, nullable=False, default=0)
+    pawns_expiring = Column(Integer, nullable=False, default=0)
+    principal_expiring = Column(Float, nullable=False, default=0)
+    # Grams (and unparsed weight lines) of the pawns issued that day that are still active
+    grams_held = Column(Float, nullable=False, default=0)
+    held_unparsed_lines = Column(Integer, nullable=False, default=0)
+
+class DailyProductSale(Base):
+    __tablename__ = "daily_product_sales"
+
+    day = Column(Date, primary_key=True)
+    prod_id = Column(Integer, ForeignKey("products.prod_id"), primary_key=True, index=True)
+    lines = Column(Integer, nullable=False, default=0)
+    amount = Column(Integer, nullable=False, default=0)
+    sell_total = Column(Float, nullable=False, default=0)
+    labor_total = Column(Float, nullable=False, default=0)
+    buy_total = Column(Float, nullable=False, default=0)
+
+class DailyProductPawn(Base):
+    __tablename__ = "daily_product_pawns"
+
+    day = Column(Date, primary_key=True)
+    prod_id = Column(Integer, ForeignKey("products.prod_id"), primary_key=True, index=True)
+    lines_issued = Column(Integer, nullable=False, default=0)
+    principal_issued = Column(Float, nullable=False, default=0)
+    lines_expiring = Column(Integer, nullable=False, default=0)
+    principal_expiring = Column(Float, nullable=False, default=0)
+
+
+# One change counter per table whose list clients revalidate with an ETag
+# (/staff/product, /staff/client). Every write to the table moves it on in the
+# writer's transaction (table_versions.py).
+
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,31 @@
+import hashlib
+
+from fastapi import Request, Response
+
+
+def make_etag(version: str, variant: str = "") -> str:
+    """Strong ETag for a table version token and the query variant (page, filters) served."""
+    digest = hashlib.sha1(f"{version}|{variant}".encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match covers `etag` (weak comparison, as RFC 9110 asks for GET)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in header.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def tag_response(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    # Clients may keep the body but must revalidate before every use
+    response.headers["Cache-Control"] = "no-cache"
+    return response
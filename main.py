@@ -1,25 +1,51 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-import entities
-from database import engine
+from fastapi.responses import PlainTextResponse
+import metrics
+import profiler
 import routes.oauth2.controller as authController
 import routes.user.controller as userController
+from routes.oauth2.password_pool import password_pool
+from routes.oauth2.token_cache import token_cache
+from routes.user.expiry import expiry_scheduler
+from routes.user.product_cache import product_cache
 from fastapi.middleware.cors import CORSMiddleware
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    expiry_scheduler.start()
+    yield
+    await expiry_scheduler.stop()
+    password_pool.shutdown()
+
 app = FastAPI(
     title="Lab API",
     version="1.0.0",
     docs_url="/",
+    lifespan=lifespan,
 )
 
 app.include_router(authController.router)
 app.include_router(userController.router)
 
-entities.Base.metadata.create_all(engine)
-
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-)
\ No newline at end of file
+)
+app.add_middleware(profiler.SQLProfilerMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
+@app.get("/metrics", include_in_schema=False, response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(
+        metrics.render({
+            "product_cache": product_cache.stats(),
+            "token_cache": token_cache.stats(),
+            "password_pool": password_pool.stats(),
+            "pawn_expiry": expiry_scheduler.stats(),
+        }),
+        media_type="text/plain; version=0.0.4",
+    )
@@ -0,0 +1,215 @@
+"""
+Request, database and connection-pool metrics in Prometheus text format.
+
+`MetricsMiddleware` times every request by route template; engine events added
+by `instrument_engine` count the statements and DB time each request spends;
+`TimedQueuePool` / `TimedAsyncQueuePool` record how long a checkout waited for
+a free connection. `render()` produces the `/metrics` body.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    db_seconds: float = 0.0
+
+
+# Stats of the request being served; the threadpool and `run_sync` both run
+# in a copy of the request's context, so they update the same object
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # [bucket counts..., +Inf count, sum]
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {cumulative}")
+        return lines
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items()) + "}"
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route.",
+    ("method", "route", "status"), LATENCY_BUCKETS,
+)
+REQUEST_STATEMENTS = Histogram(
+    "http_request_db_statements", "SQL statements executed per request.",
+    ("method", "route"), STATEMENT_BUCKETS,
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request.",
+    ("method", "route"), LATENCY_BUCKETS,
+)
+POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Time a connection checkout waited on the pool.",
+    ("pool",), POOL_WAIT_BUCKETS,
+)
+
+_engines = {}
+
+
+class TimedPoolMixin:
+    """Times `_do_get`, which blocks when all pool_size + max_overflow connections are out."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start, self.logging_name or "default")
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+# Start times are keyed by cursor, and a failed statement's entry is dropped in
+# handle_error, so nothing is left behind on the pooled connection
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", {})[id(cursor)] = time.perf_counter()
+
+
+def _finish_statement(conn, cursor):
+    start = conn.info.get("query_start", {}).pop(id(cursor), None)
+    stats = request_stats.get()
+    if start is not None and stats is not None:
+        stats.statements += 1
+        stats.db_seconds += time.perf_counter() - start
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _finish_statement(conn, cursor)
+
+
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    if exception_context.connection is not None and context is not None and context.cursor is not None:
+        _finish_statement(exception_context.connection, context.cursor)
+
+
+def instrument_engine(engine, name: str):
+    """Count statements and DB time on a (sync) engine and export its pool gauges."""
+    if name in _engines:
+        return
+    _engines[name] = engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def pool_gauges() -> List[str]:
+    gauges = {
+        "db_pool_size": ("Configured pool_size.", lambda pool: pool.size()),
+        "db_pool_max_overflow": ("Configured max_overflow.", lambda pool: pool._max_overflow),
+        "db_pool_checked_out": ("Connections currently checked out.", lambda pool: pool.checkedout()),
+        "db_pool_checked_in": ("Idle connections in the pool.", lambda pool: pool.checkedin()),
+        "db_pool_overflow": ("Connections open beyond pool_size.", lambda pool: max(pool.overflow(), 0)),
+    }
+    lines = []
+    for metric, (help, read) in gauges.items():
+        lines += [f"# HELP {metric} {help}", f"# TYPE {metric} gauge"]
+        for name, engine in _engines.items():
+            if isinstance(engine.pool, QueuePool):
+                lines.append(f"{metric}{format_labels({'pool': name})} {read(engine.pool)}")
+    return lines
+
+
+def render(extra: Optional[Dict[str, Dict]] = None) -> str:
+    """Prometheus exposition text; `extra` maps a prefix to a dict of numeric gauges."""
+    lines = []
+    for histogram in (REQUEST_LATENCY, REQUEST_STATEMENTS, REQUEST_DB_TIME, POOL_WAIT):
+        lines += histogram.render()
+    lines += pool_gauges()
+    for prefix, values in (extra or {}).items():
+        for key, value in values.items():
+            if isinstance(value, (int, float)):
+                lines += [f"# TYPE {prefix}_{key} gauge", f"{prefix}_{key} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses are timed to the last byte."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        stats = RequestStats()
+        token = request_stats.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            request_stats.reset(token)
+            # The router stores the matched route on the scope; use its template
+            # so /staff/orders/print/{id} is one series, not one per ID
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            REQUEST_LATENCY.observe(elapsed, method, route, str(status_code))
+            REQUEST_STATEMENTS.observe(stats.statements, method, route)
+            REQUEST_DB_TIME.observe(stats.db_seconds, method, route)
@@ -0,0 +1,65 @@
+"""
+Merging of duplicate products, shared by the revisions that tighten the
+unique key on product names (0003: lower(prod_name), 0004: normalized_name).
+"""
+from alembic import op
+
+# (line table, header id column) of the tables whose lines point at products
+LINE_TABLES = [("order_details", "order_id"), ("pawn_details", "pawn_id")]
+
+
+def collisions(table: str, header_id: str) -> str:
+    """Orders (or pawns) that would end up with two lines for one product: a
+    duplicate next to the product it merges into, or two duplicates of it."""
+    return f"""
+        SELECT 1 FROM {table} d
+        LEFT JOIN product_merge m ON m.prod_id = d.prod_id
+        WHERE d.{header_id} IN (SELECT merged.{header_id} FROM {table} merged JOIN product_merge USING (prod_id))
+        GROUP BY d.{header_id}, coalesce(m.keep_id, d.prod_id)
+        HAVING count(*) > 1
+    """
+
+
+def merge_duplicate_products(key: str, duplicates: str):
+    """
+    Merge the products with the same `key` (an SQL expression over products)
+    into the oldest one, in the migration's transaction:
+    - their order and pawn lines are repointed to it
+    - their stock is added to its stock
+    - the first price among them fills a missing price
+    Stops with an error naming the `duplicates` instead if an order or pawn has
+    lines for two products of one group, since those lines would collide.
+    """
+    op.execute(f"""
+        CREATE TEMP TABLE product_merge ON COMMIT DROP AS
+        SELECT prod_id, keep_id FROM (
+            SELECT prod_id, min(prod_id) OVER (PARTITION BY {key}) AS keep_id FROM products
+        ) duplicates
+        WHERE prod_id <> keep_id
+    """)
+    op.execute(f"""
+        DO $$
+        BEGIN
+            IF {' OR '.join(f'EXISTS ({collisions(table, header_id)})' for table, header_id in LINE_TABLES)} THEN
+                RAISE EXCEPTION 'An order or pawn has lines for two {duplicates}; merge those lines by hand first';
+            END IF;
+        END $$
+    """)
+    for table, _ in LINE_TABLES:
+        op.execute(f"UPDATE {table} d SET prod_id = m.keep_id FROM product_merge m WHERE d.prod_id = m.prod_id")
+    op.execute("""
+        UPDATE products p
+        SET amount = CASE WHEN p.amount IS NULL AND merged.amount IS NULL THEN NULL
+                          ELSE coalesce(p.amount, 0) + coalesce(merged.amount, 0) END,
+            unit_price = coalesce(p.unit_price, merged.unit_price)
+        FROM (
+            SELECT m.keep_id, sum(dup.amount) AS amount,
+                   (array_agg(dup.unit_price ORDER BY dup.prod_id) FILTER (WHERE dup.unit_price IS NOT NULL))[1] AS unit_price
+            FROM product_merge m JOIN products dup ON dup.prod_id = m.prod_id
+            GROUP BY m.keep_id
+        ) merged
+        WHERE p.prod_id = merged.keep_id
+    """)
+    op.execute("DELETE FROM products p USING product_merge m WHERE p.prod_id = m.prod_id")
+    # Later revisions run in the same transaction
+    op.execute("DROP TABLE product_merge")
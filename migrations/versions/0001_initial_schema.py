@@ -0,0 +1,96 @@
+"""Initial schema, as main.py used to create it with create_all
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+Databases created by the old `create_all` at import already have these tables;
+they are skipped, so `alembic upgrade head` works on fresh and existing
+databases alike without a manual `alembic stamp`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def create_table_if_missing(name, *columns, indexes=()):
+    # Offline (--sql) runs cannot inspect the database; they emit every table
+    if not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table(name):
+        return
+    op.create_table(name, *columns)
+    for index_name, index_columns, unique in indexes:
+        op.create_index(index_name, name, index_columns, unique=unique)
+
+
+def upgrade():
+    create_table_if_missing(
+        "accounts",
+        sa.Column("cus_id", sa.Integer(), primary_key=True),
+        sa.Column("cus_name", sa.String(), nullable=False),
+        sa.Column("address", sa.String(), nullable=True),
+        sa.Column("phone_number", sa.String(), nullable=False, unique=True),
+        sa.Column("password", sa.String(), nullable=True),
+        sa.Column("role", sa.Enum("admin", "user", name="role"), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        indexes=[("ix_accounts_cus_id", ["cus_id"], False)],
+    )
+    create_table_if_missing(
+        "products",
+        sa.Column("prod_id", sa.Integer(), primary_key=True),
+        sa.Column("prod_name", sa.String(), nullable=False),
+        sa.Column("unit_price", sa.Float(), nullable=True),
+        sa.Column("amount", sa.Integer(), nullable=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("accounts.cus_id"), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        indexes=[("ix_products_prod_id", ["prod_id"], False)],
+    )
+    create_table_if_missing(
+        "orders",
+        sa.Column("order_id", sa.Integer(), primary_key=True),
+        sa.Column("cus_id", sa.Integer(), sa.ForeignKey("accounts.cus_id"), nullable=True),
+        sa.Column("order_deposit", sa.Float(), nullable=False),
+        sa.Column("order_date", sa.DateTime(), nullable=False),
+        indexes=[("ix_orders_order_id", ["order_id"], False)],
+    )
+    create_table_if_missing(
+        "pawns",
+        sa.Column("pawn_id", sa.Integer(), primary_key=True),
+        sa.Column("cus_id", sa.Integer(), sa.ForeignKey("accounts.cus_id"), nullable=True),
+        sa.Column("pawn_deposit", sa.Float(), nullable=False),
+        sa.Column("pawn_date", sa.DateTime(), nullable=False),
+        sa.Column("pawn_expire_date", sa.DateTime(), nullable=False),
+        indexes=[("ix_pawns_pawn_id", ["pawn_id"], False)],
+    )
+    create_table_if_missing(
+        "order_details",
+        sa.Column("order_id", sa.Integer(), sa.ForeignKey("orders.order_id"), primary_key=True),
+        sa.Column("prod_id", sa.Integer(), sa.ForeignKey("products.prod_id"), primary_key=True),
+        sa.Column("order_weight", sa.String(), nullable=False),
+        sa.Column("order_amount", sa.Integer(), nullable=True),
+        sa.Column("product_sell_price", sa.Float(), nullable=False),
+        sa.Column("product_labor_cost", sa.Float(), nullable=False),
+        sa.Column("product_buy_price", sa.Float(), nullable=False),
+        sa.Column("order_date", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    create_table_if_missing(
+        "pawn_details",
+        sa.Column("pawn_id", sa.Integer(), sa.ForeignKey("pawns.pawn_id"), primary_key=True),
+        sa.Column("prod_id", sa.Integer(), sa.ForeignKey("products.prod_id"), primary_key=True),
+        sa.Column("pawn_weight", sa.String(), nullable=False),
+        sa.Column("pawn_amount", sa.Integer(), nullable=False),
+        sa.Column("pawn_unit_price", sa.Float(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade():
+    for name in ("pawn_details", "order_details", "pawns", "orders", "products", "accounts"):
+        op.drop_table(name)
+    sa.Enum(name="role").drop(op.get_bind(), checkfirst=True)
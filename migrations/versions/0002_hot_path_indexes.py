@@ -0,0 +1,43 @@
+"""Hot-path indexes: customer lookups, product names and foreign keys
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+Built with CREATE INDEX CONCURRENTLY so a live shop keeps taking orders while
+they build; that cannot run inside a transaction, hence the autocommit block.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_accounts_role_phone_number", "accounts", ["role", "phone_number"]),
+    ("ix_accounts_lower_cus_name", "accounts", [sa.text("lower(cus_name)")]),
+    ("ix_products_lower_prod_name", "products", [sa.text("lower(prod_name)")]),
+    ("ix_products_user_id", "products", ["user_id"]),
+    ("ix_orders_cus_id", "orders", ["cus_id"]),
+    ("ix_pawns_cus_id", "pawns", ["cus_id"]),
+    ("ix_pawns_pawn_expire_date", "pawns", ["pawn_expire_date"]),
+    # order_id / pawn_id lead the composite primary keys; prod_id needs its own
+    ("ix_order_details_prod_id", "order_details", ["prod_id"]),
+    ("ix_pawn_details_prod_id", "pawn_details", ["prod_id"]),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+        for table in dict.fromkeys(table for _, table, _ in INDEXES):
+            op.execute(f"ANALYZE {table}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
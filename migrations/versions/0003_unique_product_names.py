@@ -0,0 +1,39 @@
+"""Unique case-insensitive product names, merging the duplicates already stored
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+Orders and pawns resolve products with INSERT ... ON CONFLICT on lower(prod_name),
+which needs a unique index to infer. Products whose names differ only in case
+are merged into the oldest one first:
+- their order and pawn lines are repointed to it
+- their stock is added to its stock
+- the first price among them fills a missing price
+
+The migration stops instead if an order or pawn has lines for two of the
+duplicates, since those lines would collide. products is a catalog-sized
+table, so the index is built in the same transaction rather than CONCURRENTLY.
+That way no new duplicate can slip in between the merge and the index.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.product_merge import merge_duplicate_products
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    merge_duplicate_products("lower(prod_name)", "products whose names differ only in case")
+
+    op.drop_index("ix_products_lower_prod_name", table_name="products")
+    op.create_index("ix_products_lower_prod_name", "products", [sa.text("lower(prod_name)")], unique=True)
+
+
+def downgrade():
+    op.drop_index("ix_products_lower_prod_name", table_name="products")
+    op.create_index("ix_products_lower_prod_name", "products", [sa.text("lower(prod_name)")])
@@ -0,0 +1,62 @@
+"""Match products on a normalized name column instead of lower(prod_name)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+Postgres lower() depends on the database locale and knows nothing of Unicode
+normalization, so it cannot be made to agree with the Python side for Khmer
+names. products.normalized_name holds product_names.normalize_product_name(prod_name)
+instead, computed here in keyset batches. Products that only now turn out to be
+the same name (different spacing or Unicode composition) are merged the same
+way as in 0003, then the unique index moves to the new column.
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+from migrations.product_merge import merge_duplicate_products
+from product_names import normalize_product_name
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def backfill(connection):
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.text("SELECT prod_id, prod_name FROM products WHERE prod_id > :last_id ORDER BY prod_id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).all()
+        if not rows:
+            return
+        connection.execute(
+            sa.text("UPDATE products SET normalized_name = :normalized_name WHERE prod_id = :prod_id"),
+            [{"prod_id": prod_id, "normalized_name": normalize_product_name(prod_name)} for prod_id, prod_name in rows],
+        )
+        last_id = rows[-1].prod_id
+
+
+def upgrade():
+    if context.is_offline_mode():
+        raise RuntimeError("0004 computes normalized names in Python; run it against the database, not with --sql")
+
+    op.add_column("products", sa.Column("normalized_name", sa.String(), nullable=True))
+    backfill(op.get_bind())
+
+    merge_duplicate_products("normalized_name", "products with the same normalized name")
+
+    op.alter_column("products", "normalized_name", nullable=False)
+    op.create_index("ix_products_normalized_name", "products", ["normalized_name"], unique=True)
+    op.drop_index("ix_products_lower_prod_name", table_name="products")
+
+
+def downgrade():
+    # Equal normalized names imply equal lower() names, so no duplicates stand in the way
+    op.create_index("ix_products_lower_prod_name", "products", [sa.text("lower(prod_name)")], unique=True)
+    op.drop_index("ix_products_normalized_name", table_name="products")
+    op.drop_column("products", "normalized_name")
@@ -0,0 +1,46 @@
+"""Parsed numeric weights next to the free-text order and pawn weights
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+The new columns are nullable, so adding them does not rewrite the tables.
+Existing rows are filled afterwards by `python -m backfill_weights`, in small
+batches while the shop keeps running. The indexes are built CONCURRENTLY, as
+in 0002.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    ("order_details", "order_weight"),
+    ("pawn_details", "pawn_weight"),
+]
+INDEXES = [
+    ("ix_order_details_order_date_grams", "order_details", ["order_date", "order_weight_grams"]),
+    ("ix_pawn_details_pawn_id_grams", "pawn_details", ["pawn_id", "pawn_weight_grams"]),
+]
+
+
+def upgrade():
+    for table, prefix in COLUMNS:
+        op.add_column(table, sa.Column(f"{prefix}_value", sa.Float(), nullable=True))
+        op.add_column(table, sa.Column(f"{prefix}_unit", sa.String(), nullable=True))
+        op.add_column(table, sa.Column(f"{prefix}_grams", sa.Float(), nullable=True))
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    for table, prefix in reversed(COLUMNS):
+        for suffix in ("grams", "unit", "value"):
+            op.drop_column(table, f"{prefix}_{suffix}")
@@ -0,0 +1,59 @@
+"""Daily summary tables for the sales and pawn reports
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+The tables start empty: fill them with `python -m rebuild_summaries` once the
+new application version (which keeps them up to date) is running.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def counters(*names, kind=sa.Float):
+    return [sa.Column(name, kind(), nullable=False, server_default="0") for name in names]
+
+
+def upgrade():
+    op.create_table(
+        "daily_totals",
+        sa.Column("day", sa.Date(), primary_key=True),
+        *counters("orders", kind=sa.Integer),
+        *counters("order_deposit"),
+        *counters("order_lines", kind=sa.Integer),
+        *counters("sell_total", "labor_total", "buy_total"),
+        *counters("pawns", kind=sa.Integer),
+        *counters("pawn_deposit", "principal_issued"),
+        *counters("pawns_expiring", kind=sa.Integer),
+        *counters("principal_expiring"),
+    )
+    op.create_table(
+        "daily_product_sales",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("prod_id", sa.Integer(), sa.ForeignKey("products.prod_id"), primary_key=True),
+        *counters("lines", "amount", kind=sa.Integer),
+        *counters("sell_total", "labor_total", "buy_total"),
+    )
+    op.create_index("ix_daily_product_sales_prod_id", "daily_product_sales", ["prod_id"])
+    op.create_table(
+        "daily_product_pawns",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("prod_id", sa.Integer(), sa.ForeignKey("products.prod_id"), primary_key=True),
+        *counters("lines_issued", kind=sa.Integer),
+        *counters("principal_issued"),
+        *counters("lines_expiring", kind=sa.Integer),
+        *counters("principal_expiring"),
+    )
+    op.create_index("ix_daily_product_pawns_prod_id", "daily_product_pawns", ["prod_id"])
+
+
+def downgrade():
+    op.drop_table("daily_product_pawns")
+    op.drop_table("daily_product_sales")
+    op.drop_table("daily_totals")
@@ -0,0 +1,38 @@
+"""Pawn status, with a partial index on the active pawns by expiry date
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+The column has a constant default, so adding it does not rewrite pawns: every
+existing pawn starts out active. The expiry scheduler of the running API
+(routes/user/expiry.py) then marks the ones already past their expiry date as
+expired, in small batches. The index is built CONCURRENTLY, as in 0002.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+pawn_status = sa.Enum("active", "expired", "redeemed", "forfeited", name="pawn_status")
+
+
+def upgrade():
+    pawn_status.create(op.get_bind(), checkfirst=True)
+    op.add_column("pawns", sa.Column("status", pawn_status, nullable=False, server_default="active"))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_pawns_active_expire_date", "pawns", ["pawn_expire_date", "pawn_id"],
+            postgresql_where=sa.text("status = 'active'"),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_pawns_active_expire_date", table_name="pawns", postgresql_concurrently=True, if_exists=True)
+    op.drop_column("pawns", "status")
+    pawn_status.drop(op.get_bind(), checkfirst=True)
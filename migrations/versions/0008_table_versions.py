@@ -0,0 +1,31 @@
+"""Change counters for the product and client lists
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+
+The ETags of GET /staff/product and /staff/client were computed from count(*)
+and max(updated_at) over the whole table on every request. They now come from
+one row per table in table_versions, which every write moves on in its own
+transaction (table_versions.py).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_versions = op.create_table(
+        "table_versions",
+        sa.Column("table_name", sa.String(), primary_key=True),
+        sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.bulk_insert(table_versions, [{"table_name": "products", "version": 0}, {"table_name": "accounts", "version": 0}])
+
+
+def downgrade():
+    op.drop_table("table_versions")
@@ -0,0 +1,29 @@
+"""Grams held in active pawns, kept in the daily summaries
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+
+GET /staff/weight/totals summed the grams of every active pawn's lines on
+each call. daily_totals now keeps them per pawn issue day. The columns have
+a constant default, so adding them does not rewrite the table; fill them
+with `python -m rebuild_summaries` once the new application version is
+running.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("daily_totals", sa.Column("grams_held", sa.Float(), nullable=False, server_default="0"))
+    op.add_column("daily_totals", sa.Column("held_unparsed_lines", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade():
+    op.drop_column("daily_totals", "held_unparsed_lines")
+    op.drop_column("daily_totals", "grams_held")
@@ -0,0 +1,50 @@
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+
+
+def encode_cursor(value) -> str:
+    """Opaque `after` cursor for the last key of a page."""
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+def invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail="Invalid pagination cursor",
+    )
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise invalid_cursor()
+
+
+def keyset_page(query, key, limit: Optional[int] = None, after: Optional[str] = None):
+    """
+    Apply a keyset window on `key` (an indexed, unique column) to `query`.
+    Returns the rows and the cursor for the next page, or None on the last page.
+    Only `limit + 1` rows are read, so the cost follows the page size, not the table size.
+    The key must be an integer id; a cursor holding anything else is rejected with 400.
+    """
+    if after:
+        value = decode_cursor(after)
+        if type(value) is not int:
+            raise invalid_cursor()
+        query = query.filter(key > value)
+    query = query.order_by(key)
+
+    if not limit:
+        return query.all(), None
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, encode_cursor(getattr(rows[-1], key.key))
@@ -0,0 +1,16 @@
+import unicodedata
+
+
+def display_product_name(name: str) -> str:
+    """A product name as stored for display: Unicode NFC, runs of whitespace collapsed, case kept."""
+    return " ".join(unicodedata.normalize("NFC", name).split())
+
+
+def normalize_product_name(name: str) -> str:
+    """
+    The form products are matched and kept unique in (`Product.normalized_name`):
+    the display form lowercased, so names that differ only in case, spacing or
+    Unicode composition (precomposed Latin letters, Khmer typed on different
+    keyboards) resolve to the same product.
+    """
+    return display_product_name(name).lower()
@@ -0,0 +1,199 @@
+"""
+Opt-in per-request SQL profiler.
+
+Turned on for every request with SQL_PROFILE=1, or for one request by sending
+an `X-SQL-Profile: 1` header. Each statement the request runs is reduced to a
+fingerprint (literals, bind parameters and IN / VALUES lists collapsed), and a
+fingerprint seen more than SQL_PROFILE_N1_THRESHOLD times is reported as a
+likely N+1. The summary goes back in the `X-SQL-Profile` response header and
+out as one JSON log line on the `sql_profile` logger.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+load_dotenv()
+
+SQL_PROFILE = os.getenv("SQL_PROFILE", "false").lower() in ("1", "true", "yes")
+SQL_PROFILE_N1_THRESHOLD = int(os.getenv("SQL_PROFILE_N1_THRESHOLD", "5"))
+PROFILE_HEADER = "x-sql-profile"
+
+logger = logging.getLogger("sql_profile")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_PARAMS = re.compile(r"%\([^)]+\)s|%s|\$\d+|(?<!:):\w+|\?")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Normalize a statement so that the same query with different values maps to
+    the same text: `WHERE id = 7` and `WHERE id = %(id_1)s` both become
+    `WHERE id = ?`, and `IN (?, ?, ?)` / multi-row VALUES become one element.
+    """
+    text = _COMMENTS.sub(" ", statement)
+    text = _STRINGS.sub("?", text)
+    text = _PARAMS.sub("?", text)
+    text = _NUMBERS.sub("?", text)
+    text = _SPACES.sub(" ", text).strip()
+    text = _LISTS.sub("(?)", text)
+    text = _ROWS.sub("(?)", text)
+    return text
+
+
+def fingerprint_id(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()[:8]
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class Profile:
+    statements: int = 0
+    db_seconds: float = 0.0
+    queries: Dict[str, QueryStats] = field(default_factory=dict)
+
+    def record(self, statement: str, seconds: float):
+        stats = self.queries.setdefault(fingerprint(statement), QueryStats())
+        stats.count += 1
+        stats.seconds += seconds
+        self.statements += 1
+        self.db_seconds += seconds
+
+    def repeated(self, threshold: int = SQL_PROFILE_N1_THRESHOLD) -> List[str]:
+        return [text for text, stats in self.queries.items() if stats.count > threshold]
+
+    def header(self) -> str:
+        parts = [
+            f"statements={self.statements}",
+            f"unique={len(self.queries)}",
+            f"db_ms={self.db_seconds * 1000:.2f}",
+        ]
+        suspects = self.repeated()
+        if suspects:
+            parts.append("n_plus_one=" + ",".join(
+                f"{fingerprint_id(text)}x{self.queries[text].count}" for text in suspects
+            ))
+        return "; ".join(parts)
+
+    def summary(self) -> Dict:
+        suspects = set(self.repeated())
+        ranked = sorted(self.queries.items(), key=lambda item: item[1].seconds, reverse=True)
+        return {
+            "statements": self.statements,
+            "unique": len(self.queries),
+            "db_ms": round(self.db_seconds * 1000, 3),
+            "n_plus_one": len(suspects),
+            "queries": [
+                {
+                    "id": fingerprint_id(text),
+                    "count": stats.count,
+                    "ms": round(stats.seconds * 1000, 3),
+                    "n_plus_one": text in suspects,
+                    "sql": text,
+                }
+                for text, stats in ranked
+            ],
+        }
+
+
+current_profile: ContextVar[Optional[Profile]] = ContextVar("current_profile", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile.get() is not None:
+        conn.info.setdefault("profile_start", {})[id(cursor)] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.get("profile_start", {}).pop(id(cursor), None)
+    profile = current_profile.get()
+    if profile is not None and start is not None:
+        profile.record(statement, time.perf_counter() - start)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute: drop its start time
+    context = exception_context.execution_context
+    if exception_context.connection is not None and context is not None and context.cursor is not None:
+        exception_context.connection.info.get("profile_start", {}).pop(id(context.cursor), None)
+
+
+def profile_engine(engine):
+    """Attach the profiler to a (sync) engine; a no-op per statement unless a profile is active."""
+    if not event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+class SQLProfilerMiddleware:
+    def __init__(self, app, enabled: bool = SQL_PROFILE):
+        self.app = app
+        self.enabled = enabled
+
+    def requested(self, scope) -> bool:
+        if self.enabled:
+            return True
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER.encode() and value.strip().lower() in (b"1", b"true", b"yes"):
+                return True
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile()
+        token = current_profile.set(profile)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Statements a streaming body runs after this point are only in the log line
+                message["headers"] = list(message.get("headers", [])) + [
+                    (PROFILE_HEADER.encode(), profile.header().encode()),
+                ]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            logger.info(json.dumps({
+                "event": "sql_profile",
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(scope.get("route"), "path", None),
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                **profile.summary(),
+            }, ensure_ascii=False))
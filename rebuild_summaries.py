@@ -0,0 +1,32 @@
+"""
+Recompute the daily summary tables (daily_totals, daily_product_sales,
+daily_product_pawns) from the order and pawn tables.
+
+    python -m rebuild_summaries [--since 2026-01-01]
+
+Run it once after migrating to revision 0006, and whenever the raw tables
+were changed behind the application's back (bulk loads, manual fixes). With
+--since only the days from that date on are recomputed. Orders and pawns
+written while it runs wait for it and are then counted as usual.
+"""
+import argparse
+import time
+from datetime import date
+
+from database import engine
+from routes.user import summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=date.fromisoformat, help="first day to recompute; default all")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        summaries.rebuild(conn, args.since)
+    print(f"summaries rebuilt in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
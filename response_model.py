@@ -1,4 +1,7 @@
-from typing import Optional, TypeVar, Generic
+import json
+from typing import Any, Optional, TypeVar, Generic
+import orjson
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 
 T = TypeVar("T")
@@ -7,4 +10,37 @@ class ResponseModel(BaseModel, Generic[T]):
     code: int
     status: str
     message: Optional[str] = None
-    result: Optional[T] = None
\ No newline at end of file
+    result: Optional[T] = None
+
+
+class PageModel(ResponseModel[T], Generic[T]):
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson: datetimes as ISO 8601, non-str dict keys allowed."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def trusted_response(code: int, status: str, message: Optional[str] = None, result: Any = None, **fields) -> ORJSONResponse:
+    """
+    A ResponseModel/PageModel-shaped response for payloads a repository method
+    built itself from plain dicts, lists, numbers, strings and datetimes.
+    Returning a Response makes FastAPI skip response_model validation and
+    re-serialization; the route's response_model still documents the shape in
+    OpenAPI. Pass `next_cursor` and `total` for routes declared as PageModel.
+    """
+    return ORJSONResponse({"code": code, "status": status, "message": message, "result": result, **fields})
+
+
+def json_passthrough(result: str, code: int = 200, status: str = "Success", message: Optional[str] = None, **fields) -> Response:
+    """
+    A ResponseModel envelope around `result`, JSON text the database has already
+    rendered. The text is spliced in as is, without being parsed or re-validated.
+    """
+    head = json.dumps({"code": code, "status": status, "message": message, **fields}, ensure_ascii=False)
+    body = head[:-1] + ',"result":' + result + "}"
+    return Response(content=body.encode(), media_type="application/json")
@@ -6,8 +6,9 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from database import get_db
+from database import get_session, run_db
 from routes.oauth2.model import UserToken
+from routes.oauth2.password_pool import password_pool
 from routes.oauth2.repository import *
 
 router = APIRouter(
@@ -15,21 +16,22 @@ router = APIRouter(
 )
 
 @router.post("/create_user")
-def create_new_user(
+async def create_new_user(
     cus_name: str,
     phone_number: str,
     password: Optional[str] = None,
-    db: Session = Depends(get_db)):
+    db: Session = Depends(get_session)):
     
-    existing_user = db.query(Account).filter(Account.phone_number == phone_number).first()
+    existing_user = await run_db(get_account_by_phone, db=db, phone_number=phone_number)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Phone Number already registered",
         )
     
-    create_user(db=db, cus_name=cus_name, phone_number=phone_number, password=password)
-    db.commit()
+    # bcrypt is CPU-bound; it runs in the bounded password pool, not the threadpool
+    password_hash = await password_pool.hash(password) if password else None
+    await run_db(create_user, db=db, cus_name=cus_name, phone_number=phone_number, password_hash=password_hash)
     
     return {
                 'code' : status.HTTP_200_OK,
@@ -38,9 +40,9 @@ def create_new_user(
     }
     
 @router.post("/sign_in")
-def sign_in_for_access_token(form_data: UserToken, db: Session = Depends(get_db)):
-    user = db.query(Account).filter(Account.phone_number == form_data.phone_number).first()
-    if user and pwd_context.verify(form_data.password, user.password):
+async def sign_in_for_access_token(form_data: UserToken, db: Session = Depends(get_session)):
+    user = await run_db(get_account_by_phone, db=db, phone_number=form_data.phone_number)
+    if user and user.password and await password_pool.verify(form_data.password, user.password):
         access_token_expires = timedelta(minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")))
         refresh_token_expires = timedelta(days=int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS")))
         access_token = create_token(data={"sub": user.phone_number, "id": user.cus_id, "type": "access_token", "role": user.role}, expires_delta=access_token_expires)
@@ -58,14 +60,14 @@ def sign_in_for_access_token(form_data: UserToken, db: Session = Depends(get_db)
     )
 
 @router.post("/refresh_token")
-def refresh_access_token(refresh_token: str, db: Session = Depends(get_db)):
+async def refresh_access_token(refresh_token: str, db: Session = Depends(get_session)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     payload = verify_refresh_token(refresh_token, credentials_exception)
-    user = db.query(Account).filter(Account.phone_number == payload.get("sub")).first()
+    user = await run_db(get_account_by_phone, db=db, phone_number=payload.get("sub"))
     if user:
         access_token_expires = timedelta(minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")))
         access_token = create_token(data={"sub": user.phone_number, "id": user.cus_id, "type": "access_token", "role": user.role}, expires_delta=access_token_expires)
@@ -2,10 +2,12 @@ from fastapi import Depends, HTTPException, status
 from typing import Optional
 from jose import JWTError, jwt
 from fastapi.security import HTTPBearer
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from entities import Account
+from routes.oauth2.password_pool import pwd_context
+from routes.oauth2.token_cache import token_cache
+import table_versions
 from dotenv import load_dotenv
 import os
 
@@ -15,18 +17,21 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 
 http_bearer = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-def create_user(db: Session, cus_name: str, phone_number: str, password: Optional[str] = None):
+def get_account_by_phone(db: Session, phone_number: str):
+    return db.query(Account).filter(Account.phone_number == phone_number).first()
+
+def create_user(db: Session, cus_name: str, phone_number: str, password_hash: Optional[str] = None):
     user = Account(
         cus_name=cus_name, 
         phone_number=phone_number,)
     
-    if password:
-        user.password = pwd_context.hash(password)
+    if password_hash:
+        user.password = password_hash
         user.role = "admin"
     
     db.add(user)
+    table_versions.bump(db, table_versions.ACCOUNTS)
     db.commit()
     db.refresh(user)
     return user
@@ -56,11 +61,14 @@ def verify_refresh_token(token: str, credentials_exception):
     except JWTError:
         raise credentials_exception
 
-def get_current_user(token: str = Depends(http_bearer)):
+async def get_current_user(token: str = Depends(http_bearer)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    payload = verify_access_token(token.credentials, credentials_exception)
+    payload = token_cache.get(token.credentials)
+    if payload is None:
+        payload = verify_access_token(token.credentials, credentials_exception)
+        token_cache.put(token.credentials, payload)
     return payload
@@ -1,11 +1,17 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import date, timedelta
+from typing import List, Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 # from models import Account
-from database import get_db
-from response_model import ResponseModel
+from database import ReadSessionLocal, get_read_session, get_session, run_db
+from etag import make_etag, matches, not_modified, tag_response
+from response_model import ResponseModel, PageModel
 from routes.oauth2.repository import get_current_user
-from routes.user.repository import Staff
+from routes.oauth2.token_cache import token_cache
+from routes.user.repository import MAX_ID_RESERVATION, Staff
+from routes.user.product_cache import product_cache
+from routes.user.valuation import PAWN_MONTHLY_INTEREST_RATE
 from routes.user.model import *
 # from routes.user.model import CreatePawn 
 
@@ -18,38 +24,68 @@ router = APIRouter(
 staff = Staff()
 staff_service = Staff()
 
+MAX_PAGE_SIZE = 500
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
 """ Manage Client """
 @router.post("/client", response_model=ResponseModel)
-def create_client(client_info: CreateClient, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+async def create_client(client_info: CreateClient, db: Session = Depends(get_session), current_user: dict = Depends(get_current_user)):
     staff.is_staff(current_user)
-    return staff.create_client(client_info, db)
-
-@router.get("/client", response_model=ResponseModel[List[GetClient]])
-def get_all_client(db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    return await run_db(staff.create_client, client_info, db=db)
+
+@router.get("/client", response_model=PageModel[List[GetClient]])
+async def get_all_client(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    with_total: bool = False,
+    db: Session = Depends(get_session),
+    current_user: dict = Depends(get_current_user)
+):
     staff.is_staff(current_user)
-    return staff.get_client(db)
+    # Terminals poll this list; answer an unchanged one with 304 before loading rows
+    etag = make_etag(await run_db(staff.client_version, db=db), request.url.query)
+    if matches(request, etag):
+        return not_modified(etag)
+    tag_response(response, etag)
+    return await run_db(staff.get_client, db=db, limit=limit, after=after, with_total=with_total)
 
 """ Manage Product """
 @router.post("/product", response_model = ResponseModel)
-def create_product(product_info: CreateProduct, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+async def create_product(product_info: CreateProduct, db: Session = Depends(get_session), current_user: dict = Depends(get_current_user)):
     staff.is_staff(current_user)
-    return staff.create_product(product_info, db, current_user)
-
-@router.get("/product", response_model=ResponseModel)
-def get_all_product(db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    return await run_db(staff.create_product, product_info, db=db, current_user=current_user)
+
+@router.get("/product", response_model=PageModel)
+async def get_all_product(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    with_total: bool = False,
+    db: Session = Depends(get_read_session),
+    current_user: dict = Depends(get_current_user)
+):
     staff.is_staff(current_user)
-    return staff.get_product(db=db)
+    version = await run_db(staff.product_version, db=db)
+    etag = make_etag(version, request.url.query)
+    if matches(request, etag):
+        return not_modified(etag)
+    return tag_response(
+        await run_db(staff.get_product, db=db, limit=limit, after=after, with_total=with_total, version=version),
+        etag,
+    )
 
 
 """ Order and Payment """
 @router.get("/order/client_phone", response_model=ResponseModel)
-def get_order_account(
+async def get_order_account(
     phone_number: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session),
     current_user: dict = Depends(get_current_user)
 ):
     staff.is_staff(current_user)  # Ensure only staff can access this
-    customer_details = staff.get_order_account(db, phone_number)
+    customer_details = await run_db(staff.get_order_account, db=db, phone_number=phone_number)
 
     if not customer_details:
         raise HTTPException(status_code=404, detail="Customer not found")
@@ -63,85 +99,109 @@ def get_order_account(
 
 
 @router.post("/order", response_model = ResponseModel)
-def create_order(order_info: CreateOrder, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+async def create_order(order_info: CreateOrder, db: Session = Depends(get_session), current_user: dict = Depends(get_current_user)):
     staff.is_staff(current_user)
-    return staff.create_order(order_info, db, current_user)
+    return await run_db(staff.create_order, order_info, db=db, current_user=current_user)
 
 @router.get("/order", response_model=ResponseModel)
-def get_client_order(
+async def get_client_order(
     phone_number: Optional[str] = None,
     cus_name: Optional[str] = None,
     cus_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    format: Literal["json", "pgjson"] = "json",
+    db: Session = Depends(get_read_session),
     current_user: dict = Depends(get_current_user)
 ):
     staff.is_staff(current_user)
-    return staff.get_client_order(db, phone_number, cus_name, cus_id)
+    return await run_db(staff.get_client_order, db=db, phone_number=phone_number, cus_name=cus_name, cus_id=cus_id, pgjson=format == "pgjson")
 
 """ Manage Pawn and Payment """ 
 @router.post("/pawn", response_model = ResponseModel)
-def create_pawn(pawn_info: CreatePawn, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+async def create_pawn(pawn_info: CreatePawn, db: Session = Depends(get_session), current_user: dict = Depends(get_current_user)):
     staff.is_staff(current_user)
-    return staff.create_pawn(pawn_info, db, current_user)
+    return await run_db(staff.create_pawn, pawn_info, db=db, current_user=current_user)
 
 @router.get("/pawn", response_model=ResponseModel)
-def get_pawn_by_id(cus_id: Optional[int] = None, cus_name: Optional[str] = None, phone_number: Optional[str] = None, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+async def get_pawn_by_id(cus_id: Optional[int] = None, cus_name: Optional[str] = None, phone_number: Optional[str] = None, format: Literal["json", "pgjson"] = "json", db: Session = Depends(get_read_session), current_user: dict = Depends(get_current_user)):
     staff.is_staff(current_user)
-    return staff.get_client_pawn(db, cus_id, cus_name, phone_number)
-
-@router.get("/orders/print", response_model=ResponseModel)
-def get_order_by_id(order_id: Optional[int] = None, db: Session = Depends(get_db)):
+    return await run_db(staff.get_client_pawn, db=db, cus_id=cus_id, cus_name=cus_name, phone_number=phone_number, pgjson=format == "pgjson")
+
+@router.get("/orders/print", response_model=PageModel)
+async def get_order_by_id(
+    order_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    with_total: bool = False,
+    format: Literal["json", "ndjson", "pgjson"] = "json",
+    db: Session = Depends(get_read_session)
+):
     """
     Retrieve all orders or a specific order by ID along with customer details.
+    With `format=ndjson` and no order_id, the whole book is streamed one customer per line;
+    with `format=pgjson`, Postgres builds the JSON and it is passed through unchanged.
     """
-    return staff.get_order_by_id(db, order_id)
-
-@router.get("/pawn/print", response_model=ResponseModel)
-def get_pawn_by_id(pawn_id: Optional[int] = None, db: Session = Depends(get_db)):
+    if format == "ndjson" and not order_id:
+        return StreamingResponse(staff.stream_orders(ReadSessionLocal), media_type=NDJSON_MEDIA_TYPE)
+    return await run_db(staff.get_order_by_id, db=db, order_id=order_id, limit=limit, after=after, with_total=with_total, pgjson=format == "pgjson")
+
+@router.get("/pawn/print", response_model=PageModel)
+async def get_pawn_by_id(
+    pawn_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    with_total: bool = False,
+    format: Literal["json", "ndjson", "pgjson"] = "json",
+    db: Session = Depends(get_read_session)
+):
     """
     Retrieve all orders or a specific order by ID along with customer details.
+    With `format=ndjson` and no pawn_id, the whole book is streamed one customer per line;
+    with `format=pgjson`, Postgres builds the JSON and it is passed through unchanged.
     """
-    return staff.get_pawn_by_id(db, pawn_id)
+    if format == "ndjson" and not pawn_id:
+        return StreamingResponse(staff.stream_pawns(ReadSessionLocal), media_type=NDJSON_MEDIA_TYPE)
+    return await run_db(staff.get_pawn_by_id, db=db, pawn_id=pawn_id, limit=limit, after=after, with_total=with_total, pgjson=format == "pgjson")
 
 """Delete product by ID"""
 @router.delete("/products/{product_id}")
-def delete_product_by_id(
+async def delete_product_by_id(
     product_id: int, 
-    db: Session = Depends(get_db), 
+    db: Session = Depends(get_session), 
     current_user: dict = Depends(get_current_user)
 ):
     staff.is_staff(current_user)
-    return staff.delete_product_by_id(product_id, db)
+    return await run_db(staff.delete_product_by_id, product_id, db=db)
 
 """Delete product by name"""
 @router.delete("/products/name/{product_name}")
-def delete_product_by_name(
+async def delete_product_by_name(
     product_name: str, 
-    db: Session = Depends(get_db), 
+    db: Session = Depends(get_session), 
     current_user: dict = Depends(get_current_user)
 ):
     staff.is_staff(current_user)
-    return staff.delete_product_by_name(product_name, db)
+    return await run_db(staff.delete_product_by_name, product_name, db=db)
 
 """Delete all products"""
 @router.delete("/products")
-def delete_all_products(
-    db: Session = Depends(get_db), 
+async def delete_all_products(
+    db: Session = Depends(get_session), 
     current_user: dict = Depends(get_current_user)
 ):
     staff.is_staff(current_user)
-    return staff.delete_all_products(db)
+    return await run_db(staff.delete_all_products, db=db)
 
 @router.get("/products/search/{search_input}", response_model=ResponseModel)
-def search_product(
+async def search_product(
     search_input: str,
-    db: Session = Depends(get_db),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_session),
     current_user: dict = Depends(get_current_user),
 ):
     staff.is_staff(current_user)
     try:
         if search_input.isdigit():
-            product = staff.get_product_by_id(int(search_input), db)
+            product = await run_db(staff.get_product_by_id, int(search_input), db=db)
             return ResponseModel(
                 code=200,
                 status="success",
@@ -149,81 +209,26 @@ def search_product(
                 result=product,
             )
         else:
-            products = staff.get_product_by_name(search_input, db)
+            products = await run_db(staff.search_product, search_input, db=db, limit=limit)
             return ResponseModel(
                 code=200,
                 status="success",
                 message="Products retrieved successfully",
                 result=products,
             )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-"""Delete product by ID"""
-@router.delete("/products/{product_id}")
-def delete_product_by_id(
-    product_id: int, 
-    db: Session = Depends(get_db), 
-    current_user: dict = Depends(get_current_user)
-):
-    staff.is_staff(current_user)
-    return staff.delete_product_by_id(product_id, db)
-
-"""Delete product by name"""
-@router.delete("/products/name/{product_name}")
-def delete_product_by_name(
-    product_name: str, 
-    db: Session = Depends(get_db), 
-    current_user: dict = Depends(get_current_user)
-):
-    staff.is_staff(current_user)
-    return staff.delete_product_by_name(product_name, db)
-
-"""Delete all products"""
-@router.delete("/products")
-def delete_all_products(
-    db: Session = Depends(get_db), 
-    current_user: dict = Depends(get_current_user)
-):
-    staff.is_staff(current_user)
-    return staff.delete_all_products(db)
-
-@router.get("/products/search/{search_input}", response_model=ResponseModel)
-def search_product(
-    search_input: str,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user),
-):
-    staff.is_staff(current_user)
-    try:
-        if search_input.isdigit():
-            product = staff.get_product_by_id(int(search_input), db)
-            return ResponseModel(
-                code=200,
-                status="success",
-                message="Product retrieved successfully",
-                result=product,
-            )
-        else:
-            products = staff.get_product_by_name(search_input, db)
-            return ResponseModel(
-                code=200,
-                status="success",
-                message="Products retrieved successfully",
-                result=products,
-            )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-
 """ Retrieve Next Product ID """
 @router.get("/next-product-id", response_model=ResponseModel)
-def get_next_product_id(
-    db: Session = Depends(get_db), 
+async def get_next_product_id(
+    db: Session = Depends(get_session), 
     current_user: dict = Depends(get_current_user)
 ):
     staff.is_staff(current_user)  # Ensure authorization
-    response = staff.get_next_product_id(db)
+    response = await run_db(staff.get_next_product_id, db=db)
 
     return ResponseModel(
         code=200,
@@ -235,12 +240,12 @@ def get_next_product_id(
 
 """ Retrieve Next Client ID """
 @router.get("/next-client-id", response_model=ResponseModel)
-def get_next_client_id(
-    db: Session = Depends(get_db), 
+async def get_next_client_id(
+    db: Session = Depends(get_session), 
     current_user: dict = Depends(get_current_user)
 ):
     staff.is_staff(current_user)  # Ensure authorization
-    response = staff.get_next_client_id(db)
+    response = await run_db(staff.get_next_client_id, db=db)
 
     return ResponseModel(
         code=200,
@@ -252,12 +257,12 @@ def get_next_client_id(
 
 """ Retrieve Next Order ID """
 @router.get("/next-order-id", response_model=ResponseModel)
-def get_next_order_id(
-    db: Session = Depends(get_db), 
+async def get_next_order_id(
+    db: Session = Depends(get_session), 
     current_user: dict = Depends(get_current_user)
 ):
     staff.is_staff(current_user)  # Ensure authorization
-    response = staff.get_next_order_id(db)
+    response = await run_db(staff.get_next_order_id, db=db)
 
     return ResponseModel(
         code=200,
@@ -269,12 +274,12 @@ def get_next_order_id(
 
 """ Retrieve Next Pawn ID """
 @router.get("/next-pawn-id", response_model=ResponseModel)
-def get_next_pawn_id(
-    db: Session = Depends(get_db), 
+async def get_next_pawn_id(
+    db: Session = Depends(get_session), 
     current_user: dict = Depends(get_current_user)
 ):
     staff.is_staff(current_user)  # Ensure authorization
-    response = staff.get_next_pawn_id(db)
+    response = await run_db(staff.get_next_pawn_id, db=db)
 
     return ResponseModel(
         code=200,
@@ -282,21 +287,142 @@ def get_next_pawn_id(
         message="Next pawn ID retrieved successfully",
         result=response["result"]
     )
+
+
+""" Reserve a block of IDs """
+@router.post("/ids/reserve", response_model=ResponseModel)
+async def reserve_ids(
+    kind: Literal["product", "client", "order", "pawn"],
+    count: int = Query(1, ge=1, le=MAX_ID_RESERVATION),
+    db: Session = Depends(get_session),
+    current_user: dict = Depends(get_current_user)
+):
+    staff.is_staff(current_user)  # Ensure authorization
+    ids = await run_db(staff.reserve_ids, db=db, kind=kind, count=count)
+
+    return ResponseModel(
+        code=200,
+        status="success",
+        message=f"{len(ids)} {kind} ID(s) reserved",
+        result={"kind": kind, "ids": ids}
+    )
     
 
 @router.put("/product", response_model=ResponseModel)
-def update_product(
+async def update_product(
     updated_product: UpdateProduct,  # Accept JSON as request body
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session),
     current_user: dict = Depends(get_current_user),
 ):
     staff_service = Staff()
     staff_service.is_staff(current_user)  # Ensure user is staff/admin
 
-    return staff_service.update_product(
-        db,
+    return await run_db(
+        staff_service.update_product,
+        db=db,
         prod_id=updated_product.prod_id,
         prod_name=updated_product.prod_name,
         unit_price=updated_product.unit_price,
         amount=updated_product.amount
     )
+
+
+""" Reports """
+def report_range(start_date: Optional[date], end_date: Optional[date]):
+    """The inclusive date range of a report, by default the last 30 days."""
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=29)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date.")
+    return start_date, end_date
+
+@router.get("/weight/totals", response_model=ResponseModel)
+async def get_weight_totals(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_read_session),
+    current_user: dict = Depends(get_current_user),
+):
+    """Grams held in active pawns, and sold per day over the range (default: the last 30 days)."""
+    staff.is_staff(current_user)
+    start_date, end_date = report_range(start_date, end_date)
+    return await run_db(staff.get_weight_totals, db=db, start_date=start_date, end_date=end_date)
+
+@router.get("/report/daily", response_model=ResponseModel)
+async def get_daily_report(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_read_session),
+    current_user: dict = Depends(get_current_user),
+):
+    """Revenue, deposits and pawn principal issued versus expiring, per day (default: the last 30 days)."""
+    staff.is_staff(current_user)
+    start_date, end_date = report_range(start_date, end_date)
+    return await run_db(staff.get_daily_report, db=db, start_date=start_date, end_date=end_date)
+
+@router.get("/report/products", response_model=ResponseModel)
+async def get_product_report(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_session),
+    current_user: dict = Depends(get_current_user),
+):
+    """Top products by sales and by pawn principal issued over the range (default: the last 30 days)."""
+    staff.is_staff(current_user)
+    start_date, end_date = report_range(start_date, end_date)
+    return await run_db(staff.get_product_report, db=db, start_date=start_date, end_date=end_date, limit=limit)
+
+""" Pawn book valuation """
+@router.get("/pawn/valuation", response_model=ResponseModel)
+async def get_pawn_valuation(
+    as_of: Optional[date] = None,
+    monthly_rate: float = Query(PAWN_MONTHLY_INTEREST_RATE, ge=0, le=1),
+    top: int = Query(20, ge=0, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_session),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Principal, accrued interest, loan-to-value and days to expiry of every pawn
+    active on `as_of` (default today), priced with the current price table;
+    `top` lists the pawns with the highest loan-to-value.
+    """
+    staff.is_staff(current_user)
+    return await run_db(staff.get_pawn_valuation, db=db, as_of=as_of or date.today(), monthly_rate=monthly_rate, top=top)
+
+""" Pawn expiry """
+@router.get("/pawn/expiring", response_model=PageModel)
+async def get_expiring_pawns(
+    days: int = Query(7, ge=0, le=366),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    db: Session = Depends(get_read_session),
+    current_user: dict = Depends(get_current_user),
+):
+    """Active pawns expiring from today through `days` days from now, soonest first."""
+    staff.is_staff(current_user)
+    return await run_db(staff.get_expiring_pawns, db=db, days=days, limit=limit, after=after)
+
+@router.put("/pawn/{pawn_id}/status", response_model=ResponseModel)
+async def update_pawn_status(
+    pawn_id: int,
+    status_info: UpdatePawnStatus,
+    db: Session = Depends(get_session),
+    current_user: dict = Depends(get_current_user),
+):
+    """Mark a pawn redeemed (from active or expired) or forfeited (from expired)."""
+    staff.is_staff(current_user)
+    return await run_db(staff.update_pawn_status, db=db, pawn_id=pawn_id, status=status_info.status)
+
+""" Cache statistics """
+@router.get("/cache/stats", response_model=ResponseModel)
+async def get_cache_stats(current_user: dict = Depends(get_current_user)):
+    staff.is_staff(current_user)
+    return ResponseModel(
+        code=200,
+        status="Success",
+        result={
+            "product": product_cache.stats(),
+            "token": token_cache.stats(),
+        }
+    )
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import date
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select, update
+from sqlalchemy.engine import Connection, Engine
+from starlette.concurrency import run_in_threadpool
+
+from database import engine
+from entities import Pawn
+from routes.user import summaries
+
+load_dotenv()
+
+logger = logging.getLogger("pawn_expiry")
+
+# Seconds between sweeps; 0 turns the scheduler off (e.g. on all but one host)
+PAWN_EXPIRY_INTERVAL = float(os.getenv("PAWN_EXPIRY_INTERVAL", "300"))
+PAWN_EXPIRY_BATCH = int(os.getenv("PAWN_EXPIRY_BATCH", "500"))
+
+
+def expire_batch(conn: Connection, today: date, batch: int = PAWN_EXPIRY_BATCH) -> int:
+    """
+    Mark up to `batch` active pawns whose pawn_expire_date is before `today` as
+    expired, oldest first; returns how many. The pawns are picked from the
+    partial index on active pawns and locked with SKIP LOCKED, so several API
+    processes can sweep at once and none waits on a pawn staff are updating.
+    Their grams stop counting as held; an expired pawn still counts as expiring
+    on its day in the summaries.
+    """
+    due = (
+        select(Pawn.pawn_id)
+        .where(Pawn.status == "active", Pawn.pawn_expire_date < today)
+        .order_by(Pawn.pawn_expire_date, Pawn.pawn_id)
+        .limit(batch)
+        .with_for_update(skip_locked=True)
+    )
+    expired = conn.execute(
+        update(Pawn)
+        .where(Pawn.pawn_id.in_(due.scalar_subquery()))
+        .values(status="expired")
+        .returning(Pawn.pawn_id, Pawn.pawn_date, Pawn.pawn_expire_date)
+    ).all()
+    summaries.record_status_change(conn, expired, released=True, closed=False)
+    return len(expired)
+
+
+class ExpiryScheduler:
+    """
+    Background task of the API process that moves pawns past their expiry date
+    from active to expired. Each sweep commits one batch at a time until a batch
+    comes back short, so locks stay short and a backlog (such as every historical
+    pawn right after migrating to revision 0007) is worked off without blocking
+    the shop.
+    """
+
+    def __init__(self, db_engine: Engine = engine, interval: float = PAWN_EXPIRY_INTERVAL, batch: int = PAWN_EXPIRY_BATCH):
+        self.engine = db_engine
+        self.interval = interval
+        self.batch = batch
+        self.sweeps = 0
+        self.expired = 0
+        self.failures = 0
+        self.last_sweep_seconds = None
+        self._task: Optional[asyncio.Task] = None
+
+    def sweep(self, today: Optional[date] = None) -> int:
+        """Expire every due pawn, one committed batch at a time; returns how many."""
+        today = today or date.today()
+        start = time.perf_counter()
+        total = 0
+        while True:
+            with self.engine.begin() as conn:
+                count = expire_batch(conn, today, self.batch)
+            total += count
+            if count < self.batch:
+                break
+        self.sweeps += 1
+        self.expired += total
+        self.last_sweep_seconds = round(time.perf_counter() - start, 3)
+        return total
+
+    async def _run(self):
+        while True:
+            try:
+                await run_in_threadpool(self.sweep)
+            except Exception:
+                self.failures += 1
+                logger.exception("Pawn expiry sweep failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "batch": self.batch,
+            "sweeps": self.sweeps,
+            "expired": self.expired,
+            "failures": self.failures,
+            "last_sweep_seconds": self.last_sweep_seconds,
+        }
+
+
+expiry_scheduler = ExpiryScheduler()
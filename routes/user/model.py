@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from datetime import date
-from typing import Optional, List
+from typing import Literal, Optional, List
+from weights import parse_weight
 # from typing import , Optional
 
 class BuyProducts(BaseModel):
@@ -12,6 +13,13 @@ class BuyProducts(BaseModel):
     product_labor_cost: Optional[float] = None
     product_buy_price: Optional[float] = None
 
+    @field_validator("order_weight")
+    @classmethod
+    def check_weight(cls, order_weight: Optional[str]) -> Optional[str]:
+        if order_weight is not None:
+            parse_weight(order_weight)
+        return order_weight
+
 class CreateClient(BaseModel):
     cus_name: str
     address: str
@@ -51,6 +59,13 @@ class PawnProductDetail(BaseModel):
     pawn_amount: Optional[int] = None
     pawn_unit_price: Optional[float] = None
 
+    @field_validator("pawn_weight")
+    @classmethod
+    def check_weight(cls, pawn_weight: Optional[str]) -> Optional[str]:
+        if pawn_weight is not None:
+            parse_weight(pawn_weight)
+        return pawn_weight
+
 class CreatePawn(BaseModel):
     pawn_id: Optional[int] = None 
     cus_id: Optional[int] = 0
@@ -74,4 +89,7 @@ class UpdatePawn(BaseModel):
     pawn_expire_date: Optional[date] = None
     # products: List[PawnProducts] = []
     deleteOldProducts: Optional[bool] = False 
+
+class UpdatePawnStatus(BaseModel):
+    status: Literal["redeemed", "forfeited"]
     
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from product_names import normalize_product_name
+
+load_dotenv()
+
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "10000"))
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "300"))
+
+
+def product_key(name: str) -> str:
+    """Cache key for a product name; the same normalization as `Product.normalized_name`."""
+    return normalize_product_name(name)
+
+
+class ProductCache:
+    """
+    In-process LRU cache of the product catalog.
+    Products are kept by ID (serialized as in `get_product`) and by name (name -> ID),
+    plus one snapshot of the full catalog list with the products version it was
+    loaded at. Entries expire after `ttl` seconds, so other worker processes see
+    each other's writes within that window (the catalog as soon as the version
+    moves, when the caller passes it); writes made through `Staff` invalidate this
+    process's copy immediately.
+    """
+
+    def __init__(self, max_size: int = PRODUCT_CACHE_SIZE, ttl: float = PRODUCT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._by_id = OrderedDict()
+        self._by_name = OrderedDict()
+        self._catalog = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, entries: OrderedDict, key):
+        entry = entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del entries[key]
+            self.misses += 1
+            return None
+        entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def _put(self, entries: OrderedDict, key, value):
+        entries[key] = (time.monotonic() + self.ttl, value)
+        entries.move_to_end(key)
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+
+    def get(self, prod_id: int) -> Optional[Dict]:
+        with self._lock:
+            return self._get(self._by_id, prod_id)
+
+    def get_id(self, name: str) -> Optional[int]:
+        with self._lock:
+            return self._get(self._by_name, product_key(name))
+
+    def put(self, product: Dict):
+        with self._lock:
+            self._put(self._by_id, product["id"], product)
+            self._put(self._by_name, product_key(product["name"]), product["id"])
+
+    def put_id(self, name: str, prod_id: int):
+        with self._lock:
+            self._put(self._by_name, product_key(name), prod_id)
+
+    def forget_id(self, name: str):
+        """Drop the name -> ID entry for `name`, e.g. once its product is found gone."""
+        with self._lock:
+            self._by_name.pop(product_key(name), None)
+
+    def get_catalog(self, version: Optional[str] = None) -> Optional[List[Dict]]:
+        """The cached catalog, if it has not expired and was loaded at `version` (when given)."""
+        with self._lock:
+            if self._catalog is None or self._catalog[0] < time.monotonic():
+                self._catalog = None
+                self.misses += 1
+                return None
+            if version is not None and self._catalog[1] != version:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._catalog[2]
+
+    def put_catalog(self, products: List[Dict], version: Optional[str] = None):
+        """Cache the full catalog, loaded after reading the products `version`."""
+        with self._lock:
+            self._catalog = (time.monotonic() + self.ttl, version, products)
+        for product in products[:self.max_size]:
+            self.put(product)
+
+    def invalidate_catalog(self):
+        with self._lock:
+            self._catalog = None
+
+    def invalidate(self):
+        with self._lock:
+            self._by_id.clear()
+            self._by_name.clear()
+            self._catalog = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._by_id),
+                "names": len(self._by_name),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+            }
+
+
+product_cache = ProductCache()
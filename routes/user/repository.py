@@ -2,13 +2,55 @@ from fastapi import HTTPException
 from routes.user.model import *
 from sqlalchemy.orm import Session
 from entities import *
-from response_model import ResponseModel
+from database import ReadSessionLocal, cpu_bound
+from response_model import ResponseModel, PageModel, json_passthrough, trusted_response
+from pagination import decode_cursor, encode_cursor, keyset_page
+from product_names import display_product_name, normalize_product_name
+from weights import weight_columns
+import table_versions
+from routes.user.product_cache import product_cache
+from routes.user.search_index import NgramIndex, search_index
+from routes.user import summaries, valuation
 from typing import List, Dict
 # from app.models import Client, Pawn
+from sqlalchemy import String, Text, case, cast, exists, insert, literal, literal_column, select, tuple_, update
+from sqlalchemy.dialects.postgresql import REGCLASS, aggregate_order_by, insert as pg_insert
 from sqlalchemy.sql import func, or_, and_
 from sqlalchemy.exc import SQLAlchemyError
 from collections import defaultdict
-from typing import Dict, Any
+from itertools import groupby
+from typing import Dict, Any, Iterator, Tuple
+from datetime import date, datetime, timedelta
+import json
+
+# Rows fetched per round trip by the server-side cursor of the NDJSON exports
+STREAM_BATCH_SIZE = 1000
+
+# Serial columns a client can take IDs from ahead of time
+ID_COLUMNS = {
+    "product": Product.prod_id,
+    "client": Account.cus_id,
+    "order": Order.order_id,
+    "pawn": Pawn.pawn_id,
+}
+MAX_ID_RESERVATION = 1000
+
+# Statuses staff may close a pawn with, and the statuses each may be set from
+PAWN_TRANSITIONS = {
+    "redeemed": ("active", "expired"),
+    "forfeited": ("expired",),
+}
+
+
+def iso_timestamp(column, sep: str = "T"):
+    """
+    A timestamp as Postgres text in the exact form of Python's `datetime.isoformat(sep)`
+    (with sep=" ", of `str(datetime)`).
+    """
+    return case(
+        (func.date_trunc("second", column) == column, func.to_char(column, f'YYYY-MM-DD"{sep}"HH24:MI:SS')),
+        else_=func.to_char(column, f'YYYY-MM-DD"{sep}"HH24:MI:SS.US'),
+    )
 
 class Staff:
     def is_staff(self, current_user: dict):
@@ -18,38 +60,30 @@ class Staff:
                 detail="Permission denied",
             )
             
-    def create_client(self, client_info: CreateClient, db: Session, not_exist: bool = False):
-        existing_client = db.query(Account).filter(Account.phone_number == client_info.phone_number).first()
-        if existing_client:
+    def create_client(self, client_info: CreateClient, db: Session):
+        # ✅ One statement decides: a concurrent request for the same phone cannot slip in between
+        now = datetime.utcnow()
+        created = db.execute(
+            pg_insert(Account)
+            .values(
+                cus_name=client_info.cus_name,
+                address=client_info.address,
+                phone_number=client_info.phone_number,
+                role="user",
+                created_at=now,
+                updated_at=now,
+            )
+            .on_conflict_do_nothing(index_elements=[Account.phone_number])
+            .returning(Account.cus_id)
+        ).scalar()
+        if created is None:
+            db.rollback()
             raise HTTPException(
                 status_code=400,
                 detail="Phone Number already registered",
             )
-        
-        if not_exist:
-            try:
-                client = Account(
-                    cus_name = client_info.cus_name, 
-                    address = client_info.address,
-                    phone_number = client_info.phone_number,)
-                db.add(client)
-                db.commit()
-                db.refresh(client)
-            except SQLAlchemyError as e:
-                db.rollback()
-                print(f"Error occurred: {str(e)}")
-                raise HTTPException(status_code=500, detail="Database error occurred.")
-            
-            return client
-            
-        client = Account(
-            cus_name = client_info.cus_name, 
-            address = client_info.address,
-            phone_number = client_info.phone_number,)
-        
-        db.add(client)
+        table_versions.bump(db, table_versions.ACCOUNTS)
         db.commit()
-        db.refresh(client)
         
         return ResponseModel(
             code=200,
@@ -58,29 +92,33 @@ class Staff:
         )
         
     def create_product(self, product_info: CreateProduct, db: Session, current_user: dict):
-        existing_product = db.query(Product).filter(Product.prod_name == func.lower(product_info.prod_name)).first()
-        if existing_product:
+        # Price and stock are only kept when both are given
+        priced = product_info.amount != None and product_info.unit_price != None
+        now = datetime.utcnow()
+        product = db.execute(
+            pg_insert(Product)
+            .values(
+                prod_name=display_product_name(product_info.prod_name),
+                normalized_name=normalize_product_name(product_info.prod_name),
+                unit_price=product_info.unit_price if priced else None,
+                amount=product_info.amount if priced else None,
+                user_id=current_user['id'],
+                created_at=now,
+                updated_at=now,
+            )
+            .on_conflict_do_nothing(index_elements=[Product.normalized_name])
+            .returning(Product.prod_id, Product.prod_name, Product.unit_price, Product.amount)
+        ).first()
+        if product is None:
+            db.rollback()
             raise HTTPException(
                 status_code=400,
                 detail="ផលិតផលមានរួចហើយ",
             )
-            
-        if product_info.amount != None and product_info.unit_price != None:
-            product = Product(
-                prod_name = func.lower(product_info.prod_name),
-                unit_price = product_info.unit_price,
-                amount = product_info.amount,
-                user_id = current_user['id'])
-            db.add(product)
-            db.commit()
-            db.refresh(product)
-            
-        else: 
-            product = Product(prod_name = func.lower(product_info.prod_name), user_id = current_user['id'])
-            db.add(product)
-            db.commit()
-            db.refresh(product)
-            return product
+        table_versions.bump(db, table_versions.PRODUCTS)
+        db.commit()
+        product_cache.invalidate()
+        search_index.add(self.serialize_product(product))
         
         
         return ResponseModel(
@@ -89,79 +127,262 @@ class Staff:
             message="ការបញ្ជាទិញត្រូវបានជោគជ័យ"
         )
         
-    def create_order(self, order_info: CreateOrder, db: Session, current_user: dict):
-        existing_customer = db.query(Account).filter(
-            and_(
-                or_(
-                    Account.phone_number == order_info.phone_number, 
-                    Account.cus_id == order_info.cus_id
-                ), 
-                Account.role == 'user'
+    def product_by_name(self, db: Session, name: str):
+        """The product called `name`, matched on its normalized name: one unique index lookup."""
+        return db.query(Product).filter(Product.normalized_name == normalize_product_name(name)).first()
+
+    def upsert_products(self, db: Session, names: Dict[str, str], user_id: int) -> List[Tuple[int, str, bool]]:
+        """
+        (prod_id, normalized name, created) for every normalized name -> display
+        name in `names`, in one round trip:
+        INSERT ... ON CONFLICT (normalized_name) DO NOTHING for the whole batch,
+        with the products that already existed read in the same statement. A name
+        only resolves with a second query when a concurrent transaction committed
+        it after this statement's snapshot was taken.
+        Line items carry no product fields to refresh, so conflicts do nothing
+        rather than DO UPDATE: that also keeps a popular product's row unlocked
+        while an order's transaction is open.
+        """
+        now = datetime.utcnow()
+        inserted = (
+            pg_insert(Product)
+            .values([
+                {"prod_name": name, "normalized_name": key, "user_id": user_id, "created_at": now, "updated_at": now}
+                for key, name in names.items()
+            ])
+            .on_conflict_do_nothing(index_elements=[Product.normalized_name])
+            .returning(Product.prod_id, Product.normalized_name)
+            .cte("inserted")
+        )
+        existing = select(Product.prod_id, Product.normalized_name, literal(False)).where(
+            Product.normalized_name.in_(list(names))
+        )
+        rows = db.execute(
+            select(inserted.c.prod_id, inserted.c.normalized_name, literal(True)).union_all(existing)
+        ).all()
+
+        missing = names.keys() - {key for _, key, _ in rows}
+        if missing:
+            rows += db.execute(existing.where(Product.normalized_name.in_(missing))).all()
+        return [tuple(row) for row in rows]
+
+    def existing_product_ids(self, db: Session, prod_ids) -> set:
+        """
+        The prod_ids among `prod_ids` that exist, in one IN query. The rows are
+        locked FOR KEY SHARE, as the line tables' foreign keys would lock them, so
+        none of them can be deleted before the caller commits.
+        """
+        return set(db.scalars(
+            select(Product.prod_id)
+            .where(Product.prod_id.in_(sorted(prod_ids)))
+            .order_by(Product.prod_id)
+            .with_for_update(key_share=True)
+        ))
+
+    def resolve_product_ids(self, lines: list, db: Session, current_user: dict):
+        """
+        Map every line item's product name to a prod_id: cached names first, the
+        rest with one `upsert_products` round trip that also creates the unknown
+        ones. Lines given by prod_id alone are checked to exist (400 otherwise),
+        and so are the cached IDs, in the same IN query: a product deleted or
+        merged since it was cached (possibly by another worker) is dropped from
+        the cache and resolved by name again.
+        Flushes only; the caller owns the transaction and calls
+        `remember_products` once it has committed.
+        Returns the normalized name -> prod_id map and the normalized -> display
+        names of the products that were created.
+        """
+        given_ids = {line.prod_id for line in lines if not line.prod_name and line.prod_id}
+
+        names = {}
+        for line in lines:
+            if line.prod_name:
+                names.setdefault(normalize_product_name(line.prod_name), display_product_name(line.prod_name))
+
+        product_ids = {}
+        for key in names:
+            prod_id = product_cache.get_id(key)
+            if prod_id is not None:
+                product_ids[key] = prod_id
+
+        if given_ids or product_ids:
+            existing = self.existing_product_ids(db, given_ids | set(product_ids.values()))
+            unknown = given_ids - existing
+            if unknown:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unknown prod_id: {', '.join(str(prod_id) for prod_id in sorted(unknown))}",
+                )
+            for key, prod_id in list(product_ids.items()):
+                if prod_id not in existing:
+                    product_cache.forget_id(key)
+                    del product_ids[key]
+
+        created = {}
+        uncached = {key: names[key] for key in sorted(names.keys() - product_ids.keys())}
+        if uncached:
+            for prod_id, key, is_new in self.upsert_products(db, uncached, current_user['id']):
+                product_ids[key] = prod_id
+                if is_new:
+                    created[key] = names[key]
+                else:
+                    product_cache.put_id(key, prod_id)
+
+        return product_ids, created
+
+    def remember_products(self, product_ids: Dict[str, int], created: Dict[str, str]):
+        """Cache products created by a committed order or pawn."""
+        if not created:
+            return
+        product_cache.invalidate_catalog()
+        for key, name in created.items():
+            product_cache.put_id(key, product_ids[key])
+            search_index.add({"id": product_ids[key], "name": name, "price": None, "amount": None})
+
+    def line_product_id(self, line, product_ids: Dict[str, int]) -> int:
+        if line.prod_name:
+            return product_ids[normalize_product_name(line.prod_name)]
+        if line.prod_id:
+            return line.prod_id
+        raise HTTPException(
+            status_code=400,
+            detail="Each product needs a prod_name or prod_id.",
+        )
+
+    def upsert_customer(
+        self, db: Session, phone_number: str, cus_name: Optional[str], address: Optional[str]
+    ) -> Tuple[Optional[int], bool]:
+        """
+        The cus_id of the customer with `phone_number`, and whether the row was
+        inserted or changed, in one round trip:
+        INSERT ... ON CONFLICT (phone_number) DO UPDATE the name and address that
+        were given, only where they differ, so a repeat visit writes nothing.
+        An unchanged row is read in the same statement, and only needs a second
+        query when a concurrent transaction committed it after this statement's
+        snapshot was taken. (None, False) when the number belongs to a staff account.
+        """
+        now = datetime.utcnow()
+        values = pg_insert(Account).values(
+            cus_name=cus_name or "",
+            address=address,
+            phone_number=phone_number,
+            role="user",
+            created_at=now,
+            updated_at=now,
+        )
+        new_name = func.coalesce(literal(cus_name, String), Account.cus_name)
+        new_address = func.coalesce(literal(address, String), Account.address)
+        upserted = (
+            values.on_conflict_do_update(
+                index_elements=[Account.phone_number],
+                set_={"cus_name": new_name, "address": new_address, "updated_at": now},
+                where=and_(
+                    Account.role == 'user',
+                    or_(Account.cus_name.is_distinct_from(new_name), Account.address.is_distinct_from(new_address)),
+                ),
+            )
+            .returning(Account.cus_id)
+            .cte("upserted")
+        )
+        existing = select(Account.cus_id).where(Account.phone_number == phone_number, Account.role == 'user')
+        row = db.execute(
+            select(upserted.c.cus_id, literal(True)).union_all(
+                existing.add_columns(literal(False)).where(~exists(select(upserted.c.cus_id)))
             )
         ).first()
+        if row is None:
+            return db.execute(existing).scalar(), False
+        return tuple(row)
 
-        if existing_customer:
-            # ✅ Update existing customer's name and address
-            existing_customer.cus_name = order_info.cus_name
-            existing_customer.address = order_info.address
-            db.commit()
-            db.refresh(existing_customer)
-        else:
-            # ✅ Create new customer if not found
-            existing_customer = self.create_client(
-                CreateClient(
-                    cus_name=order_info.cus_name, 
-                    phone_number=order_info.phone_number, 
-                    address=order_info.address
-                ), 
-                db, 
-                True
+    def save_customer(self, db: Session, phone_number: str, cus_name: Optional[str], address: Optional[str]) -> Tuple[int, bool]:
+        """
+        Refresh the walk-in customer's name and address, or add a new customer,
+        and return the cus_id and whether the row was written. Flushes only; the
+        caller owns the transaction and bumps the accounts version if it was.
+        """
+        cus_id, written = self.upsert_customer(db, phone_number, cus_name, address)
+        if cus_id is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Phone Number already registered",
             )
+        return cus_id, written
+
+    def bump_versions(self, db: Session, customer_written: bool, products_created: bool):
+        """
+        Move the accounts and products versions on for an order or pawn that
+        wrote a customer or created products. Call it last before committing:
+        the version rows stay locked until then, and every such order queues on them.
+        """
+        if customer_written:
+            table_versions.bump(db, table_versions.ACCOUNTS)
+        if products_created:
+            table_versions.bump(db, table_versions.PRODUCTS)
 
-        # ✅ Check if order_id is provided, if it exists, return an error
-        if hasattr(order_info, "order_id") and order_info.order_id:
-            existing_order = db.query(Order).filter(Order.order_id == order_info.order_id).first()
-            if existing_order:
+    def create_order(self, order_info: CreateOrder, db: Session, current_user: dict):
+        # ✅ A provided order_id must come from /ids/reserve and still be free
+        if order_info.order_id:
+            problem = self.reserved_id_problem(db, Order.order_id, order_info.order_id)
+            if problem == "taken":
                 return ResponseModel(
                     code=400,
                     status="Error",
                     message="ផលិតផលបានរក្សាទុករួចរាល់ហើយ"
                 )
+            if problem:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Order ID {order_info.order_id} was not reserved.",
+                )
 
-        # ✅ Create a new order if order_id is not provided
-        order = Order(
-            cus_id=existing_customer.cus_id,
-            order_deposit=order_info.order_deposit
-        )
-        db.add(order)
-        db.commit()
-        db.refresh(order)
-
-        for product in order_info.order_product_detail:
-            existing_product = db.query(Product).filter(
-                Product.prod_name == func.lower(product.prod_name)
-            ).first()
-
-            if not existing_product:
-                prod = self.create_product(CreateProduct(prod_name=product.prod_name), db, current_user)
-                prod_id = prod.prod_id
-            else:
-                prod_id = existing_product.prod_id
-
-            # ✅ Add order details (always create new details, do not delete old ones)
-            order_detail = OrderDetail(
-                order_id=order.order_id,
-                prod_id=prod_id,
-                order_weight=product.order_weight,
-                order_amount=product.order_amount,
-                product_sell_price=product.product_sell_price,
-                product_labor_cost=product.product_labor_cost,
-                product_buy_price=product.product_buy_price,
+        # ✅ Customer, order header, products and details are written in one transaction
+        try:
+            cus_id, customer_written = self.save_customer(db, order_info.phone_number, order_info.cus_name, order_info.address)
+
+            # The header and its lines share one timestamp, so they land on the same summary day
+            order_date = datetime.utcnow()
+            order = Order(
+                order_id=order_info.order_id,
+                cus_id=cus_id,
+                order_deposit=order_info.order_deposit,
+                order_date=order_date,
             )
+            db.add(order)
+            db.flush()
+
+            lines = order_info.order_product_detail
+            product_ids, created = self.resolve_product_ids(lines, db, current_user)
+
+            details = [
+                {
+                    "order_id": order.order_id,
+                    "prod_id": self.line_product_id(product, product_ids),
+                    "order_weight": product.order_weight,
+                    **weight_columns("order_weight", product.order_weight),
+                    "order_amount": product.order_amount,
+                    "product_sell_price": product.product_sell_price,
+                    "product_labor_cost": product.product_labor_cost,
+                    "product_buy_price": product.product_buy_price,
+                    "order_date": order_date,
+                }
+                for product in lines
+            ]
+            if details:
+                db.execute(insert(OrderDetail), details)
+
+            # Last before commit: the summary rows stay locked only until then
+            summaries.record_order(db, order_date, order.order_deposit, details)
+            self.bump_versions(db, customer_written, bool(created))
+            db.commit()
+        except HTTPException:
+            db.rollback()
+            raise
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Error occurred: {str(e)}")
+            raise HTTPException(status_code=500, detail="Database error occurred.")
 
-            db.add(order_detail)
-
-        db.commit()  # Commit all order details at once
+        self.remember_products(product_ids, created)
 
         return ResponseModel(
             code=200,
@@ -177,111 +398,74 @@ class Staff:
                 detail="Pawn date must be before the expire date.",
             )
 
-        # ✅ Check if the provided pawn_id already exists
-        existing_pawn = db.query(Pawn).filter(Pawn.pawn_id == pawn_info.pawn_id).first()
-        
-        if existing_pawn:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Pawn record with ID {pawn_info.pawn_id} already exists."
-            )
-
-        # ✅ Check if customer exists by phone number or cus_id
-        existing_customer = db.query(Account).filter(
-            or_(
-                Account.phone_number == pawn_info.phone_number, 
-                Account.cus_id == pawn_info.cus_id
-            ),
-            Account.role == 'user'
-        ).first()
-
-        if existing_customer:
-            # ✅ Update existing customer's name and address
-            existing_customer.cus_name = pawn_info.cus_name
-            existing_customer.address = pawn_info.address
-            db.commit()
-            db.refresh(existing_customer)
-        else:
-            # ✅ Create a new customer if not found
-            existing_customer = self.create_client(
-                CreateClient(
-                    cus_name=pawn_info.cus_name,
-                    phone_number=pawn_info.phone_number,
-                    address=pawn_info.address
-                ), 
-                db, 
-                True
-            )
-
-        # ✅ Create a new Pawn record
-        pawn = Pawn(
-            cus_id=existing_customer.cus_id,
-            pawn_date=pawn_info.pawn_date,
-            pawn_deposit=pawn_info.pawn_deposit,
-            pawn_expire_date=pawn_info.pawn_expire_date
-        )
-
-        db.add(pawn)
-        db.commit()
-        db.refresh(pawn)
-
-        # ✅ Insert Pawn Products (Allow multiple products per pawn)
-        for product in pawn_info.pawn_product_detail:
-            # 🔹 Ensure product exists or create new one
-            existing_product = db.query(Product).filter(
-                Product.prod_name.ilike(product.prod_name)
-            ).first()
+        # ✅ A provided pawn_id must come from /ids/reserve and still be free
+        if pawn_info.pawn_id:
+            problem = self.reserved_id_problem(db, Pawn.pawn_id, pawn_info.pawn_id)
+            if problem == "taken":
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Pawn record with ID {pawn_info.pawn_id} already exists."
+                )
+            if problem:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Pawn ID {pawn_info.pawn_id} was not reserved.",
+                )
 
-            if not existing_product:
-                prod = self.create_product(CreateProduct(prod_name=product.prod_name), db, current_user)
-                prod_id = prod.prod_id
-            else:
-                prod_id = existing_product.prod_id
-
-            # ✅ Create PawnDetail for each product
-            pawn_detail = PawnDetail(
-                pawn_id=pawn.pawn_id,
-                prod_id=prod_id,
-                pawn_weight=product.pawn_weight,
-                pawn_amount=product.pawn_amount,
-                pawn_unit_price=product.pawn_unit_price
+        # ✅ Customer, pawn header, products and details are written in one transaction
+        try:
+            cus_id, customer_written = self.save_customer(db, pawn_info.phone_number, pawn_info.cus_name, pawn_info.address)
+
+            pawn = Pawn(
+                pawn_id=pawn_info.pawn_id,
+                cus_id=cus_id,
+                pawn_date=pawn_info.pawn_date,
+                pawn_deposit=pawn_info.pawn_deposit,
+                pawn_expire_date=pawn_info.pawn_expire_date
             )
+            db.add(pawn)
+            db.flush()
+
+            lines = pawn_info.pawn_product_detail
+            product_ids, created = self.resolve_product_ids(lines, db, current_user)
+
+            details = [
+                {
+                    "pawn_id": pawn.pawn_id,
+                    "prod_id": self.line_product_id(product, product_ids),
+                    "pawn_weight": product.pawn_weight,
+                    **weight_columns("pawn_weight", product.pawn_weight),
+                    "pawn_amount": product.pawn_amount,
+                    "pawn_unit_price": product.pawn_unit_price,
+                }
+                for product in lines
+            ]
+            if details:
+                db.execute(insert(PawnDetail), details)
+
+            # Last before commit: the summary rows stay locked only until then
+            summaries.record_pawn(db, pawn.pawn_date, pawn.pawn_expire_date, pawn.pawn_deposit, details)
+            self.bump_versions(db, customer_written, bool(created))
+            pawn_id = pawn.pawn_id
+            db.commit()
+        except HTTPException:
+            db.rollback()
+            raise
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Error occurred: {str(e)}")
+            raise HTTPException(status_code=500, detail="Database error occurred.")
 
-            db.add(pawn_detail)
-
-        db.commit()  # ✅ Commit all pawn details at once for efficiency
+        self.remember_products(product_ids, created)
 
         return ResponseModel(
             code=200,
             status="Success",
-            message=f"Pawn record created successfully with multiple products. (Pawn ID: {pawn.pawn_id})"
+            message=f"Pawn record created successfully with multiple products. (Pawn ID: {pawn_id})"
         )
 
 
-
             
-    def get_product(self, db: Session):
-        products = db.query(Product).all()
-        if not products:
-            raise HTTPException(
-                status_code=404,
-                detail="Products not found",
-            )
-        serialized_products = [
-            {
-                "id": product.prod_id,
-                "name": product.prod_name,
-                "price": product.unit_price,
-                "amount": product.amount,
-            }
-            for product in products
-        ]
-        return ResponseModel(
-            code=200,
-            status="Success",
-            result=serialized_products
-        )
-    
     # def get_product(self, db: Session):
     #     products = db.query(Product).all()
     #     if not products:
@@ -351,9 +535,47 @@ class Staff:
         return result
 
 
-    def get_product(self, db: Session):
-        products = db.query(Product).all()
-        if not products:
+    def product_version(self, db: Session) -> str:
+        """
+        Version token of the product list: the products change counter, which
+        every write moves on in its own transaction, so an unchanged token means
+        an unchanged list. One primary key lookup.
+        """
+        return str(table_versions.current(db, table_versions.PRODUCTS))
+
+    def client_version(self, db: Session) -> str:
+        return str(table_versions.current(db, table_versions.ACCOUNTS))
+
+    @cpu_bound
+    def get_product(
+        self,
+        db: Session,
+        limit: Optional[int] = None,
+        after: Optional[str] = None,
+        with_total: bool = False,
+        version: Optional[str] = None,
+    ):
+        """
+        A page of the catalog, or the whole of it. With the `product_version`
+        read before the call, the cached catalog is only served if it was loaded
+        at that same version, so a body never predates the ETag it is sent with.
+        """
+        whole_catalog = not (limit or after or with_total)
+        if whole_catalog:
+            cached = product_cache.get_catalog(version)
+            if cached is not None:
+                return trusted_response(
+                    code=200,
+                    status="Success",
+                    result=cached,
+                    next_cursor=None,
+                    total=None
+                )
+
+        query = db.query(Product)
+        total = query.count() if with_total else None
+        products, next_cursor = keyset_page(query, Product.prod_id, limit, after)
+        if not products and not after:
             raise HTTPException(
                 status_code=404,
                 detail="Products not found",
@@ -367,29 +589,36 @@ class Staff:
             }
             for product in products
         ]
-        return ResponseModel(
+        if whole_catalog:
+            product_cache.put_catalog(serialized_products, version)
+        return trusted_response(
             code=200,
             status="Success",
-            result=serialized_products
+            result=serialized_products,
+            next_cursor=next_cursor,
+            total=total
         )
         
         
 
 
-    def get_client(self, db: Session):
-        clients = db.query(Account).filter(Account.role == 'user').all()
-        return ResponseModel(
+    def get_client(self, db: Session, limit: Optional[int] = None, after: Optional[str] = None, with_total: bool = False):
+        query = db.query(Account).filter(Account.role == 'user')
+        total = query.count() if with_total else None
+        clients, next_cursor = keyset_page(query, Account.cus_id, limit, after)
+        return PageModel(
             code=200,
             status="Success",
-            result=clients
+            result=clients,
+            next_cursor=next_cursor,
+            total=total
         )
 
-    def get_order_by_id(self, db: Session, order_id: Optional[int] = None):
+    def order_print_query(self, db: Session):
         """
-        Retrieve all orders or a specific order by ID along with customer details.
+        One row per order line with its customer and product, for the print endpoints.
         """
-        # Fetch all orders (or a specific order if order_id is provided)
-        order_query = (
+        return (
             db.query(
                 Account.cus_id,
                 Account.cus_name,
@@ -412,19 +641,157 @@ class Staff:
             .filter(Account.role == "user")
         )
 
+    def order_print_customer(self, order) -> Dict:
+        return {
+            "cus_id": order[0],
+            "customer_name": order[1],
+            "phone_number": order[2],
+            "address": order[3],
+            "orders": []
+        }
+
+    def order_print_line(self, order) -> Dict:
+        return {
+            "order_id": order[4],
+            "order_deposit": order[5],
+            #  %H:%M:%S
+            "order_date": order[6].strftime("%Y-%m-%d"),
+            "product": {
+                "prod_id": order[7],
+                "prod_name": order[8],
+                "order_weight": order[9],
+                "order_amount": order[10],
+                "product_sell_price": order[11],
+                "product_labor_cost": order[12],
+                "product_buy_price": order[13],
+            }
+        }
+
+    def order_print_documents(self, db: Session, order_id: Optional[int] = None, cus_ids: Optional[List[int]] = None) -> Optional[str]:
+        """
+        The documents of `get_order_by_id`, built by Postgres: json_build_object
+        per line, json_agg per customer and once more for the list. Returns the
+        JSON array as text, or None when nothing matched.
+        """
+        line = func.json_build_object(
+            "order_id", Order.order_id,
+            "order_deposit", Order.order_deposit,
+            "order_date", func.to_char(Order.order_date, "YYYY-MM-DD"),
+            "product", func.json_build_object(
+                "prod_id", Product.prod_id,
+                "prod_name", Product.prod_name,
+                "order_weight", OrderDetail.order_weight,
+                "order_amount", OrderDetail.order_amount,
+                "product_sell_price", OrderDetail.product_sell_price,
+                "product_labor_cost", OrderDetail.product_labor_cost,
+                "product_buy_price", OrderDetail.product_buy_price,
+            ),
+        )
+        documents = (
+            db.query(
+                Account.cus_id,
+                func.json_build_object(
+                    "cus_id", Account.cus_id,
+                    "customer_name", Account.cus_name,
+                    "phone_number", Account.phone_number,
+                    "address", Account.address,
+                    "orders", func.json_agg(aggregate_order_by(line, Order.order_id, OrderDetail.prod_id)),
+                ).label("document"),
+            )
+            .join(Order, Account.cus_id == Order.cus_id)
+            .join(OrderDetail, Order.order_id == OrderDetail.order_id)
+            .join(Product, OrderDetail.prod_id == Product.prod_id)
+            .filter(Account.role == "user")
+            .group_by(Account.cus_id)
+        )
+        if order_id:
+            documents = documents.filter(Order.order_id == order_id)
+        if cus_ids is not None:
+            documents = documents.filter(Account.cus_id.in_(cus_ids))
+        documents = documents.subquery()
+        return db.query(
+            cast(func.json_agg(aggregate_order_by(documents.c.document, documents.c.cus_id)), Text)
+        ).scalar()
+
+    def stream_orders(self, session_factory) -> Iterator[bytes]:
+        """
+        Export the whole order book as NDJSON, one customer document per line.
+        Rows come through a server-side cursor ordered by customer, and each
+        document is emitted as soon as the next customer starts, so memory stays
+        flat however large the book is. The generator owns its session because it
+        outlives the request handler.
+        """
+        db = session_factory()
+        try:
+            orders = (
+                self.order_print_query(db)
+                .order_by(Account.cus_id, Order.order_id, OrderDetail.prod_id)
+                .execution_options(yield_per=STREAM_BATCH_SIZE)
+            )
+            for _, rows in groupby(orders, key=lambda order: order[0]):
+                first = next(rows)
+                document = self.order_print_customer(first)
+                document["orders"].append(self.order_print_line(first))
+                document["orders"].extend(self.order_print_line(order) for order in rows)
+                yield (json.dumps(document, ensure_ascii=False) + "\n").encode()
+        finally:
+            db.close()
+
+    @cpu_bound
+    def get_order_by_id(
+        self,
+        db: Session,
+        order_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        after: Optional[str] = None,
+        with_total: bool = False,
+        pgjson: bool = False,
+    ):
+        """
+        Retrieve all orders or a specific order by ID along with customer details.
+        The full book is paged by customer: `limit` customers after the `after` cursor.
+        With `pgjson`, Postgres builds the documents and the JSON is returned as is.
+        """
+        # Fetch all orders (or a specific order if order_id is provided)
+        order_query = self.order_print_query(db)
+
         # If order_id is provided, filter the query
+        total = None
+        next_cursor = None
+        page_ids = None
         if order_id:
             order_query = order_query.filter(Order.order_id == order_id)
-
-        orders = order_query.all()
+        else:
+            has_orders = (
+                db.query(Order.order_id)
+                .join(OrderDetail, Order.order_id == OrderDetail.order_id)
+                .filter(Order.cus_id == Account.cus_id)
+                .exists()
+            )
+            customers = db.query(Account.cus_id).filter(Account.role == "user", has_orders)
+            total = customers.count() if with_total else None
+            if limit or after:
+                page, next_cursor = keyset_page(customers, Account.cus_id, limit, after)
+                page_ids = [row.cus_id for row in page]
+                order_query = order_query.filter(Account.cus_id.in_(page_ids))
+
+        if pgjson:
+            documents = self.order_print_documents(db, order_id=order_id, cus_ids=page_ids)
+            if documents is not None:
+                return json_passthrough(documents, next_cursor=next_cursor, total=total)
+            orders = []
+        else:
+            orders = order_query.order_by(Account.cus_id, Order.order_id, OrderDetail.prod_id).all()
 
         # If no orders found, return an empty response
         if not orders:
-            return ResponseModel(
+            return trusted_response(
                 code=404,
                 status="Error",
                 message="No orders found for the given order ID." if order_id else "No orders found.",
-                result=[]
+                result=[],
+                next_cursor=None,
+                total=total
             )
 
         # Structure response
@@ -433,34 +800,16 @@ class Staff:
             cus_id = order[0]
 
             if cus_id not in order_list:
-                order_list[cus_id] = {
-                    "cus_id": cus_id,
-                    "customer_name": order[1],
-                    "phone_number": order[2],
-                    "address": order[3],
-                    "orders": []
-                }
+                order_list[cus_id] = self.order_print_customer(order)
 
-            order_list[cus_id]["orders"].append({
-                "order_id": order[4],
-                "order_deposit": order[5],
-                #  %H:%M:%S
-                "order_date": order[6].strftime("%Y-%m-%d"),
-                "product": {
-                    "prod_id": order[7],
-                    "prod_name": order[8],
-                    "order_weight": order[9],
-                    "order_amount": order[10],
-                    "product_sell_price": order[11],
-                    "product_labor_cost": order[12],
-                    "product_buy_price": order[13],
-                }
-            })
+            order_list[cus_id]["orders"].append(self.order_print_line(order))
 
-        return ResponseModel(
+        return trusted_response(
             code=200,
             status="Success",
-            result=list(order_list.values())  # Convert dict to list
+            result=list(order_list.values()),  # Convert dict to list
+            next_cursor=next_cursor,
+            total=total
         )
 
         
@@ -482,6 +831,7 @@ class Staff:
             .join(Order, OrderDetail.order_id == Order.order_id)
             .join(Product, OrderDetail.prod_id == Product.prod_id)
             .filter(Order.cus_id.in_(cus_ids))  # Fetch orders for multiple `cus_id`s
+            .order_by(Order.order_id, OrderDetail.prod_id)
             .all()
         )
 
@@ -515,9 +865,44 @@ class Staff:
         return list(grouped_orders.values())  # Return all orders
 
 
+    def order_detail_documents(self, db: Session, cus_ids: List[int]) -> Optional[str]:
+        """
+        The orders of `get_order_detail`, built by Postgres as one JSON array.
+        """
+        product = func.json_build_object(
+            "prod_name", Product.prod_name,
+            "prod_id", Product.prod_id,
+            "order_weight", OrderDetail.order_weight,
+            "order_amount", OrderDetail.order_amount,
+            "product_sell_price", OrderDetail.product_sell_price,
+            "product_labor_cost", OrderDetail.product_labor_cost,
+            "product_buy_price", OrderDetail.product_buy_price,
+        )
+        documents = (
+            db.query(
+                Order.order_id,
+                func.json_build_object(
+                    "order_id", Order.order_id,
+                    "order_deposit", Order.order_deposit,
+                    "order_date", iso_timestamp(Order.order_date),
+                    "products", func.json_agg(aggregate_order_by(product, OrderDetail.prod_id)),
+                ).label("document"),
+            )
+            .join(OrderDetail, Order.order_id == OrderDetail.order_id)
+            .join(Product, OrderDetail.prod_id == Product.prod_id)
+            .filter(Order.cus_id.in_(cus_ids))
+            .group_by(Order.order_id)
+            .subquery()
+        )
+        return db.query(
+            cast(func.json_agg(aggregate_order_by(documents.c.document, documents.c.order_id)), Text)
+        ).scalar()
+
+
 # ======================================= Order search ===========================================================
 
-    def get_client_order(self, db: Session, phone_number: Optional[str] = None, cus_name: Optional[str] = None, cus_id: Optional[int] = None):
+    @cpu_bound
+    def get_client_order(self, db: Session, phone_number: Optional[str] = None, cus_name: Optional[str] = None, cus_id: Optional[int] = None, pgjson: bool = False):
         # Build dynamic filters based on provided parameters
         filters = [Account.role == 'user']
 
@@ -540,8 +925,13 @@ class Staff:
         # Extract customer IDs and names from query result
         cus_ids = [client.cus_id for client in clients]
 
+        if pgjson:
+            documents = self.order_detail_documents(db=db, cus_ids=cus_ids)
+            if documents is not None:
+                return json_passthrough(documents)
+
         # Fetch all orders related to those customer IDs
-        get_detail_order = self.get_order_detail(db=db, cus_ids=cus_ids)  # Pass list of `cus_id`s
+        get_detail_order = [] if pgjson else self.get_order_detail(db=db, cus_ids=cus_ids)  # Pass list of `cus_id`s
 
         if not get_detail_order:
             return ResponseModel(
@@ -654,13 +1044,14 @@ class Staff:
                 .filter(
                     and_(
                         or_(
-                            Pawn.cus_id == cus_id,
-                            Account.phone_number == phone_number,
-                            func.lower(Account.cus_name) == func.lower(str(cus_name)),
+                            (cus_id is not None and Pawn.cus_id == cus_id),
+                            (phone_number is not None and Account.phone_number == phone_number),
+                            (cus_name is not None and func.lower(Account.cus_name) == func.lower(cus_name)),
                         ),
                         Account.role == "user",
                     )
                 )
+                .order_by(Pawn.pawn_id, PawnDetail.prod_id)
                 .all()
             )
     
@@ -709,7 +1100,46 @@ class Staff:
             #  Ensure pawn_id is included in every returned pawn record
             return list(grouped_pawns.values())
     
-    def get_client_pawn(self, db: Session, cus_id: Optional[int] = None, cus_name: Optional[str] = None, phone_number: Optional[str] = None):
+    def pawn_detail_documents(self, db: Session, cus_id: int) -> Optional[str]:
+        """
+        The pawns of `get_pawn_detail` for one customer, built by Postgres as one JSON array.
+        """
+        product = func.json_build_object(
+            "prod_id", Product.prod_id,
+            "prod_name", Product.prod_name,
+            "pawn_weight", PawnDetail.pawn_weight,
+            "pawn_amount", PawnDetail.pawn_amount,
+            "pawn_unit_price", PawnDetail.pawn_unit_price,
+        )
+        documents = (
+            db.query(
+                Pawn.pawn_id,
+                func.json_build_object(
+                    "pawn_id", Pawn.pawn_id,
+                    "cus_id", Account.cus_id,
+                    "customer_name", Account.cus_name,
+                    "phone_number", Account.phone_number,
+                    "address", Account.address,
+                    "pawn_deposit", Pawn.pawn_deposit,
+                    "pawn_date", iso_timestamp(Pawn.pawn_date),
+                    "pawn_expire_date", iso_timestamp(Pawn.pawn_expire_date),
+                    "products", func.json_agg(aggregate_order_by(product, PawnDetail.prod_id)),
+                ).label("document"),
+            )
+            .select_from(Account)
+            .join(Pawn, Account.cus_id == Pawn.cus_id)
+            .join(PawnDetail, Pawn.pawn_id == PawnDetail.pawn_id)
+            .join(Product, PawnDetail.prod_id == Product.prod_id)
+            .filter(Pawn.cus_id == cus_id, Account.role == "user")
+            .group_by(Pawn.pawn_id, Account.cus_id)
+            .subquery()
+        )
+        return db.query(
+            cast(func.json_agg(aggregate_order_by(documents.c.document, documents.c.pawn_id)), Text)
+        ).scalar()
+
+    @cpu_bound
+    def get_client_pawn(self, db: Session, cus_id: Optional[int] = None, cus_name: Optional[str] = None, phone_number: Optional[str] = None, pgjson: bool = False):
         client = db.query(Account).filter(
             and_(
                 or_(
@@ -726,7 +1156,12 @@ class Staff:
                 detail="Client not found",
             )
             
-        get_detail_pawn = self.get_pawn_detail(db=db, cus_id=client.cus_id)
+        if pgjson:
+            documents = self.pawn_detail_documents(db=db, cus_id=client.cus_id)
+            if documents is not None:
+                return json_passthrough(documents)
+
+        get_detail_pawn = [] if pgjson else self.get_pawn_detail(db=db, cus_id=client.cus_id)
         if len(get_detail_pawn) <= 0:
             return ResponseModel(
                 code=200,
@@ -756,7 +1191,10 @@ class Staff:
 
         try:
             db.delete(product)
+            table_versions.bump(db, table_versions.PRODUCTS)
             db.commit()
+            product_cache.invalidate()
+            search_index.remove(product_id)
             return ResponseModel(
                 code=200,
                 status="Success",
@@ -774,7 +1212,7 @@ class Staff:
         """
         Deletes a product by its name.
         """
-        product = db.query(Product).filter(func.lower(Product.prod_name) == func.lower(product_name)).first()
+        product = self.product_by_name(db, product_name)
         if not product:
             raise HTTPException(
                 status_code=404,
@@ -782,8 +1220,12 @@ class Staff:
             )
         
         try:
+            prod_id = product.prod_id
             db.delete(product)
+            table_versions.bump(db, table_versions.PRODUCTS)
             db.commit()
+            product_cache.invalidate()
+            search_index.remove(prod_id)
             return ResponseModel(
                 code=200,
                 status="Success",
@@ -802,7 +1244,10 @@ class Staff:
         """
         try:
             num_deleted = db.query(Product).delete()
+            table_versions.bump(db, table_versions.PRODUCTS)
             db.commit()
+            product_cache.invalidate()
+            search_index.clear()
             return ResponseModel(
                 code=200,
                 status="Success",
@@ -819,6 +1264,10 @@ class Staff:
         """
         Fetch a product by its ID and return it in a serialized format.
         """
+        cached = product_cache.get(product_id)
+        if cached is not None:
+            return cached
+
         product = db.query(Product).filter(Product.prod_id == product_id).first()
         if not product:
             raise HTTPException(
@@ -826,13 +1275,59 @@ class Staff:
                 detail=f"Product with ID {product_id} not found"
             )
         # Serialize the product
-        return {
+        serialized_product = {
             "id": product.prod_id,  # Changed key name to match the format in `get_product`
             "name": product.prod_name,
             "price": product.unit_price,
             "amount": product.amount,
         }
+        product_cache.put(serialized_product)
+        return serialized_product
         
+    def serialize_product(self, product) -> Dict:
+        return {
+            "id": product.prod_id,
+            "name": product.prod_name,
+            "price": product.unit_price,
+            "amount": product.amount,
+        }
+
+    def search_catalog(self, db: Session) -> Iterator[Dict]:
+        """Every product, serialized, streamed in STREAM_BATCH_SIZE batches."""
+        products = (
+            db.query(Product.prod_id, Product.prod_name, Product.unit_price, Product.amount)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        return (self.serialize_product(product) for product in products)
+
+    def product_search_index(self, db: Session) -> NgramIndex:
+        """
+        The worker's n-gram index over product names: built from the table on
+        first use, then rebuilt in the background on its own session whenever it
+        is older than its TTL, while searches keep using the current one.
+        """
+        def search_catalog_in_background():
+            with ReadSessionLocal() as session:
+                yield from self.search_catalog(session)
+
+        search_index.refresh(lambda: self.search_catalog(db), search_catalog_in_background)
+        return search_index
+
+    @cpu_bound
+    def search_product(self, search_input: str, db: Session, limit: int = 50) -> List[Dict]:
+        """
+        Substring and fuzzy product search served from the in-memory n-gram index,
+        best matches first. Replaces the `ILIKE '%term%'` scan of `get_product_by_name`
+        on the POS search-as-you-type path.
+        """
+        products = self.product_search_index(db).search(search_input, limit)
+        if not products:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No products found with name '{search_input}'"
+            )
+        return products
+
     def get_product_by_name(self, product_name: str, db: Session) -> List[Dict]:
         """
         Fetch products by their name and return them in a serialized format.
@@ -855,12 +1350,11 @@ class Staff:
         ]
         
         
-    def get_pawn_by_id(self, db: Session, pawn_id: Optional[int] = None):
+    def pawn_print_query(self, db: Session):
         """
-        Retrieve all pawn records or a specific pawn by ID along with customer and product details.
+        One row per pawn line with its customer and product, for the print endpoints.
         """
-        # Query to fetch all pawn records (or filter by pawn_id if provided)
-        pawn_query = (
+        return (
             db.query(
                 Account.cus_id,
                 Account.cus_name,
@@ -882,19 +1376,154 @@ class Staff:
             .filter(Account.role == "user")
         )
 
+    def pawn_print_customer(self, pawn) -> Dict:
+        return {
+            "cus_id": pawn[0],
+            "customer_name": pawn[1],
+            "phone_number": pawn[2],
+            "address": pawn[3],
+            "pawns": []
+        }
+
+    def pawn_print_line(self, pawn) -> Dict:
+        return {
+            "pawn_id": pawn[4],
+            "pawn_deposit": pawn[5],
+            "pawn_date": pawn[6].strftime("%Y-%m-%d"),
+            "pawn_expire_date": pawn[7].isoformat(" "),
+            "products": [
+                {
+                    "prod_id": pawn[8],
+                    "prod_name": pawn[9],
+                    "pawn_weight": pawn[10],
+                    "pawn_amount": pawn[11],
+                    "pawn_unit_price": pawn[12],
+                    # "pawn_deposit": pawn[5],  
+                }
+            ]
+        }
+
+    def pawn_print_documents(self, db: Session, pawn_id: Optional[int] = None, cus_ids: Optional[List[int]] = None) -> Optional[str]:
+        """
+        The documents of `get_pawn_by_id`, built by Postgres; see `order_print_documents`.
+        """
+        line = func.json_build_object(
+            "pawn_id", Pawn.pawn_id,
+            "pawn_deposit", Pawn.pawn_deposit,
+            "pawn_date", func.to_char(Pawn.pawn_date, "YYYY-MM-DD"),
+            "pawn_expire_date", iso_timestamp(Pawn.pawn_expire_date, sep=" "),
+            "products", func.json_build_array(
+                func.json_build_object(
+                    "prod_id", Product.prod_id,
+                    "prod_name", Product.prod_name,
+                    "pawn_weight", PawnDetail.pawn_weight,
+                    "pawn_amount", PawnDetail.pawn_amount,
+                    "pawn_unit_price", PawnDetail.pawn_unit_price,
+                )
+            ),
+        )
+        documents = (
+            db.query(
+                Account.cus_id,
+                func.json_build_object(
+                    "cus_id", Account.cus_id,
+                    "customer_name", Account.cus_name,
+                    "phone_number", Account.phone_number,
+                    "address", Account.address,
+                    "pawns", func.json_agg(aggregate_order_by(line, Pawn.pawn_id, PawnDetail.prod_id)),
+                ).label("document"),
+            )
+            .join(Pawn, Account.cus_id == Pawn.cus_id)
+            .join(PawnDetail, Pawn.pawn_id == PawnDetail.pawn_id)
+            .join(Product, PawnDetail.prod_id == Product.prod_id)
+            .filter(Account.role == "user")
+            .group_by(Account.cus_id)
+        )
+        if pawn_id:
+            documents = documents.filter(Pawn.pawn_id == pawn_id)
+        if cus_ids is not None:
+            documents = documents.filter(Account.cus_id.in_(cus_ids))
+        documents = documents.subquery()
+        return db.query(
+            cast(func.json_agg(aggregate_order_by(documents.c.document, documents.c.cus_id)), Text)
+        ).scalar()
+
+    def stream_pawns(self, session_factory) -> Iterator[bytes]:
+        """
+        Export the whole pawn book as NDJSON, one customer document per line.
+        Same streaming scheme as `stream_orders`.
+        """
+        db = session_factory()
+        try:
+            pawns = (
+                self.pawn_print_query(db)
+                .order_by(Account.cus_id, Pawn.pawn_id, PawnDetail.prod_id)
+                .execution_options(yield_per=STREAM_BATCH_SIZE)
+            )
+            for _, rows in groupby(pawns, key=lambda pawn: pawn[0]):
+                first = next(rows)
+                document = self.pawn_print_customer(first)
+                document["pawns"].append(self.pawn_print_line(first))
+                document["pawns"].extend(self.pawn_print_line(pawn) for pawn in rows)
+                yield (json.dumps(document, ensure_ascii=False) + "\n").encode()
+        finally:
+            db.close()
+
+    @cpu_bound
+    def get_pawn_by_id(
+        self,
+        db: Session,
+        pawn_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        after: Optional[str] = None,
+        with_total: bool = False,
+        pgjson: bool = False,
+    ):
+        """
+        Retrieve all pawn records or a specific pawn by ID along with customer and product details.
+        The full book is paged by customer: `limit` customers after the `after` cursor.
+        With `pgjson`, Postgres builds the documents and the JSON is returned as is.
+        """
+        # Query to fetch all pawn records (or filter by pawn_id if provided)
+        pawn_query = self.pawn_print_query(db)
+
         # If pawn_id is provided, filter the query
+        total = None
+        next_cursor = None
+        page_ids = None
         if pawn_id:
             pawn_query = pawn_query.filter(Pawn.pawn_id == pawn_id)
-
-        pawns = pawn_query.all()
+        else:
+            has_pawns = (
+                db.query(Pawn.pawn_id)
+                .join(PawnDetail, Pawn.pawn_id == PawnDetail.pawn_id)
+                .filter(Pawn.cus_id == Account.cus_id)
+                .exists()
+            )
+            customers = db.query(Account.cus_id).filter(Account.role == "user", has_pawns)
+            total = customers.count() if with_total else None
+            if limit or after:
+                page, next_cursor = keyset_page(customers, Account.cus_id, limit, after)
+                page_ids = [row.cus_id for row in page]
+                pawn_query = pawn_query.filter(Account.cus_id.in_(page_ids))
+
+        if pgjson:
+            documents = self.pawn_print_documents(db, pawn_id=pawn_id, cus_ids=page_ids)
+            if documents is not None:
+                return json_passthrough(documents, next_cursor=next_cursor, total=total)
+            pawns = []
+        else:
+            pawns = pawn_query.order_by(Account.cus_id, Pawn.pawn_id, PawnDetail.prod_id).all()
 
         # If no pawn records found, return a 404 response
         if not pawns:
-            return ResponseModel(
+            return trusted_response(
                 code=404,
                 status="Error",
                 message=f"No pawn record found for pawn ID {pawn_id}." if pawn_id else "No pawn records found.",
-                result=[]
+                result=[],
+                next_cursor=None,
+                total=total
             )
 
         # Structure the response
@@ -903,37 +1532,18 @@ class Staff:
             cus_id = pawn[0]  # Account.cus_id
 
             if cus_id not in pawn_list:
-                pawn_list[cus_id] = {
-                    "cus_id": cus_id,
-                    "customer_name": pawn[1],
-                    "phone_number": pawn[2],
-                    "address": pawn[3],
-                    "pawns": []
-                }
+                pawn_list[cus_id] = self.pawn_print_customer(pawn)
 
             # Add pawn details for the customer
-            pawn_list[cus_id]["pawns"].append({
-                "pawn_id": pawn[4],
-                "pawn_deposit": pawn[5],
-                "pawn_date": pawn[6].strftime("%Y-%m-%d"),
-                "pawn_expire_date": str(pawn[7]),
-                "products": [
-                    {
-                        "prod_id": pawn[8],
-                        "prod_name": pawn[9],
-                        "pawn_weight": pawn[10],
-                        "pawn_amount": pawn[11],
-                        "pawn_unit_price": pawn[12],
-                        # "pawn_deposit": pawn[5],  
-                    }
-                ]
-            })
+            pawn_list[cus_id]["pawns"].append(self.pawn_print_line(pawn))
 
         # Return a successful response
-        return ResponseModel(
+        return trusted_response(
             code=200,
             status="Success",
-            result=list(pawn_list.values())  # Convert dict to list
+            result=list(pawn_list.values()),  # Convert dict to list
+            next_cursor=next_cursor,
+            total=total
         )
 
         
@@ -941,73 +1551,79 @@ class Staff:
 # =================================================================================================================================
 
 
-    def get_next_product_id(self, db: Session):
+    def reserve_ids(self, db: Session, kind: str, count: int = 1) -> List[int]:
         """
-        Retrieve the last product ID and return the next available ID.
+        Take `count` IDs from the table's own serial sequence in one round trip.
+        nextval never hands the same value out twice, so IDs reserved by
+        different terminals cannot collide; unused ones are simply skipped.
         """
+        column = ID_COLUMNS[kind]
+        sequence = cast(func.pg_get_serial_sequence(column.table.name, column.name), REGCLASS)
         try:
-            last_product = db.query(Product.prod_id).order_by(Product.prod_id.desc()).first()
-
-            next_product_id = last_product.prod_id + 1 if last_product else 1  # Start from 1 if no product exists
-
-            return {
-                "code": 200,
-                "status": "Success",
-                "result": {"id": next_product_id}
-            }
+            ids = db.execute(
+                select(func.nextval(sequence)).select_from(func.generate_series(1, count))
+            ).scalars().all()
+            db.commit()
         except SQLAlchemyError as e:
+            db.rollback()
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        return sorted(ids)
 
-    def get_next_client_id(self, db: Session):
+    def reserved_id_problem(self, db: Session, column, requested_id: int) -> Optional[str]:
         """
-        Retrieve the last client ID and return the next available ID.
+        Why `requested_id` cannot be used for a new row: "taken" if a row has it,
+        "not reserved" if the sequence has not handed it out yet (the sequence
+        would later give it to someone else), None if it is free to use.
         """
-        try:
-            last_client = db.query(Account.cus_id).filter(Account.role == "user").order_by(Account.cus_id.desc()).first()
+        sequence = cast(func.pg_get_serial_sequence(column.table.name, column.name), REGCLASS)
+        issued, taken = db.execute(
+            select(func.pg_sequence_last_value(sequence), exists().where(column == requested_id))
+        ).one()
+        if taken:
+            return "taken"
+        if issued is None or requested_id > issued:
+            return "not reserved"
+        return None
 
-            next_client_id = last_client.cus_id + 1 if last_client else 1  # Start from 1 if no client exists
+    def get_next_product_id(self, db: Session):
+        """
+        Reserve and return the next product ID.
+        """
+        return {
+            "code": 200,
+            "status": "Success",
+            "result": {"id": self.reserve_ids(db, "product")[0]}
+        }
 
-            return {
-                "code": 200,
-                "status": "Success",
-                "result": {"id": next_client_id}
-            }
-        except SQLAlchemyError as e:
-            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    def get_next_client_id(self, db: Session):
+        """
+        Reserve and return the next client ID.
+        """
+        return {
+            "code": 200,
+            "status": "Success",
+            "result": {"id": self.reserve_ids(db, "client")[0]}
+        }
         
     def get_next_order_id(self, db: Session):
         """
-        Retrieve the last order ID and return the next available ID.
+        Reserve and return the next order ID.
         """
-        try:
-            last_order = db.query(Order.order_id).order_by(Order.order_id.desc()).first()
-
-            next_order_id = last_order.order_id + 1 if last_order else 1  # Start from 1 if no order exists
-
-            return {
-                "code": 200,
-                "status": "Success",
-                "result": {"id": next_order_id}
-            }
-        except SQLAlchemyError as e:
-            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        return {
+            "code": 200,
+            "status": "Success",
+            "result": {"id": self.reserve_ids(db, "order")[0]}
+        }
 
     def get_next_pawn_id(self, db: Session):
         """
-        Retrieve the last pawn ID and return the next available ID.
+        Reserve and return the next pawn ID.
         """
-        try:
-            last_pawn = db.query(Pawn.pawn_id).order_by(Pawn.pawn_id.desc()).first()
-
-            next_pawn_id = last_pawn.pawn_id + 1 if last_pawn else 1  # Start from 1 if no pawn exists
-
-            return {
-                "code": 200,
-                "status": "Success",
-                "result": {"id": next_pawn_id}
-            }
-        except SQLAlchemyError as e:
-            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        return {
+            "code": 200,
+            "status": "Success",
+            "result": {"id": self.reserve_ids(db, "pawn")[0]}
+        }
 
 # =================================================================================================================================
 
@@ -1026,13 +1642,10 @@ class Staff:
             )
 
         # Search for product by ID or Name
-        product_query = db.query(Product)
         if prod_id:
-            product_query = product_query.filter(Product.prod_id == prod_id)
-        elif prod_name:
-            product_query = product_query.filter(Product.prod_name.ilike(prod_name))
-
-        product = product_query.first()
+            product = db.query(Product).filter(Product.prod_id == prod_id).first()
+        else:
+            product = self.product_by_name(db, prod_name)
 
         if not product:
             raise HTTPException(
@@ -1046,8 +1659,11 @@ class Staff:
         if amount is not None:
             product.amount = amount
 
+        table_versions.bump(db, table_versions.PRODUCTS)
         db.commit()
         db.refresh(product)
+        product_cache.invalidate()
+        search_index.add(self.serialize_product(product))
 
         return ResponseModel(
             code=200,
@@ -1064,11 +1680,21 @@ class Staff:
 
     
 
-    def get_all_pawns(self, db: Session, cus_id: int = None, cus_name: str = None, phone_number: str = None):
+    @cpu_bound
+    def get_all_pawns(
+        self,
+        db: Session,
+        cus_id: int = None,
+        cus_name: str = None,
+        phone_number: str = None,
+        limit: Optional[int] = None,
+        after: Optional[str] = None,
+        with_total: bool = False,
+    ):
         """
         Retrieve all pawn transactions with customer and product details.
         If search parameters (cus_id, cus_name, phone_number) are provided, filter the records.
-        Otherwise, return all records.
+        Otherwise, return all records, optionally paged by customer with `limit`/`after`.
         """
         query = (
             db.query(
@@ -1092,27 +1718,43 @@ class Staff:
         )
 
         # Apply filters if search parameters are provided
+        search_filter = None
         if cus_id or cus_name or phone_number:
-            query = query.filter(
-                and_(
-                    or_(
-                        (cus_id is not None and Account.cus_id == cus_id),
-                        (cus_name is not None and func.lower(Account.cus_name).contains(func.lower(cus_name))),
-                        (phone_number is not None and Account.phone_number.contains(phone_number)),
-                    ),
-                    Account.role == "user"
-                )
+            search_filter = and_(
+                or_(
+                    (cus_id is not None and Account.cus_id == cus_id),
+                    (cus_name is not None and func.lower(Account.cus_name).contains(func.lower(cus_name))),
+                    (phone_number is not None and Account.phone_number.contains(phone_number)),
+                ),
+                Account.role == "user"
             )
+            query = query.filter(search_filter)
+
+        next_cursor = None
+        has_pawns = (
+            db.query(Pawn.pawn_id)
+            .join(PawnDetail, Pawn.pawn_id == PawnDetail.pawn_id)
+            .filter(Pawn.cus_id == Account.cus_id)
+            .exists()
+        )
+        customers = db.query(Account.cus_id).filter(has_pawns)
+        if search_filter is not None:
+            customers = customers.filter(search_filter)
+        total = customers.count() if with_total else None
+        if limit or after:
+            page, next_cursor = keyset_page(customers, Account.cus_id, limit, after)
+            query = query.filter(Account.cus_id.in_([row.cus_id for row in page]))
 
         query = query.order_by(Pawn.pawn_id.desc())  # Sort by latest pawn records
         pawns = query.all()
 
         if not pawns:
-            return ResponseModel(
+            return PageModel(
                 code=200,
                 status="Success",
                 message="No pawn records found",
-                result=[]
+                result=[],
+                total=total
             )
 
         # Group the results by cus_id
@@ -1154,10 +1796,245 @@ class Staff:
 
             grouped_pawns[cus_id]["products"].append(product)
 
+        return PageModel(
+            code=200,
+            status="Success",
+            result=list(grouped_pawns.values()),
+            next_cursor=next_cursor,
+            total=total
+        )
+
+# =================================================================================================================================
+
+    def get_weight_totals(self, db: Session, start_date: date, end_date: date):
+        """
+        Grams of metal held in active pawns, and sold per day between start_date
+        and end_date (inclusive). Held grams are one SUM over the daily summaries
+        (kept per issue day as pawns are written and leave active), sold grams one
+        SUM over the parsed order gram column, answered from its index. Lines whose
+        weight text is not a weight are counted, not summed.
+        """
+        held = db.execute(
+            select(
+                func.coalesce(func.sum(DailyTotal.grams_held), 0),
+                func.coalesce(func.sum(DailyTotal.held_unparsed_lines), 0),
+            )
+        ).one()
+
+        day = func.date(OrderDetail.order_date)
+        sold = db.execute(
+            select(
+                day,
+                func.coalesce(func.sum(OrderDetail.order_weight_grams), 0),
+                func.count().filter(OrderDetail.order_weight_grams.is_(None)),
+            )
+            .where(
+                OrderDetail.order_date >= start_date,
+                OrderDetail.order_date < end_date + timedelta(days=1),
+            )
+            .group_by(day)
+            .order_by(day)
+        ).all()
+
         return ResponseModel(
             code=200,
             status="Success",
-            result=list(grouped_pawns.values())
+            result={
+                "held_grams": round(held[0], 4),
+                "held_unparsed_lines": held[1],
+                "sold_grams": round(sum(grams for _, grams, _ in sold), 4),
+                "sold_unparsed_lines": sum(unparsed for _, _, unparsed in sold),
+                "sold_by_day": [
+                    {"date": sold_day.isoformat(), "grams": round(grams, 4), "unparsed_lines": unparsed}
+                    for sold_day, grams, unparsed in sold
+                ],
+            },
+        )
+
+    def get_expiring_pawns(self, db: Session, days: int, limit: int, after: Optional[str] = None):
+        """
+        Active pawns expiring between today and `days` days from now, soonest first,
+        with their customer and principal. The page is read from the partial index
+        on active pawns, so its cost follows the page size, not the pawn history.
+        """
+        today = date.today()
+        principal = (
+            select(func.coalesce(func.sum(PawnDetail.pawn_unit_price * func.coalesce(PawnDetail.pawn_amount, 1)), 0))
+            .where(PawnDetail.pawn_id == Pawn.pawn_id)
+            .scalar_subquery()
+        )
+        query = (
+            db.query(
+                Pawn.pawn_id,
+                Pawn.cus_id,
+                Account.cus_name,
+                Account.phone_number,
+                Pawn.pawn_deposit,
+                Pawn.pawn_date,
+                Pawn.pawn_expire_date,
+                principal.label("principal"),
+            )
+            .outerjoin(Account, Account.cus_id == Pawn.cus_id)
+            .filter(
+                Pawn.status == "active",
+                Pawn.pawn_expire_date >= today,
+                Pawn.pawn_expire_date < today + timedelta(days=days + 1),
+            )
+        )
+        if after:
+            try:
+                expire_date, pawn_id = decode_cursor(after)
+                key = (datetime.fromisoformat(expire_date), int(pawn_id))
+            except (TypeError, ValueError):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Invalid pagination cursor",
+                )
+            query = query.filter(tuple_(Pawn.pawn_expire_date, Pawn.pawn_id) > key)
+        rows = query.order_by(Pawn.pawn_expire_date, Pawn.pawn_id).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([rows[-1].pawn_expire_date.isoformat(), rows[-1].pawn_id])
+
+        return PageModel(
+            code=200,
+            status="Success",
+            result=[
+                {
+                    "pawn_id": row.pawn_id,
+                    "cus_id": row.cus_id,
+                    "customer_name": row.cus_name,
+                    "phone_number": row.phone_number,
+                    "pawn_deposit": row.pawn_deposit,
+                    "pawn_date": row.pawn_date,
+                    "pawn_expire_date": row.pawn_expire_date,
+                    "days_left": (row.pawn_expire_date.date() - today).days,
+                    "principal": round(row.principal, 2),
+                }
+                for row in rows
+            ],
+            next_cursor=next_cursor,
+        )
+
+    def update_pawn_status(self, db: Session, pawn_id: int, status: str):
+        """
+        Close a pawn: redeemed (the customer paid it back, before or after expiry)
+        or forfeited (expired and kept by the shop). The pawn is locked FOR UPDATE
+        before its status is checked, so it cannot race the expiry scheduler (which
+        skips locked pawns); the closed pawn is taken out of the expiring summaries
+        in the same transaction.
+        """
+        allowed = PAWN_TRANSITIONS[status]
+        pawn = db.execute(
+            select(Pawn.status, Pawn.pawn_date, Pawn.pawn_expire_date).where(Pawn.pawn_id == pawn_id).with_for_update()
+        ).first()
+        if pawn is None:
+            db.rollback()
+            raise HTTPException(
+                status_code=404,
+                detail="Pawn not found",
+            )
+        if pawn.status not in allowed:
+            db.rollback()
+            raise HTTPException(
+                status_code=400,
+                detail=f"The pawn is {pawn.status}; only {' or '.join(allowed)} pawns can be marked {status}.",
+            )
+        db.execute(update(Pawn).where(Pawn.pawn_id == pawn_id).values(status=status))
+        summaries.record_status_change(
+            db, [(pawn_id, pawn.pawn_date, pawn.pawn_expire_date)], released=pawn.status == "active", closed=True
+        )
+        db.commit()
+        return ResponseModel(
+            code=200,
+            status="Success",
+            message=f"Pawn {pawn_id} marked {status}",
+            result={"pawn_id": pawn_id, "status": status},
+        )
+
+    @cpu_bound
+    def get_pawn_valuation(self, db: Session, as_of: date, monthly_rate: float, top: int = 20):
+        """Revalue the pawns active on `as_of` against the current price table (see routes.user.valuation)."""
+        try:
+            prices = valuation.price_source.prices()
+        except (OSError, ValueError) as e:
+            valuation.logger.warning("Price table unavailable: %s", e)
+            raise HTTPException(status_code=503, detail="No price table is available.")
+        book = valuation.load_pawn_book(db, as_of)
+        return ResponseModel(
+            code=200,
+            status="Success",
+            result=valuation.value_pawn_book(book, prices, as_of, monthly_rate, top),
+        )
+
+    def round_money(self, value):
+        """Sums of Float columns to the cent (closed pawns leave residues like -1e-14, and -0.0 becomes 0.0); counts are left alone."""
+        return round(value, 2) + 0.0 if isinstance(value, float) else value
+
+    def get_daily_report(self, db: Session, start_date: date, end_date: date):
+        """Day-by-day sales, deposits and pawn principal issued versus expiring, read from daily_totals only."""
+        columns = [column for column in DailyTotal.__table__.c if column.name != "day"]
+        days = db.execute(
+            select(DailyTotal.__table__)
+            .where(DailyTotal.day >= start_date, DailyTotal.day <= end_date)
+            .order_by(DailyTotal.day)
+        ).mappings().all()
+        return ResponseModel(
+            code=200,
+            status="Success",
+            result={
+                "days": [
+                    {**{key: self.round_money(value) for key, value in day.items()}, "day": day["day"].isoformat()}
+                    for day in days
+                ],
+                "totals": {column.name: self.round_money(sum(day[column.name] for day in days)) for column in columns},
+            },
+        )
+
+    def get_product_report(self, db: Session, start_date: date, end_date: date, limit: int = 50):
+        """Best-selling and most-pawned products over the range, read from the per-product daily summaries."""
+        sales = (
+            select(
+                DailyProductSale.prod_id,
+                func.sum(DailyProductSale.lines).label("lines"),
+                func.sum(DailyProductSale.amount).label("amount"),
+                func.sum(DailyProductSale.sell_total).label("sell_total"),
+                func.sum(DailyProductSale.labor_total).label("labor_total"),
+                func.sum(DailyProductSale.buy_total).label("buy_total"),
+            )
+            .where(DailyProductSale.day >= start_date, DailyProductSale.day <= end_date)
+            .group_by(DailyProductSale.prod_id)
+            .order_by(func.sum(DailyProductSale.sell_total).desc(), DailyProductSale.prod_id)
+            .limit(limit)
+            .subquery()
+        )
+        pawns = (
+            select(
+                DailyProductPawn.prod_id,
+                func.sum(DailyProductPawn.lines_issued).label("lines_issued"),
+                func.sum(DailyProductPawn.principal_issued).label("principal_issued"),
+                func.sum(DailyProductPawn.lines_expiring).label("lines_expiring"),
+                func.sum(DailyProductPawn.principal_expiring).label("principal_expiring"),
+            )
+            .where(DailyProductPawn.day >= start_date, DailyProductPawn.day <= end_date)
+            .group_by(DailyProductPawn.prod_id)
+            .order_by(func.sum(DailyProductPawn.principal_issued).desc(), DailyProductPawn.prod_id)
+            .limit(limit)
+            .subquery()
+        )
+
+        def named(summary, rank_by: str) -> List[Dict]:
+            rows = db.execute(
+                select(summary, Product.prod_name)
+                .join(Product, Product.prod_id == summary.c.prod_id)
+                .order_by(summary.c[rank_by].desc(), summary.c.prod_id)
+            ).mappings().all()
+            return [{key: self.round_money(value) for key, value in row.items()} for row in rows]
+
+        return ResponseModel(
+            code=200,
+            status="Success",
+            result={"sales": named(sales, "sell_total"), "pawns": named(pawns, "principal_issued")},
         )
-        
-    
\ No newline at end of file
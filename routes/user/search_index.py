@@ -0,0 +1,231 @@
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, Iterator, List
+
+from dotenv import load_dotenv
+
+from product_names import normalize_product_name
+
+load_dotenv()
+
+logger = logging.getLogger("search_index")
+
+SEARCH_INDEX_TTL = float(os.getenv("SEARCH_INDEX_TTL", "300"))
+SEARCH_MIN_SIMILARITY = float(os.getenv("SEARCH_MIN_SIMILARITY", "0.3"))
+
+# Substring matches verified per result slot before ranking stops looking
+CANDIDATE_BUDGET_FACTOR = 20
+# Grams in more than this share of the catalog are ignored for fuzzy ranking
+COMMON_GRAM_FRACTION = 0.05
+EMPTY = frozenset()
+
+
+def search_key(text: str) -> str:
+    """Names and terms are compared in `Product.normalized_name` form."""
+    return normalize_product_name(text)
+
+
+class NgramIndex:
+    """
+    Trigram inverted index over product names, kept in memory per worker.
+    Substring matches are found by intersecting the posting lists of the term's
+    trigrams and verifying the candidates, earliest and shortest match first;
+    when those are not enough, fuzzy matches are ranked by trigram similarity
+    (shared / union, as in pg_trgm).
+    Writes through `Staff` keep it current; it is rebuilt from the database
+    every `ttl` seconds, in the background, to pick up writes made by other
+    workers.
+    """
+
+    def __init__(self, n: int = 3, ttl: float = SEARCH_INDEX_TTL, min_similarity: float = SEARCH_MIN_SIMILARITY):
+        self.n = n
+        self.ttl = ttl
+        self.min_similarity = min_similarity
+        self._postings = defaultdict(set)
+        self._docs = {}
+        self._keys = {}
+        self._gram_counts = {}
+        self._loaded_at = None
+        self._lock = threading.RLock()
+        # Held by the one build in progress; writes made during it are queued in _pending
+        self._build_lock = threading.Lock()
+        self._pending = None
+
+    def grams(self, key: str, padded: bool = True) -> set:
+        """
+        Trigrams of each word. Padded grams mark word boundaries (as pg_trgm does)
+        and are what the index stores; unpadded grams are the ones a substring of
+        a word must contain.
+        """
+        grams = set()
+        for word in key.split():
+            text = f"{' ' * (self.n - 1)}{word} " if padded else word
+            grams.update(text[i:i + self.n] for i in range(len(text) - self.n + 1))
+        return grams
+
+    @property
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def load(self, products: Iterable[Dict]):
+        """
+        Rebuild from `products`. The new maps are built outside the lock, so
+        searches keep using the current ones meanwhile; writes made during the
+        build are replayed onto the new maps when they are swapped in.
+        """
+        with self._lock:
+            self._pending = []
+        try:
+            fresh = NgramIndex(self.n, self.ttl, self.min_similarity)
+            for product in products:
+                fresh._add(product)
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self._postings, self._docs = fresh._postings, fresh._docs
+            self._keys, self._gram_counts = fresh._keys, fresh._gram_counts
+            pending, self._pending = self._pending, None
+            for write in pending:
+                write()
+            self._loaded_at = time.monotonic()
+
+    def refresh(self, build_now: Callable[[], Iterable[Dict]], build_later: Callable[[], Iterable[Dict]]):
+        """
+        Make sure the index is loaded and start a rebuild once it is stale, one
+        build at a time. The first load runs in the calling thread from
+        `build_now()`; concurrent first searches wait for that one build. Later
+        rebuilds run in a background thread from `build_later()` (which must not
+        use the caller's session) while searches keep using the current index.
+        """
+        if self._loaded_at is None:
+            with self._build_lock:
+                if self._loaded_at is None:
+                    self.load(build_now())
+            return
+        if self.is_stale and self._build_lock.acquire(blocking=False):
+            def rebuild():
+                try:
+                    self.load(build_later())
+                except Exception:
+                    logger.exception("Search index rebuild failed; keeping the current index")
+                finally:
+                    self._build_lock.release()
+            threading.Thread(target=rebuild, name="search-index-rebuild", daemon=True).start()
+
+    def _write(self, write: Callable[[], None]):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(write)
+            write()
+
+    def add(self, product: Dict):
+        self._write(lambda: self._add(product))
+
+    def remove(self, prod_id: int):
+        self._write(lambda: self._remove(prod_id))
+
+    def clear(self):
+        with self._lock:
+            self._write(self._reset)
+            self._loaded_at = time.monotonic()
+
+    def _add(self, product: Dict):
+        self._remove(product["id"])
+        key = search_key(product["name"])
+        self._docs[product["id"]] = product
+        self._keys[product["id"]] = key
+        grams = self.grams(key)
+        self._gram_counts[product["id"]] = len(grams)
+        for gram in grams:
+            self._postings[gram].add(product["id"])
+
+    def _remove(self, prod_id: int):
+        key = self._keys.pop(prod_id, None)
+        self._docs.pop(prod_id, None)
+        self._gram_counts.pop(prod_id, None)
+        if key is None:
+            return
+        for gram in self.grams(key):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(prod_id)
+                if not posting:
+                    del self._postings[gram]
+
+    def _reset(self):
+        self._postings = defaultdict(set)
+        self._docs = {}
+        self._keys = {}
+        self._gram_counts = {}
+
+    def invalidate(self):
+        """Rebuild from the table on next use, in the calling thread."""
+        self._loaded_at = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def search(self, term: str, limit: int = 50) -> List[Dict]:
+        key = search_key(term)
+        if not key:
+            return []
+
+        with self._lock:
+            budget = limit * CANDIDATE_BUDGET_FACTOR
+            inner_grams = self.grams(key, padded=False)
+            if inner_grams:
+                postings = sorted((self._postings.get(gram, EMPTY) for gram in inner_grams), key=len)
+                candidates = self._intersect(postings)
+            else:
+                # Only words shorter than a trigram: scan
+                candidates = iter(self._keys)
+
+            # Verify substring matches, stopping once the candidate budget is
+            # used so very common terms cost the same as rare ones
+            ranked = []
+            for prod_id in candidates:
+                doc_key = self._keys[prod_id]
+                position = doc_key.find(key)
+                if position >= 0:
+                    ranked.append((position, len(doc_key), prod_id))
+                    if len(ranked) >= budget:
+                        break
+            results = [self._docs[item[2]] for item in heapq.nsmallest(limit, ranked)]
+            if len(results) >= limit or not inner_grams:
+                return results
+
+            # Fuzzy fill: rank by trigram similarity against the padded term.
+            # Grams shared by a large part of the catalog say little about
+            # similarity and would dominate the cost, so they are skipped.
+            found = {item[2] for item in ranked}
+            term_grams = self.grams(key)
+            common = max(budget, len(self._docs) * COMMON_GRAM_FRACTION)
+            shared = Counter()
+            for gram in term_grams:
+                posting = self._postings.get(gram, EMPTY)
+                if len(posting) <= common:
+                    shared.update(posting)
+            fuzzy = []
+            for prod_id, count in shared.items():
+                if prod_id in found:
+                    continue
+                similarity = count / (len(term_grams) + self._gram_counts[prod_id] - count)
+                if similarity >= self.min_similarity:
+                    fuzzy.append((-similarity, prod_id))
+            results.extend(self._docs[prod_id] for _, prod_id in heapq.nsmallest(limit - len(results), fuzzy))
+            return results
+
+    @staticmethod
+    def _intersect(postings: List[set]) -> Iterator[int]:
+        """Lazily walk the smallest posting list, keeping IDs present in all the others."""
+        smallest, others = postings[0], postings[1:]
+        return (prod_id for prod_id in smallest if all(prod_id in posting for posting in others))
+
+
+search_index = NgramIndex()
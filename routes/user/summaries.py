@@ -0,0 +1,224 @@
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Table, literal, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from entities import DailyProductPawn, DailyProductSale, DailyTotal, PawnDetail
+
+SUMMARY_TABLES = [DailyProductSale.__table__, DailyProductPawn.__table__, DailyTotal.__table__]
+
+
+def as_day(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def add_to(db: Session, table: Table, keys: Sequence[str], rows: List[Dict]):
+    """
+    Add `rows` to the counters of `table` with one INSERT ... ON CONFLICT DO UPDATE.
+    Rows with the same key are merged first (a statement cannot update a row twice)
+    and sent in key order, so concurrent transactions lock summary rows in the
+    same order and cannot deadlock on them.
+    """
+    merged = {}
+    for row in rows:
+        key = tuple(row[column] for column in keys)
+        if key in merged:
+            for column, value in row.items():
+                if column not in keys:
+                    merged[key][column] += value
+        else:
+            merged[key] = dict(row)
+    if not merged:
+        return
+    insert = pg_insert(table).values([merged[key] for key in sorted(merged)])
+    counters = [column for column in rows[0] if column not in keys]
+    db.execute(insert.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: table.c[column] + insert.excluded[column] for column in counters},
+    ))
+
+
+def record_order(db: Session, order_date: datetime, deposit: float, lines: List[Dict]):
+    """Add an order and its order_details rows to the summaries, in the caller's transaction."""
+    day = as_day(order_date)
+    sales = [
+        {
+            "day": day,
+            "prod_id": line["prod_id"],
+            "lines": 1,
+            "amount": line["order_amount"] or 0,
+            "sell_total": line["product_sell_price"] or 0,
+            "labor_total": line["product_labor_cost"] or 0,
+            "buy_total": line["product_buy_price"] or 0,
+        }
+        for line in lines
+    ]
+    add_to(db, DailyProductSale.__table__, ("day", "prod_id"), sales)
+    add_to(db, DailyTotal.__table__, ("day",), [{
+        "day": day,
+        "orders": 1,
+        "order_deposit": deposit or 0,
+        "order_lines": len(sales),
+        "sell_total": sum(sale["sell_total"] for sale in sales),
+        "labor_total": sum(sale["labor_total"] for sale in sales),
+        "buy_total": sum(sale["buy_total"] for sale in sales),
+    }])
+
+
+def record_pawn(db: Session, pawn_date, expire_date, deposit: float, lines: List[Dict]):
+    """
+    Add a pawn and its pawn_details rows to the summaries: issued on pawn_date,
+    expiring on expire_date, and its grams held (while it is active) on pawn_date.
+    """
+    issued_day, expire_day = as_day(pawn_date), as_day(expire_date)
+    principals = [(line["prod_id"], (line["pawn_unit_price"] or 0) * (line["pawn_amount"] or 0)) for line in lines]
+    add_to(db, DailyProductPawn.__table__, ("day", "prod_id"), [
+        row
+        for prod_id, principal in principals
+        for row in (
+            {"day": issued_day, "prod_id": prod_id, "lines_issued": 1, "principal_issued": principal,
+             "lines_expiring": 0, "principal_expiring": 0},
+            {"day": expire_day, "prod_id": prod_id, "lines_issued": 0, "principal_issued": 0,
+             "lines_expiring": 1, "principal_expiring": principal},
+        )
+    ])
+    principal = sum(amount for _, amount in principals)
+    grams = [line["pawn_weight_grams"] for line in lines]
+    add_to(db, DailyTotal.__table__, ("day",), [
+        {"day": issued_day, "pawns": 1, "pawn_deposit": deposit or 0, "principal_issued": principal,
+         "pawns_expiring": 0, "principal_expiring": 0,
+         "grams_held": sum(gram for gram in grams if gram is not None),
+         "held_unparsed_lines": sum(gram is None for gram in grams)},
+        {"day": expire_day, "pawns": 0, "pawn_deposit": 0, "principal_issued": 0,
+         "pawns_expiring": 1, "principal_expiring": principal, "grams_held": 0, "held_unparsed_lines": 0},
+    ])
+
+
+def record_status_change(db, pawns: List[Tuple[int, datetime, datetime]], released: bool, closed: bool):
+    """
+    Update the summaries for (pawn_id, pawn_date, pawn_expire_date) pawns whose
+    status just changed, in the caller's transaction:
+    - released (they left active): their grams no longer count as held on pawn_date;
+    - closed (redeemed or forfeited): they no longer count as expiring on their
+      expiry day. Expiring counts the pawns still open, active or expired.
+    Each table gets one `add_to`, so rows are locked in key order.
+    """
+    if not pawns or not (released or closed):
+        return
+    days = {pawn_id: (as_day(pawn_date), as_day(expire_date)) for pawn_id, pawn_date, expire_date in pawns}
+    if closed:
+        lines = db.execute(
+            select(
+                PawnDetail.pawn_id, PawnDetail.prod_id,
+                PawnDetail.pawn_unit_price * PawnDetail.pawn_amount, PawnDetail.pawn_weight_grams,
+            )
+            .where(PawnDetail.pawn_id.in_(sorted(days)))
+        ).all()
+        add_to(db, DailyProductPawn.__table__, ("day", "prod_id"), [
+            {"day": days[pawn_id][1], "prod_id": prod_id, "lines_expiring": -1, "principal_expiring": -(principal or 0)}
+            for pawn_id, prod_id, principal, _ in lines
+        ])
+    else:
+        # Grams only: answered from the (pawn_id, pawn_weight_grams) index alone
+        lines = db.execute(
+            select(PawnDetail.pawn_id, literal(None), literal(0), PawnDetail.pawn_weight_grams)
+            .where(PawnDetail.pawn_id.in_(sorted(days)))
+        ).all()
+
+    totals = defaultdict(lambda: {"pawns_expiring": 0, "principal_expiring": 0, "grams_held": 0, "held_unparsed_lines": 0})
+    for issued_day, expire_day in days.values():
+        if closed:
+            totals[expire_day]["pawns_expiring"] -= 1
+    for pawn_id, _, principal, grams in lines:
+        issued_day, expire_day = days[pawn_id]
+        if closed:
+            totals[expire_day]["principal_expiring"] -= principal or 0
+        if released:
+            if grams is None:
+                totals[issued_day]["held_unparsed_lines"] -= 1
+            else:
+                totals[issued_day]["grams_held"] -= grams
+    add_to(db, DailyTotal.__table__, ("day",), [{"day": day, **counters} for day, counters in totals.items()])
+
+
+REBUILD_STATEMENTS = [
+    """
+    INSERT INTO daily_product_sales (day, prod_id, lines, amount, sell_total, labor_total, buy_total)
+    SELECT order_date::date, prod_id, count(*), sum(coalesce(order_amount, 0)),
+           sum(product_sell_price), sum(product_labor_cost), sum(product_buy_price)
+    FROM order_details
+    WHERE order_date >= :since
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    """,
+    """
+    INSERT INTO daily_product_pawns (day, prod_id, lines_issued, principal_issued, lines_expiring, principal_expiring)
+    SELECT day, prod_id, sum(lines_issued), sum(principal_issued), sum(lines_expiring), sum(principal_expiring)
+    FROM (
+        SELECT p.pawn_date::date AS day, d.prod_id, 1 AS lines_issued, d.pawn_unit_price * d.pawn_amount AS principal_issued,
+               0 AS lines_expiring, 0 AS principal_expiring
+        FROM pawn_details d JOIN pawns p ON p.pawn_id = d.pawn_id
+        WHERE p.pawn_date >= :since
+        UNION ALL
+        SELECT p.pawn_expire_date::date, d.prod_id, 0, 0, 1, d.pawn_unit_price * d.pawn_amount
+        FROM pawn_details d JOIN pawns p ON p.pawn_id = d.pawn_id
+        WHERE p.pawn_expire_date >= :since AND p.status IN ('active', 'expired')
+    ) lines
+    GROUP BY day, prod_id
+    ORDER BY day, prod_id
+    """,
+    """
+    INSERT INTO daily_totals (day, orders, order_deposit, order_lines, sell_total, labor_total, buy_total,
+                              pawns, pawn_deposit, principal_issued, pawns_expiring, principal_expiring,
+                              grams_held, held_unparsed_lines)
+    SELECT day, sum(orders), sum(order_deposit), sum(order_lines), sum(sell_total), sum(labor_total), sum(buy_total),
+           sum(pawns), sum(pawn_deposit), sum(principal_issued), sum(pawns_expiring), sum(principal_expiring),
+           sum(grams_held), sum(held_unparsed_lines)
+    FROM (
+        SELECT order_date::date AS day, count(*) AS orders, sum(order_deposit) AS order_deposit, 0 AS order_lines,
+               0 AS sell_total, 0 AS labor_total, 0 AS buy_total, 0 AS pawns, 0 AS pawn_deposit,
+               0 AS principal_issued, 0 AS pawns_expiring, 0 AS principal_expiring,
+               0 AS grams_held, 0 AS held_unparsed_lines
+        FROM orders WHERE order_date >= :since GROUP BY 1
+        UNION ALL
+        SELECT day, 0, 0, sum(lines), sum(sell_total), sum(labor_total), sum(buy_total), 0, 0, 0, 0, 0, 0, 0
+        FROM daily_product_sales WHERE day >= :since GROUP BY 1
+        UNION ALL
+        SELECT pawn_date::date, 0, 0, 0, 0, 0, 0, count(*), sum(pawn_deposit), 0, 0, 0, 0, 0
+        FROM pawns WHERE pawn_date >= :since GROUP BY 1
+        UNION ALL
+        SELECT pawn_expire_date::date, 0, 0, 0, 0, 0, 0, 0, 0, 0, count(*), 0, 0, 0
+        FROM pawns WHERE pawn_expire_date >= :since AND status IN ('active', 'expired') GROUP BY 1
+        UNION ALL
+        SELECT day, 0, 0, 0, 0, 0, 0, 0, 0, sum(principal_issued), 0, sum(principal_expiring), 0, 0
+        FROM daily_product_pawns WHERE day >= :since GROUP BY 1
+        UNION ALL
+        SELECT p.pawn_date::date, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
+               coalesce(sum(d.pawn_weight_grams), 0), count(*) FILTER (WHERE d.pawn_weight_grams IS NULL)
+        FROM pawns p JOIN pawn_details d ON d.pawn_id = p.pawn_id
+        WHERE p.pawn_date >= :since AND p.status = 'active'
+        GROUP BY 1
+    ) parts
+    GROUP BY day
+    ORDER BY day
+    """,
+]
+
+
+def rebuild(conn: Connection, since: Optional[date] = None):
+    """
+    Recompute the summaries of every day from `since` (default: all) from the raw
+    tables, in the caller's transaction. The summary tables are locked first, so
+    orders and pawns written meanwhile wait and then add themselves on top.
+    Rows go in in day order, keeping each day's rows together for the range reads.
+    """
+    since = since or date.min
+    conn.execute(text(f"LOCK TABLE {', '.join(table.name for table in SUMMARY_TABLES)} IN SHARE ROW EXCLUSIVE MODE"))
+    for table in SUMMARY_TABLES:
+        conn.execute(table.delete().where(table.c.day >= since))
+    for statement in REBUILD_STATEMENTS:
+        conn.execute(text(statement), {"since": since})
@@ -0,0 +1,209 @@
+import json
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import Integer, cast, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from entities import Pawn, PawnDetail
+
+load_dotenv()
+
+logger = logging.getLogger("valuation")
+
+PAWN_MONTHLY_INTEREST_RATE = float(os.getenv("PAWN_MONTHLY_INTEREST_RATE", "0.03"))
+PRICE_FILE = os.getenv("PRICE_FILE", "prices.json")
+VALUATION_CHUNK_ROWS = int(os.getenv("VALUATION_CHUNK_ROWS", "50000"))
+
+# Upper edges of the report buckets
+LTV_BUCKETS = [0.5, 0.7, 0.85, 1.0, np.inf]
+EXPIRY_BUCKETS = [7, 30, 90, np.inf]
+
+SECONDS_PER_DAY = 86400
+
+
+@dataclass
+class PriceTable:
+    """Price per gram of the pledged metal: a default, overridden per prod_id."""
+    per_gram: Optional[float] = None
+    products: Dict[int, float] = field(default_factory=dict)
+    as_of: Optional[str] = None
+
+    def per_gram_of(self, prod_ids: np.ndarray) -> np.ndarray:
+        """Price per gram for every prod_id, NaN where there is none."""
+        size = int(prod_ids.max(initial=0)) + 1
+        prices = np.full(size, np.nan if self.per_gram is None else self.per_gram)
+        for prod_id, price in self.products.items():
+            if prod_id < size:
+                prices[prod_id] = price
+        return prices[prod_ids]
+
+
+class PriceSource(ABC):
+    """Where price ticks come from; replace `price_source` to plug in a live feed."""
+
+    @abstractmethod
+    def prices(self) -> PriceTable:
+        """The current price table. Raises OSError or ValueError when none is available."""
+
+
+class FilePriceSource(PriceSource):
+    """
+    Price table from a local JSON file, reloaded when the file changes:
+        {"as_of": "2026-10-18T09:00", "per_gram": 75.0, "products": {"12": 0.95}}
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._table = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def prices(self) -> PriceTable:
+        mtime = os.stat(self.path).st_mtime
+        with self._lock:
+            if mtime != self._mtime:
+                with open(self.path) as file:
+                    raw = json.load(file)
+                self._table = PriceTable(
+                    per_gram=raw.get("per_gram"),
+                    products={int(prod_id): float(price) for prod_id, price in raw.get("products", {}).items()},
+                    as_of=raw.get("as_of"),
+                )
+                self._mtime = mtime
+            return self._table
+
+
+@dataclass
+class PawnBook:
+    """Pawn lines as NumPy columns, one entry per line; days are counted from 1970-01-01."""
+    pawn_id: np.ndarray
+    prod_id: np.ndarray
+    principal: np.ndarray
+    grams: np.ndarray
+    pawn_day: np.ndarray
+    expire_day: np.ndarray
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[List[tuple]]) -> "PawnBook":
+        # Transposed per chunk, so NumPy converts plain numbers rather than row objects; NULL becomes NaN
+        columns = [[] for _ in range(6)]
+        for chunk in chunks:
+            for column, values in zip(columns, zip(*chunk)):
+                column.append(np.array(values, dtype=np.float64))
+        pawn_id, prod_id, principal, grams, pawn_day, expire_day = (
+            np.concatenate(column) if column else np.empty(0) for column in columns
+        )
+        return cls(
+            pawn_id=pawn_id.astype(np.int64),
+            prod_id=prod_id.astype(np.int64),
+            principal=principal,
+            grams=grams,
+            pawn_day=pawn_day.astype(np.int64),
+            expire_day=expire_day.astype(np.int64),
+        )
+
+
+def load_pawn_book(db: Session, as_of: date, chunk_rows: int = VALUATION_CHUNK_ROWS) -> PawnBook:
+    """
+    Lines of the pawns active on `as_of` and not since redeemed or forfeited,
+    streamed with a server-side cursor `chunk_rows` at a time.
+    """
+    day = lambda column: cast(func.floor(func.extract("epoch", column) / SECONDS_PER_DAY), Integer)
+    # Core execution on the session's connection: the rows go straight into NumPy, no ORM row processing
+    result = db.connection().execute(
+        select(
+            PawnDetail.pawn_id,
+            PawnDetail.prod_id,
+            PawnDetail.pawn_unit_price * func.coalesce(PawnDetail.pawn_amount, 1),
+            PawnDetail.pawn_weight_grams,
+            day(Pawn.pawn_date),
+            day(Pawn.pawn_expire_date),
+        )
+        .join(Pawn, Pawn.pawn_id == PawnDetail.pawn_id)
+        .where(
+            Pawn.status.in_(("active", "expired")),
+            Pawn.pawn_expire_date >= as_of,
+            Pawn.pawn_date < as_of + timedelta(days=1),
+        )
+        .execution_options(yield_per=chunk_rows)
+    )
+    return PawnBook.from_chunks(result.partitions())
+
+
+def value_pawn_book(book: PawnBook, prices: PriceTable, as_of: date, monthly_rate: float, top: int = 20) -> Dict:
+    """
+    Revalue every pawn in the book at once:
+    - principal: pawn_unit_price x pawn_amount of its lines
+    - accrued interest: simple interest at `monthly_rate` per 30 days since pawn_date
+    - collateral value: grams x price per gram; a pawn with a line that has no
+      grams or no price is left unvalued
+    - loan-to-value: (principal + accrued interest) / collateral value
+    - days to expiry: pawn_expire_date - as_of
+    """
+    today = (as_of - date(1970, 1, 1)).days
+    pawn_ids, first_line, pawn_of_line = np.unique(book.pawn_id, return_index=True, return_inverse=True)
+    pawns = len(pawn_ids)
+
+    elapsed = np.maximum(today - book.pawn_day, 0)
+    accrued = book.principal * monthly_rate * elapsed / 30
+    value = book.grams * prices.per_gram_of(book.prod_id)
+
+    pawn_principal = np.bincount(pawn_of_line, weights=book.principal, minlength=pawns)
+    pawn_accrued = np.bincount(pawn_of_line, weights=accrued, minlength=pawns)
+    pawn_value = np.bincount(pawn_of_line, weights=np.nan_to_num(value), minlength=pawns)
+    valued = np.bincount(pawn_of_line, weights=np.isnan(value), minlength=pawns) == 0
+    valued &= pawn_value > 0
+    exposure = pawn_principal + pawn_accrued
+    ltv = np.full(pawns, np.nan)
+    np.divide(exposure, pawn_value, out=ltv, where=valued)
+    days_to_expiry = book.expire_day[first_line] - today
+
+    def buckets(values: np.ndarray, edges: List[float], key: str, selected: np.ndarray) -> List[Dict]:
+        index = np.searchsorted(edges, values[selected], side="left")
+        counts = np.bincount(index, minlength=len(edges))
+        principal = np.bincount(index, weights=pawn_principal[selected], minlength=len(edges))
+        return [
+            {key: None if np.isinf(edge) else edge, "pawns": int(count), "principal": round(float(amount), 2)}
+            for edge, count, amount in zip(edges, counts, principal)
+        ]
+
+    riskiest = np.flatnonzero(valued)
+    riskiest = riskiest[np.argsort(-ltv[riskiest], kind="stable")[:top]]
+    total_value = pawn_value[valued].sum()
+    return {
+        "as_of": as_of.isoformat(),
+        "prices_as_of": prices.as_of,
+        "monthly_rate": monthly_rate,
+        "pawns": pawns,
+        "lines": len(book.pawn_id),
+        "unvalued_pawns": int(pawns - valued.sum()),
+        "principal": round(float(pawn_principal.sum()), 2),
+        "accrued_interest": round(float(pawn_accrued.sum()), 2),
+        "collateral_value": round(float(total_value), 2),
+        "loan_to_value": round(float(exposure[valued].sum() / total_value), 4) if total_value else None,
+        "ltv_buckets": buckets(ltv, LTV_BUCKETS, "ltv_up_to", valued),
+        "expiry_buckets": buckets(days_to_expiry, EXPIRY_BUCKETS, "days_up_to", np.ones(pawns, dtype=bool)),
+        "riskiest": [
+            {
+                "pawn_id": int(pawn_ids[i]),
+                "principal": round(float(pawn_principal[i]), 2),
+                "accrued_interest": round(float(pawn_accrued[i]), 2),
+                "collateral_value": round(float(pawn_value[i]), 2),
+                "loan_to_value": round(float(ltv[i]), 4),
+                "days_to_expiry": int(days_to_expiry[i]),
+            }
+            for i in riskiest
+        ],
+    }
+
+
+price_source: PriceSource = FilePriceSource(PRICE_FILE)
@@ -0,0 +1,29 @@
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from entities import TableVersion
+
+# The tables with a version row (seeded by migration 0008)
+PRODUCTS = "products"
+ACCOUNTS = "accounts"
+
+
+def bump(db: Session, table_name: str):
+    """
+    Move the version of `table_name` on, in the caller's transaction, so the new
+    version becomes visible exactly when the write does. Concurrent writers of the
+    same table wait on the version row until the first one commits, so call it
+    right before committing, and only when rows were actually written.
+    """
+    db.execute(
+        update(TableVersion)
+        .where(TableVersion.table_name == table_name)
+        .values(version=TableVersion.version + 1)
+    )
+
+
+def current(db: Session, table_name: str) -> Optional[int]:
+    """The version of `table_name`: one primary key lookup."""
+    return db.execute(select(TableVersion.version).where(TableVersion.table_name == table_name)).scalar()
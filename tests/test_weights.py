@@ -0,0 +1,55 @@
+import pytest
+from pydantic import ValidationError
+
+from routes.user.model import BuyProducts, PawnProductDetail
+from weights import Weight, parse_weight, weight_columns
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2.5g", Weight(2.5, "g", 2.5)),
+    ("1 chi", Weight(1.0, "chi", 3.75)),
+    ("២ ជី", Weight(2.0, "chi", 7.5)),
+    ("1 chi 5 hun", Weight(1.5, "chi", 5.625)),
+    ("2,5 g", Weight(2.5, "g", 2.5)),
+    ("0,375 chi", Weight(0.375, "chi", 1.4062)),
+])
+def test_parses_weights(text, expected):
+    assert parse_weight(text) == expected
+
+
+@pytest.mark.parametrize("text, grams", [
+    ("1,000 g", 1000.0),
+    ("1,000g", 1000.0),
+    ("12,500.5 g", 12500.5),
+    ("1,000,000 g", 1000000.0),
+])
+def test_commas_between_groups_of_three_digits_are_thousands(text, grams):
+    assert parse_weight(text).grams == grams
+
+
+@pytest.mark.parametrize("text", ["1.000,5 g", "1,00,000 g", "1,000,5 g", "2.5.1 chi"])
+def test_rejects_ambiguous_separators(text):
+    with pytest.raises(ValueError):
+        parse_weight(text)
+
+
+@pytest.mark.parametrize("text", ["", "   ", "5", "2.5", "1,000", "៥"])
+def test_unitless_weights_are_accepted_without_a_numeric_weight(text):
+    assert parse_weight(text) is None
+    assert weight_columns("order_weight", text) == {
+        "order_weight_value": None, "order_weight_unit": None, "order_weight_grams": None,
+    }
+
+
+@pytest.mark.parametrize("text", ["abc", "5 bags", "1 chi 2 chi"])
+def test_rejects_texts_that_are_not_weights(text):
+    with pytest.raises(ValueError):
+        parse_weight(text)
+
+
+@pytest.mark.parametrize("model, field", [(BuyProducts, "order_weight"), (PawnProductDetail, "pawn_weight")])
+def test_line_models_keep_legacy_weights(model, field):
+    for text in (None, "", "5", "1,000 g"):
+        assert getattr(model(**{field: text}), field) == text
+    with pytest.raises(ValidationError):
+        model(**{field: "1.000,5 g"})
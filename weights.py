@@ -0,0 +1,89 @@
+import re
+import unicodedata
+from typing import Dict, NamedTuple, Optional
+
+# Grams per unit. The Khmer gold units are decimal: 1 damlung = 10 chi = 100 hun = 1000 li
+UNIT_GRAMS = {
+    "kg": 1000.0,
+    "damlung": 37.5,
+    "chi": 3.75,
+    "g": 1.0,
+    "hun": 0.375,
+    "li": 0.0375,
+}
+
+# Spellings staff type, in Latin and Khmer script, for each unit
+UNIT_ALIASES = {
+    "kg": "kg", "kilo": "kg", "គីឡូ": "kg",
+    "damlung": "damlung", "tael": "damlung", "តម្លឹង": "damlung",
+    "chi": "chi", "ជី": "chi",
+    "g": "g", "gr": "g", "gram": "g", "grams": "g", "ក្រាម": "g",
+    "hun": "hun", "ហ៊ុន": "hun",
+    "li": "li", "លី": "li",
+}
+
+KHMER_DIGITS = str.maketrans("០១២៣៤៥៦៧៨៩", "0123456789")
+PART = re.compile(r"(\d[\d.,]*)\s*([^\d\s.,]+)")
+# Commas between groups of three digits are thousands separators ("1,000", "12,500.5");
+# any other single comma or point is the decimal mark ("2.5", "2,5", "0,375")
+THOUSANDS = re.compile(r"[1-9]\d{0,2}(?:,\d{3})+(?:\.\d+)?")
+DECIMAL = re.compile(r"\d+(?:[.,]\d+)?")
+# What older clients sent, and the API always took: nothing, or a number without a unit
+UNITLESS = re.compile(r"[\d.,]*")
+
+
+class Weight(NamedTuple):
+    value: float
+    unit: str
+    grams: float
+
+
+def parse_number(text: str) -> float:
+    """A number as typed in a weight: "1,000" is a thousand, "2,5" is 2.5. Raises ValueError on "1.000,5" and the like."""
+    if THOUSANDS.fullmatch(text):
+        return float(text.replace(",", ""))
+    if DECIMAL.fullmatch(text):
+        return float(text.replace(",", "."))
+    raise ValueError(f"Ambiguous number {text!r} in weight; write thousands as 1,000 and decimals as 2.5 or 2,5")
+
+
+def parse_weight(text: str) -> Optional[Weight]:
+    """
+    Parse a weight as staff type it: "2.5g", "1 chi", "3 hun", "២ ជី", or a
+    mix of units such as "1 chi 5 hun". A mix is expressed in its first unit.
+    Returns None for an empty text or a bare number, which older clients send
+    and which stay accepted without a numeric weight. Raises ValueError when the
+    text is not a weight.
+    """
+    normalized = unicodedata.normalize("NFC", text).translate(KHMER_DIGITS).lower().strip()
+    if UNITLESS.fullmatch(normalized):
+        return None
+    grams = 0.0
+    units = []
+    position = 0
+    for match in PART.finditer(normalized):
+        if normalized[position:match.start()].strip():
+            break
+        number, name = match.groups()
+        unit = UNIT_ALIASES.get(name)
+        if unit is None or unit in units:
+            break
+        units.append(unit)
+        grams += parse_number(number) * UNIT_GRAMS[unit]
+        position = match.end()
+    if not units or normalized[position:].strip():
+        raise ValueError(f"Unrecognised weight {text!r}; expected a number and a unit ({', '.join(UNIT_GRAMS)})")
+    return Weight(round(grams / UNIT_GRAMS[units[0]], 4), units[0], round(grams, 4))
+
+
+def weight_columns(prefix: str, text: Optional[str]) -> Dict[str, Optional[float]]:
+    """The parsed `<prefix>_value`, `_unit` and `_grams` columns for a weight text; NULLs when it has no unit or does not parse."""
+    try:
+        weight = parse_weight(text) if text else None
+    except ValueError:
+        weight = None
+    return {
+        f"{prefix}_value": weight.value if weight else None,
+        f"{prefix}_unit": weight.unit if weight else None,
+        f"{prefix}_grams": weight.grams if weight else None,
+    }